@@ -48,7 +48,9 @@ resource "aws_iam_role_policy" "databricks_policy" {
           "arn:aws:s3:::${var.bucket_bronze_layer}",
           "arn:aws:s3:::${var.bucket_bronze_layer}/*",
           "arn:aws:s3:::${var.bucket_silver_layer}",
-          "arn:aws:s3:::${var.bucket_silver_layer}/*"
+          "arn:aws:s3:::${var.bucket_silver_layer}/*",
+          "arn:aws:s3:::${var.bucket_gold_layer}",
+          "arn:aws:s3:::${var.bucket_gold_layer}/*"
         ]
       },
       {
@@ -118,4 +120,16 @@ resource "databricks_external_location" "silver_layer" {
   ]
 }
 
+resource "databricks_external_location" "gold_layer" {
+  name            = "gold-layer"
+  url             = "s3://${var.bucket_gold_layer}/"
+  credential_name = databricks_credential.databricks_credential.name
+  comment         = "External location for gold layer data"
+
+  depends_on = [
+    aws_iam_role_policy.databricks_policy,
+    aws_s3_bucket.bucket_gold_layer
+  ]
+}
+
 
@@ -12,3 +12,10 @@ resource "databricks_schema" "silver_db" {
   storage_root = "s3://${var.bucket_silver_layer}"
   comment      = "Schema silver para dados refinados"
 }
+
+resource "databricks_schema" "gold_db" {
+  catalog_name = "workspace"
+  name         = "gold_db"
+  storage_root = "s3://${var.bucket_gold_layer}"
+  comment      = "Schema gold para dados agregados"
+}
@@ -13,127 +13,67 @@ resource "databricks_job" "serverless_python_job" {
     }
   }
 
-  # TASKS DE DOWNLOAD
+  # TASK DE DOWNLOAD (todas as bases em paralelo, um prefixo por base)
 
   task {
-    task_key        = "download_nyc_taxi_data_yellow"
+    task_key        = "download_nyc_taxi_data"
     environment_key = "default"
     max_retries     = 0
 
     spark_python_task {
       python_file = "${var.workspace_folder}/src/jobs/download_nyc_taxi_data.py"
-      parameters  = ["yellow", "2023-01", "2023-05", "--s3-bucket", var.bucket_landing_zone, "--s3-prefix", "nyc_taxi_data_yellow"]
+      parameters  = ["yellow,green,forhire,highvolumeforhire", "2023-01", "2023-05", "--s3-bucket", var.bucket_landing_zone, "--s3-prefix", "nyc_taxi_data_{base}", "--run-metrics"]
     }
   }
 
-  task {
-    task_key        = "download_nyc_taxi_data_green"
-    environment_key = "default"
-    max_retries     = 0
-
-    spark_python_task {
-      python_file = "${var.workspace_folder}/src/jobs/download_nyc_taxi_data.py"
-      parameters  = ["green", "2023-01", "2023-05", "--s3-bucket", var.bucket_landing_zone, "--s3-prefix", "nyc_taxi_data_green"]
-    }
-  }
+  # TASK DE INGESTÃO PARA A BRONZE (todas as tabelas em paralelo na mesma sessão Spark)
 
   task {
-    task_key        = "download_nyc_taxi_data_forhire"
-    environment_key = "default"
-    max_retries     = 0
-
-    spark_python_task {
-      python_file = "${var.workspace_folder}/src/jobs/download_nyc_taxi_data.py"
-      parameters  = ["forhire", "2023-01", "2023-05", "--s3-bucket", var.bucket_landing_zone, "--s3-prefix", "nyc_taxi_data_forhire"]
-    }
-  }
-
-  task {
-    task_key        = "download_nyc_taxi_data_highvolumeforhire"
-    environment_key = "default"
-    max_retries     = 0
-
-    spark_python_task {
-      python_file = "${var.workspace_folder}/src/jobs/download_nyc_taxi_data.py"
-      parameters  = ["highvolumeforhire", "2023-01", "2023-05", "--s3-bucket", var.bucket_landing_zone, "--s3-prefix", "nyc_taxi_data_highvolumeforhire"]
-    }
-  }
-
-  # TASKS DE INGESTÃO PARA A BRONZE
-
-  task {
-    task_key        = "process_bronze_nyc_taxi_data_yellow"
+    task_key        = "process_bronze_nyc_taxi_data"
     environment_key = "default"
     max_retries     = 0
 
     depends_on {
-      task_key = "download_nyc_taxi_data_yellow"
+      task_key = "download_nyc_taxi_data"
     }
     spark_python_task {
       python_file = "${var.workspace_folder}/src/jobs/bronze_layer_ingestion.py"
-      parameters  = ["bronze_db.nyc_taxi_data_yellow", "s3://${var.bucket_landing_zone}/nyc_taxi_data_yellow"]
+      parameters  = ["bronze_db.nyc_taxi_data_{base}", "s3://${var.bucket_landing_zone}/nyc_taxi_data_{base}", "2023-01", "2023-05", "--bases", "yellow,green,forhire,highvolumeforhire", "--run-metrics"]
     }
   }
 
-  task {
-    task_key        = "process_bronze_nyc_taxi_data_green"
-    environment_key = "default"
-    max_retries     = 0
-
-    depends_on {
-      task_key = "download_nyc_taxi_data_green"
-    }
-    spark_python_task {
-      python_file = "${var.workspace_folder}/src/jobs/bronze_layer_ingestion.py"
-      parameters  = ["bronze_db.nyc_taxi_data_green", "s3://${var.bucket_landing_zone}/nyc_taxi_data_green"]
-    }
-  }
+  # TASK DE ETL PARA SILVER
 
   task {
-    task_key        = "process_bronze_nyc_taxi_data_forhire"
+    task_key        = "process_silver_nyc_taxi_data"
     environment_key = "default"
     max_retries     = 0
 
     depends_on {
-      task_key = "download_nyc_taxi_data_forhire"
+      task_key = "process_bronze_nyc_taxi_data"
     }
-    spark_python_task {
-      python_file = "${var.workspace_folder}/src/jobs/bronze_layer_ingestion.py"
-      parameters  = ["bronze_db.nyc_taxi_data_forhire", "s3://${var.bucket_landing_zone}/nyc_taxi_data_forhire"]
-    }
-  }
 
-  task {
-    task_key        = "process_bronze_nyc_taxi_data_highvolumeforhire"
-    environment_key = "default"
-    max_retries     = 0
-
-    depends_on {
-      task_key = "download_nyc_taxi_data_highvolumeforhire"
-    }
     spark_python_task {
-      python_file = "${var.workspace_folder}/src/jobs/bronze_layer_ingestion.py"
-      parameters  = ["bronze_db.nyc_taxi_data_highvolumeforhire", "s3://${var.bucket_landing_zone}/nyc_taxi_data_highvolumeforhire"]
+      python_file = "${var.workspace_folder}/src/jobs/silver_layer_etl.py"
+      parameters  = ["2023-01", "2023-05", "--run-metrics"]
     }
+
   }
 
-  # TASK DE ETL PARA SILVER
+  # TASK DE AGREGAÇÃO PARA GOLD
 
   task {
-    task_key        = "process_silver_nyc_taxi_data"
+    task_key        = "process_gold_nyc_taxi_data"
     environment_key = "default"
     max_retries     = 0
 
     depends_on {
-      task_key = "process_bronze_nyc_taxi_data_yellow"
-    }
-    depends_on {
-      task_key = "process_bronze_nyc_taxi_data_green"
+      task_key = "process_silver_nyc_taxi_data"
     }
 
     spark_python_task {
-      python_file = "${var.workspace_folder}/src/jobs/silver_layer_etl.py"
-      parameters  = []
+      python_file = "${var.workspace_folder}/src/jobs/gold_layer_etl.py"
+      parameters  = ["--run-metrics"]
     }
 
   }
@@ -24,4 +24,5 @@ CREATE TABLE IF NOT EXISTS bronze_db.nyc_taxi_data_yellow (
   data_hora_ingestao TIMESTAMP COMMENT 'Data e hora da ingestão do registro.',
   ano_mes_referencia STRING COMMENT 'Ano/Mês de referência do registro'
 )
+PARTITIONED BY (ano_mes_referencia)
 COMMENT 'Tabela bronze com dados de táxis amarelos de NYC';
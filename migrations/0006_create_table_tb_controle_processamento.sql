@@ -0,0 +1,10 @@
+-- Criação da tabela de controle: tb_controle_processamento
+-- Registra quais cargas da bronze (tabela, mês e data_hora_ingestao) já foram processadas pelo ETL silver
+
+CREATE TABLE IF NOT EXISTS silver_db.tb_controle_processamento (
+  tabela_origem STRING NOT NULL COMMENT 'Tabela bronze de origem da carga',
+  ano_mes_referencia STRING NOT NULL COMMENT 'Ano/Mês de referência da carga',
+  data_hora_ingestao TIMESTAMP COMMENT 'Data e hora da ingestão da carga na bronze',
+  data_hora_processamento TIMESTAMP NOT NULL COMMENT 'Data e hora em que a carga foi processada na silver'
+)
+COMMENT 'Tabela de controle das cargas da bronze processadas pelo ETL silver';
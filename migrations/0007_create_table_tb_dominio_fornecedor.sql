@@ -0,0 +1,14 @@
+-- Criação da tabela de domínio: tb_dominio_fornecedor
+-- Descrição dos códigos de fornecedor (id_fornecedor) usados na tabela silver
+
+CREATE TABLE IF NOT EXISTS silver_db.tb_dominio_fornecedor (
+  id_fornecedor INT NOT NULL COMMENT 'Código do fornecedor (VendorID)',
+  nome_fornecedor STRING NOT NULL COMMENT 'Nome do fornecedor'
+)
+COMMENT 'Domínio dos fornecedores das corridas de táxi em NY';
+
+INSERT OVERWRITE silver_db.tb_dominio_fornecedor VALUES
+  (1, 'Creative Mobile Technologies, LLC'),
+  (2, 'Curb Mobility, LLC'),
+  (6, 'Myle Technologies Inc'),
+  (7, 'Helix');
@@ -0,0 +1,19 @@
+-- Criação da tabela de domínio: tb_dominio_tipo_pagamento
+-- Descrição dos códigos de tipo de pagamento (id_tipo_pagamento) e indicadores derivados deles
+
+CREATE TABLE IF NOT EXISTS silver_db.tb_dominio_tipo_pagamento (
+  id_tipo_pagamento INT NOT NULL COMMENT 'Código do tipo de pagamento (payment_type)',
+  descricao_tipo_pagamento STRING NOT NULL COMMENT 'Descrição do tipo de pagamento',
+  indicador_cancelamento BOOLEAN NOT NULL COMMENT 'Indica se o tipo de pagamento representa uma viagem cancelada',
+  indicador_viagem_sem_cobranca BOOLEAN NOT NULL COMMENT 'Indica se o tipo de pagamento representa uma viagem sem cobrança'
+)
+COMMENT 'Domínio dos tipos de pagamento das corridas de táxi em NY';
+
+INSERT OVERWRITE silver_db.tb_dominio_tipo_pagamento VALUES
+  (0, 'Viagem com tarifa flexível', false, false),
+  (1, 'Cartão de crédito', false, false),
+  (2, 'Dinheiro', false, false),
+  (3, 'Sem cobrança', false, true),
+  (4, 'Contestação', false, false),
+  (5, 'Desconhecido', false, false),
+  (6, 'Viagem cancelada', true, false);
@@ -0,0 +1,26 @@
+-- Criação da view: vw_corrida_taxi_ny
+-- Expõe as corridas da silver com as descrições dos domínios de fornecedor e tipo de pagamento
+
+CREATE OR REPLACE VIEW silver_db.vw_corrida_taxi_ny
+COMMENT 'Corridas de táxi em NY com as descrições de fornecedor e tipo de pagamento'
+AS
+SELECT /*+ BROADCAST(f), BROADCAST(p) */
+  c.id,
+  c.id_fornecedor,
+  COALESCE(f.nome_fornecedor, 'FORNECEDOR NÃO IDENTIFICADO') AS nome_fornecedor,
+  c.quantidade_passageiros,
+  c.valor_corrida,
+  c.data_hora_embarque,
+  c.data_hora_desembarque,
+  c.indicador_cancelamento,
+  c.indicador_viagem_sem_cobranca,
+  c.id_tipo_pagamento,
+  COALESCE(p.descricao_tipo_pagamento, 'TIPO DE PAGAMENTO NÃO IDENTIFICADO') AS descricao_tipo_pagamento,
+  c.tipo_servico,
+  c.data_hora_criacao_registro,
+  c.ano_mes_referencia
+FROM silver_db.tb_corrida_taxi_ny c
+LEFT JOIN silver_db.tb_dominio_fornecedor f
+  ON c.id_fornecedor = f.id_fornecedor
+LEFT JOIN silver_db.tb_dominio_tipo_pagamento p
+  ON c.id_tipo_pagamento = p.id_tipo_pagamento;
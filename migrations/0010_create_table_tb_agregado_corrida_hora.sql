@@ -0,0 +1,20 @@
+-- Criação da tabela gold: tb_agregado_corrida_hora
+-- Agregados aditivos das corridas por serviço, mês, hora do embarque e indicadores. As médias
+-- são obtidas dividindo as somas pelas contagens correspondentes
+
+CREATE TABLE IF NOT EXISTS gold_db.tb_agregado_corrida_hora (
+  tipo_servico STRING NOT NULL COMMENT 'Tipo de serviço (YELLOW, GREEN, FORHIRE, HIGHVOLUMEFORHIRE)',
+  hora_embarque INT COMMENT 'Hora do dia (0-23) do embarque',
+  indicador_cancelamento BOOLEAN NOT NULL COMMENT 'Indica se as corridas foram canceladas',
+  indicador_viagem_sem_cobranca BOOLEAN NOT NULL COMMENT 'Indica se as corridas foram sem cobrança',
+  quantidade_corridas BIGINT NOT NULL COMMENT 'Quantidade de corridas',
+  soma_valor_corrida_positivo DECIMAL(20, 2) COMMENT 'Soma de valor_corrida das corridas com valor positivo',
+  quantidade_corridas_valor_positivo BIGINT NOT NULL COMMENT 'Quantidade de corridas com valor_corrida positivo',
+  soma_passageiros BIGINT COMMENT 'Soma de quantidade_passageiros',
+  quantidade_corridas_com_passageiros BIGINT NOT NULL COMMENT 'Quantidade de corridas com quantidade_passageiros informada',
+  data_hora_processamento_silver TIMESTAMP COMMENT 'Maior data_hora_processamento da tabela de controle da silver refletida na gold',
+  data_hora_atualizacao TIMESTAMP NOT NULL COMMENT 'Data e hora do cálculo do agregado',
+  ano_mes_referencia STRING COMMENT 'Ano/Mês de referência das corridas'
+)
+PARTITIONED BY (ano_mes_referencia)
+COMMENT 'Tabela gold com agregados das corridas de táxi em NY por serviço, mês e hora do embarque';
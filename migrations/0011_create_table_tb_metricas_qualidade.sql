@@ -0,0 +1,15 @@
+-- Criação da tabela de métricas: tb_metricas_qualidade
+-- Métricas de qualidade por mês coletadas pelo ETL silver durante a escrita da tabela tb_corrida_taxi_ny
+
+CREATE TABLE IF NOT EXISTS silver_db.tb_metricas_qualidade (
+  nome_metrica STRING NOT NULL COMMENT 'Nome da métrica de qualidade',
+  valor BIGINT NOT NULL COMMENT 'Quantidade de registros do mês com o problema',
+  quantidade_registros BIGINT NOT NULL COMMENT 'Quantidade total de registros do mês escritos na silver',
+  percentual DOUBLE COMMENT 'Fração de registros do mês com o problema',
+  limite_percentual DOUBLE COMMENT 'Fração máxima aceita (nula quando a métrica é apenas informativa)',
+  indicador_violacao BOOLEAN NOT NULL COMMENT 'Indica se a métrica ultrapassou o limite e falhou o job',
+  data_hora_processamento TIMESTAMP NOT NULL COMMENT 'Data e hora da execução do ETL silver',
+  ano_mes_referencia STRING COMMENT 'Ano/Mês de referência das corridas'
+)
+PARTITIONED BY (ano_mes_referencia)
+COMMENT 'Tabela com o histórico das métricas de qualidade da tabela silver tb_corrida_taxi_ny';
@@ -0,0 +1,15 @@
+-- Criação da tabela de métricas: tb_metricas_execucao
+-- Eventos de instrumentação (etapas, consultas Spark e arquivos baixados) gravados pelos jobs
+-- executados com --run-metrics
+
+CREATE TABLE IF NOT EXISTS silver_db.tb_metricas_execucao (
+  id_execucao STRING NOT NULL COMMENT 'Identificador da execução do job',
+  evento STRING NOT NULL COMMENT 'Tipo do evento (etapa, consulta ou arquivo)',
+  nome STRING NOT NULL COMMENT 'Nome da etapa ou do arquivo',
+  segundos DOUBLE COMMENT 'Duração da etapa, da consulta ou do envio do arquivo',
+  detalhes STRING COMMENT 'Demais campos do evento em JSON (bytes, linhas, shuffle, spill, vazão)',
+  data_hora_evento TIMESTAMP NOT NULL COMMENT 'Data e hora do registro do evento',
+  job STRING COMMENT 'Job que emitiu o evento (download, bronze, silver, gold)'
+)
+PARTITIONED BY (job)
+COMMENT 'Tabela com o histórico de instrumentação das execuções dos jobs';
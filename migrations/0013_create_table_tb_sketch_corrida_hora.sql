@@ -0,0 +1,19 @@
+-- Criação da tabela de sketches: tb_sketch_corrida_hora
+-- Sketches mescláveis das corridas da silver por serviço, mês e hora do embarque. Os sketches
+-- de quantis (valor_corrida e duração) são histogramas em baldes logarítmicos com erro
+-- relativo limitado; os de contagem distinta são HLL (hll_sketch_agg). Sketches de meses e
+-- horas diferentes são somados (quantis) ou unidos (hll_union_agg) nas consultas
+
+CREATE TABLE IF NOT EXISTS silver_db.tb_sketch_corrida_hora (
+  tipo_servico STRING NOT NULL COMMENT 'Tipo de serviço (YELLOW, GREEN, FORHIRE, HIGHVOLUMEFORHIRE)',
+  hora_embarque INT COMMENT 'Hora do dia (0-23) do embarque',
+  quantidade_corridas BIGINT NOT NULL COMMENT 'Quantidade de corridas',
+  sketch_valor_corrida STRUCT<positivos: MAP<INT, BIGINT>, negativos: MAP<INT, BIGINT>, zeros: BIGINT> COMMENT 'Contagem de corridas por balde logarítmico de valor_corrida (positivos e negativos) e de valores zero',
+  sketch_duracao_segundos STRUCT<positivos: MAP<INT, BIGINT>, negativos: MAP<INT, BIGINT>, zeros: BIGINT> COMMENT 'Contagem de corridas por balde logarítmico da duração em segundos (desembarque - embarque)',
+  sketch_fornecedores BINARY COMMENT 'Sketch HLL dos id_fornecedor distintos',
+  sketch_corridas BINARY COMMENT 'Sketch HLL dos id de corrida distintos',
+  data_hora_processamento TIMESTAMP NOT NULL COMMENT 'Data e hora do cálculo dos sketches',
+  ano_mes_referencia STRING COMMENT 'Ano/Mês de referência das corridas'
+)
+PARTITIONED BY (ano_mes_referencia)
+COMMENT 'Tabela com sketches mescláveis de quantis e contagens distintas das corridas por serviço, mês e hora do embarque';
@@ -0,0 +1,208 @@
+"""
+Perguntas do notebook 03_questions.ipynb com cache dos resultados.
+
+As perguntas são consultas parametrizadas sobre a gold e a silver, repetidas ao longo do dia
+pelos analistas. Cada resultado fica em um cache LRU em memória, indexado pela pergunta,
+pelos parâmetros e pela versão das tabelas lidas:
+
+- tabelas Delta: versão do último commit (`DESCRIBE HISTORY`)
+- demais formatos: impressão digital da lista de arquivos da tabela; toda escrita do
+  Spark gera arquivos com nomes novos
+
+Antes de cada resposta, apenas a versão das tabelas é consultada. Enquanto nenhuma carga
+reescreve as tabelas, a pergunta repetida é respondida pelo cache; depois de uma carga, a
+chave muda e a consulta é executada novamente. As entradas antigas saem pelo LRU.
+
+Uso no notebook:
+
+    from questions import Questions
+
+    questions = Questions(spark)
+    questions.monthly_average_amount()
+    questions.hourly_average_passengers("2023-05")
+    questions.negative_amounts_by_payment_type()
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+import hashlib
+from typing import Callable
+
+from pyspark.sql import DataFrame, Row, SparkSession, functions as F
+
+GOLD_TABLE = "gold_db.tb_agregado_corrida_hora"
+SILVER_TABLE = "silver_db.tb_corrida_taxi_ny"
+SILVER_VIEW = "silver_db.vw_corrida_taxi_ny"
+# Tabelas lidas pela view da silver (migração 0009)
+SILVER_VIEW_TABLES = [
+    SILVER_TABLE,
+    "silver_db.tb_dominio_fornecedor",
+    "silver_db.tb_dominio_tipo_pagamento",
+]
+
+# Resultados mantidos em memória (cada resultado tem no máximo algumas centenas de linhas)
+CACHE_SIZE = 64
+
+
+@dataclass
+class CacheStats:
+    """Contadores do cache, para acompanhar o aproveitamento no notebook."""
+
+    hits: "int" = 0
+    misses: "int" = 0
+    evictions: "int" = 0
+
+
+class QueryCache:
+    """
+    Cache LRU de resultados de consultas.
+
+    Args:
+        max_entries: Quantidade máxima de resultados; o menos usado recentemente sai primeiro
+    """
+
+    def __init__(self, max_entries: "int" = CACHE_SIZE):
+        if max_entries < 1:
+            raise ValueError("O cache deve comportar ao menos um resultado")
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[tuple, list[Row]]" = OrderedDict()
+        self.stats = CacheStats()
+
+    def get_or_compute(
+        self, key: "tuple", compute: "Callable[[], list[Row]]"
+    ) -> "list[Row]":
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.stats.hits += 1
+            return self.entries[key]
+
+        self.stats.misses += 1
+        result = compute()
+        self.entries[key] = result
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats.evictions += 1
+        return result
+
+    def clear(self) -> "None":
+        self.entries.clear()
+
+
+def table_version(spark: "SparkSession", table: "str", table_format: "str") -> "str":
+    # Identificador que muda a cada escrita na tabela
+    if table_format == "delta":
+        [last_commit] = spark.sql(f"DESCRIBE HISTORY {table} LIMIT 1").collect()
+        return f"delta:{last_commit.version}"
+
+    # A listagem de arquivos da tabela fica em cache na sessão: sem o refresh, escritas de
+    # outros processos (os jobs) não seriam vistas
+    spark.catalog.refreshTable(table)
+    files = sorted(spark.read.table(table).inputFiles())
+    return "arquivos:" + hashlib.sha1("\n".join(files).encode("utf-8")).hexdigest()
+
+
+class Questions:
+    """
+    Perguntas do case com resultados em cache.
+
+    Args:
+        spark: Sessão Spark
+        cache_size: Quantidade máxima de resultados em cache
+    """
+
+    def __init__(self, spark: "SparkSession", cache_size: "int" = CACHE_SIZE):
+        self.spark = spark
+        self.cache = QueryCache(cache_size)
+        # O formato de cada tabela é consultado uma única vez
+        self.table_formats: "dict[str, str]" = {}
+
+    def table_format(self, table: "str") -> "str":
+        if table not in self.table_formats:
+            details = {
+                row.col_name: row.data_type
+                for row in self.spark.sql(f"DESCRIBE TABLE EXTENDED {table}").collect()
+            }
+            self.table_formats[table] = (details.get("Provider") or "").lower()
+        return self.table_formats[table]
+
+    def ask(
+        self,
+        question: "str",
+        params: "dict",
+        tables: "list[str]",
+        query: "Callable[[], DataFrame]",
+    ) -> "list[Row]":
+        """
+        Responde `question` pelo cache ou executando `query`.
+
+        Args:
+            question: Nome da pergunta
+            params: Parâmetros da consulta, parte da chave do cache
+            tables: Tabelas lidas pela consulta, cujas versões compõem a chave do cache
+            query: Monta o DataFrame da resposta
+        """
+        versions = tuple(
+            (table, table_version(self.spark, table, self.table_format(table)))
+            for table in tables
+        )
+        key = (question, tuple(sorted(params.items())), versions)
+        return self.cache.get_or_compute(key, lambda: query().collect())
+
+    def monthly_average_amount(self, service: "str" = "YELLOW") -> "list[Row]":
+        # Média do valor das corridas por mês, sem cancelamentos, corridas sem cobrança
+        # e valores negativos (já separados na gold)
+        def query() -> "DataFrame":
+            return (
+                self.spark.read.table(GOLD_TABLE)
+                .filter(F.col("tipo_servico") == service)
+                .filter("NOT indicador_cancelamento")
+                .filter("NOT indicador_viagem_sem_cobranca")
+                .groupBy("ano_mes_referencia")
+                .agg(
+                    F.round(
+                        F.sum("soma_valor_corrida_positivo")
+                        / F.sum("quantidade_corridas_valor_positivo"),
+                        2,
+                    ).alias("media_valor_corrida")
+                )
+                .orderBy("ano_mes_referencia")
+            )
+
+        return self.ask("media_valor_mensal", {"servico": service}, [GOLD_TABLE], query)
+
+    def hourly_average_passengers(self, month: "str" = "2023-05") -> "list[Row]":
+        # Média de passageiros por hora do embarque no mês, considerando toda a frota
+        def query() -> "DataFrame":
+            return (
+                self.spark.read.table(GOLD_TABLE)
+                .filter(F.col("ano_mes_referencia") == month)
+                .groupBy("ano_mes_referencia", "hora_embarque")
+                .agg(
+                    F.round(
+                        F.sum("soma_passageiros")
+                        / F.sum("quantidade_corridas_com_passageiros"),
+                        2,
+                    ).alias("media_passageiros")
+                )
+                .withColumn(
+                    "hora_embarque", F.lpad(F.col("hora_embarque").cast("string"), 2, "0")
+                )
+                .orderBy("hora_embarque")
+            )
+
+        return self.ask("media_passageiros_hora", {"mes": month}, [GOLD_TABLE], query)
+
+    def negative_amounts_by_payment_type(
+        self, months: "list[str] | None" = None
+    ) -> "list[Row]":
+        # Corridas com valor negativo por tipo de pagamento; None considera todos os meses
+        def query() -> "DataFrame":
+            df = self.spark.read.table(SILVER_VIEW).filter("valor_corrida < 0")
+            if months is not None:
+                df = df.filter(F.col("ano_mes_referencia").isin(months))
+            return df.groupBy("descricao_tipo_pagamento").count().orderBy("count")
+
+        params = {"meses": tuple(sorted(months)) if months is not None else None}
+        return self.ask(
+            "valores_negativos_tipo_pagamento", params, SILVER_VIEW_TABLES, query
+        )
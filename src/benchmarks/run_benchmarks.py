@@ -0,0 +1,240 @@
+"""
+Benchmark local dos pipelines bronze e silver sobre dados sintéticos.
+
+Gera Parquets no formato da TLC (`synthetic_data.py`), cria as tabelas a partir das
+migrações com o backend local (`jobs/backends.py`) e executa `bronze_layer_ingestion.Pipeline` para
+cada base e `silver_layer_etl.Pipeline` em seguida. Para cada etapa, o resultado
+(linhas/s, tempo de planejamento e pico de memória do driver) é emitido em JSON.
+
+Uso (a partir de `src/`, em um ambiente com pyspark e sem databricks-connect):
+
+    python -m benchmarks.run_benchmarks --rows-per-file 200000 --output resultado.json
+"""
+
+import argparse
+from dataclasses import asdict, dataclass, field
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+from pyspark.sql import DataFrame, SparkSession
+
+# Os jobs importam `backends` como módulo irmão (são executados como scripts)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "jobs"))
+
+from backends import LocalBackend
+from benchmarks.synthetic_data import FILE_PREFIXES, generate_dataset
+from jobs import bronze_layer_ingestion, silver_layer_etl
+
+
+@dataclass
+class Arguments:
+    """Classe para armazenar os argumentos do script."""
+
+    bases: "list[str]" = field(default_factory=lambda: list(FILE_PREFIXES))
+    start_month: "str" = "2022-11"
+    end_month: "str" = "2023-02"
+    rows_per_file: "int" = 100_000
+    seed: "int" = 42
+    work_dir: "str | None" = None
+    output: "str | None" = None
+    shuffle_partitions: "int" = 8
+
+    @classmethod
+    def parse_arguments(cls) -> "Arguments":
+        """Parse argumentos da linha de comando."""
+        parser = argparse.ArgumentParser(
+            description="Benchmark local dos pipelines bronze e silver com dados sintéticos"
+        )
+        parser.add_argument(
+            "--bases",
+            default=",".join(FILE_PREFIXES),
+            help="Bases separadas por vírgula (padrão: todas)",
+        )
+        parser.add_argument(
+            "--start-month",
+            default="2022-11",
+            help="Primeiro mês gerado (YYYY-MM). O padrão cruza a mudança de schema de 2023",
+        )
+        parser.add_argument("--end-month", default="2023-02", help="Último mês gerado (YYYY-MM)")
+        parser.add_argument(
+            "--rows-per-file", type=int, default=100_000, help="Linhas por arquivo mensal"
+        )
+        parser.add_argument("--seed", type=int, default=42, help="Semente do gerador")
+        parser.add_argument(
+            "--work-dir",
+            help="Diretório para os dados e o warehouse (padrão: diretório temporário)",
+        )
+        parser.add_argument("--output", help="Arquivo JSON de saída (padrão: stdout)")
+        parser.add_argument(
+            "--shuffle-partitions",
+            type=int,
+            default=8,
+            help="Valor de spark.sql.shuffle.partitions da sessão local",
+        )
+
+        args = parser.parse_args()
+        bases = [base.strip() for base in args.bases.split(",") if base.strip()]
+        invalid = [base for base in bases if base not in FILE_PREFIXES]
+        if invalid:
+            parser.error(f"Bases inválidas: {', '.join(invalid)}")
+
+        return cls(
+            bases=bases,
+            start_month=args.start_month,
+            end_month=args.end_month,
+            rows_per_file=args.rows_per_file,
+            seed=args.seed,
+            work_dir=args.work_dir,
+            output=args.output,
+            shuffle_partitions=args.shuffle_partitions,
+        )
+
+
+@dataclass
+class StageResult:
+    """Resultado de uma etapa do benchmark."""
+
+    etapa: "str"
+    tabela: "str"
+    linhas: "int"
+    segundos: "float"
+    linhas_por_segundo: "float"
+    planejamento_ms: "float"
+    pico_memoria_jvm_mb: "float"
+
+
+class BenchmarkBronzePipeline(bronze_layer_ingestion.Pipeline):
+    """Pipeline bronze que mede o planejamento do DataFrame final antes da escrita."""
+
+    planning_ms: "float" = 0.0
+
+    def write(self, df: "DataFrame") -> "None":
+        self.planning_ms = measure_planning(df)
+        super().write(df)
+
+
+class BenchmarkSilverPipeline(silver_layer_etl.Pipeline):
+    """Pipeline silver que mede o planejamento do DataFrame final antes da escrita."""
+
+    planning_ms: "float" = 0.0
+
+    def cluster(self, df: "DataFrame") -> "DataFrame":
+        df = super().cluster(df)
+        self.planning_ms = measure_planning(df)
+        return df
+
+
+def measure_planning(df: "DataFrame") -> "float":
+    # Análise, otimização e planejamento físico do DataFrame, sem executá-lo
+    started = time.perf_counter()
+    df._jdf.queryExecution().executedPlan()
+    return (time.perf_counter() - started) * 1000
+
+
+class JvmMemory:
+    """Pico de uso do heap da JVM do driver (em modo local, inclui os executores)."""
+
+    def __init__(self, spark: "SparkSession"):
+        management = spark.sparkContext._jvm.java.lang.management.ManagementFactory
+        self.pools = [
+            pool
+            for pool in management.getMemoryPoolMXBeans()
+            if pool.getType().toString() == "Heap memory"
+        ]
+
+    def reset(self) -> "None":
+        for pool in self.pools:
+            pool.resetPeakUsage()
+
+    def peak_mb(self) -> "float":
+        return sum(pool.getPeakUsage().getUsed() for pool in self.pools) / 1024 / 1024
+
+
+def run_stage(
+    spark: "SparkSession",
+    memory: "JvmMemory",
+    stage: "str",
+    table: "str",
+    pipeline: "BenchmarkBronzePipeline | BenchmarkSilverPipeline",
+) -> "StageResult":
+    memory.reset()
+    started = time.perf_counter()
+    pipeline.run()
+    elapsed = time.perf_counter() - started
+
+    rows = spark.read.table(table).count()
+    result = StageResult(
+        etapa=stage,
+        tabela=table,
+        linhas=rows,
+        segundos=round(elapsed, 3),
+        linhas_por_segundo=round(rows / elapsed, 1),
+        planejamento_ms=round(pipeline.planning_ms, 1),
+        pico_memoria_jvm_mb=round(memory.peak_mb(), 1),
+    )
+    print(json.dumps(asdict(result), ensure_ascii=False), file=sys.stderr)
+    return result
+
+
+def run(args: "Arguments") -> "dict":
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="benchmark_pipelines_")
+    months = silver_layer_etl.generate_months_range(args.start_month, args.end_month)
+
+    started = time.perf_counter()
+    prefixes = generate_dataset(
+        os.path.join(work_dir, "landing"), args.bases, months, args.rows_per_file, args.seed
+    )
+    generation_seconds = time.perf_counter() - started
+
+    # Catálogo em memória: cada execução do benchmark parte de um warehouse vazio
+    backend = LocalBackend(
+        os.path.join(work_dir, "warehouse"),
+        persistent_catalog=False,
+        shuffle_partitions=args.shuffle_partitions,
+    )
+    spark = backend.get_spark()
+    memory = JvmMemory(spark)
+
+    results = []
+    for base, prefix in prefixes.items():
+        table = f"bronze_db.nyc_taxi_data_{base}"
+        pipeline = BenchmarkBronzePipeline(spark, backend, prefix, table)
+        results.append(run_stage(spark, memory, "bronze", table, pipeline))
+
+    # OPTIMIZE depende do Delta, indisponível na sessão local
+    pipeline = BenchmarkSilverPipeline(spark, optimize=False)
+    results.append(run_stage(spark, memory, "silver", silver_layer_etl.SILVER_TABLE, pipeline))
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return {
+        "parametros": {**asdict(args), "meses": months},
+        "ambiente": {
+            "python": platform.python_version(),
+            "spark": spark.version,
+            "cpus": os.cpu_count(),
+        },
+        "geracao_segundos": round(generation_seconds, 3),
+        # ru_maxrss em KB no Linux
+        "pico_memoria_python_mb": round(usage.ru_maxrss / 1024, 1),
+        "resultados": [asdict(result) for result in results],
+    }
+
+
+def main():
+    args = Arguments.parse_arguments()
+    report = json.dumps(run(args), ensure_ascii=False, indent=2)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(report)
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Gerador de Parquets sintéticos no formato dos arquivos da TLC.
+
+Os arquivos seguem o layout da landing (`nyc_taxi_data_<base>/ano_mes_referencia=YYYY-MM/`)
+e reproduzem a deriva de schema entre anos dos arquivos reais: tipos inteiros que viram
+double (ou o contrário) e colunas que mudam de capitalização. Com a mesma semente, o
+mesmo mês de uma base gera sempre o mesmo conteúdo, independente dos demais meses.
+"""
+
+import calendar
+from datetime import datetime, timezone
+import os
+import zlib
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+FILE_PREFIXES = {
+    "yellow": "yellow_tripdata",
+    "green": "green_tripdata",
+    "forhire": "fhv_tripdata",
+    "highvolumeforhire": "fhvhv_tripdata",
+}
+
+# Arquivos a partir deste ano usam o schema "novo" de cada base
+DRIFT_YEAR = 2023
+
+BASE_NUMBERS = ["B02510", "B02512", "B02617", "B02682", "B02764", "B02765", "B02869"]
+HVFHS_LICENSES = ["HV0002", "HV0003", "HV0004", "HV0005"]
+
+# Valores repetidos funcionam como pesos na escolha aleatória
+PASSENGER_COUNTS = [1] * 14 + [2] * 3 + [3, 4, 0]
+PAYMENT_TYPES = [1] * 30 + [2] * 7 + [3, 4]
+
+
+class RandomColumns:
+    """Colunas aleatórias reproduzíveis de um arquivo (semente, base e mês)."""
+
+    def __init__(self, seed: "int", base: "str", month: "str", rows: "int"):
+        self.seed = seed
+        self.base = base
+        self.month = month
+        self.rows = rows
+
+        year, month_number = (int(part) for part in month.split("-"))
+        start = datetime(year, month_number, 1, tzinfo=timezone.utc)
+        self.month_start = int(start.timestamp())
+        self.month_seconds = calendar.monthrange(year, month_number)[1] * 86400
+
+    def uniform(self, column: "str") -> "pa.Array":
+        # Cada coluna tem sua própria sequência, derivada da semente, da base e do mês
+        key = f"{self.seed}:{self.base}:{self.month}:{column}".encode("utf-8")
+        return pc.random(self.rows, initializer=zlib.crc32(key))
+
+    def integers(
+        self, column: "str", low: "int", high: "int", type: "pa.DataType" = pa.int64()
+    ) -> "pa.Array":
+        # Inteiros no intervalo [low, high]
+        values = pc.floor(pc.multiply(self.uniform(column), high - low + 1))
+        return pc.cast(pc.add(pc.cast(values, pa.int64()), low), type)
+
+    def choice(
+        self, column: "str", values: "list", type: "pa.DataType | None" = None
+    ) -> "pa.Array":
+        indices = self.integers(column, 0, len(values) - 1)
+        return pc.take(pa.array(values, type=type), indices)
+
+    def amounts(self, column: "str", low: "float", high: "float") -> "pa.Array":
+        values = pc.add(pc.multiply(self.uniform(column), high - low), low)
+        return pc.round(values, 2)
+
+    def timestamps(self, column: "str") -> "pa.Array":
+        # Instantes distribuídos ao longo do mês de referência
+        seconds = self.integers(column, 0, self.month_seconds - 1)
+        return pc.cast(pc.add(seconds, self.month_start), pa.timestamp("s"))
+
+    def shift(self, timestamps: "pa.Array", column: "str", low: "int", high: "int") -> "pa.Array":
+        # Soma a cada instante um deslocamento aleatório em segundos
+        seconds = pc.cast(pc.cast(timestamps, pa.timestamp("s")), pa.int64())
+        seconds = pc.add(seconds, self.integers(column, low, high))
+        return pc.cast(pc.cast(seconds, pa.timestamp("s")), pa.timestamp("us"))
+
+    def with_nulls(self, array: "pa.Array", column: "str", ratio: "float") -> "pa.Array":
+        mask = pc.less(self.uniform(f"{column}:nulos"), ratio)
+        return pc.if_else(mask, pa.scalar(None, array.type), array)
+
+
+def taximeter_columns(
+    columns: "RandomColumns", prefix: "str", drift: "bool"
+) -> "dict[str, pa.Array]":
+    """Colunas comuns às bases com taxímetro (yellow e green)."""
+    pickup = columns.timestamps("pickup")
+    payment_type = columns.choice("payment_type", PAYMENT_TYPES, pa.int64())
+    fare_amount = columns.amounts("fare_amount", 3.0, 70.0)
+    tip_amount = columns.amounts("tip_amount", 0.0, 15.0)
+    tolls_amount = columns.choice("tolls_amount", [0.0] * 9 + [6.94])
+    total_amount = pc.add(pc.add(pc.add(fare_amount, tip_amount), tolls_amount), 5.0)
+    # Contestações aparecem com o valor estornado (negativo)
+    total_amount = pc.if_else(
+        pc.equal(payment_type, 4), pc.negate(total_amount), total_amount
+    )
+
+    passenger_count = columns.choice("passenger_count", PASSENGER_COUNTS, pa.int64())
+    if not drift:
+        passenger_count = pc.cast(passenger_count, pa.float64())
+
+    location_type = pa.int32() if drift else pa.int64()
+    return {
+        "VendorID": columns.choice(
+            "VendorID", [1, 2, 2, 2], pa.int32() if drift else pa.int64()
+        ),
+        f"{prefix}_pickup_datetime": pc.cast(pickup, pa.timestamp("us")),
+        f"{prefix}_dropoff_datetime": columns.shift(pickup, "dropoff", 60, 3600),
+        "passenger_count": columns.with_nulls(passenger_count, "passenger_count", 0.02),
+        "trip_distance": columns.amounts("trip_distance", 0.3, 20.0),
+        "RatecodeID": pc.cast(
+            columns.choice("RatecodeID", [1] * 18 + [2, 5]),
+            pa.int64() if drift else pa.float64(),
+        ),
+        "store_and_fwd_flag": columns.choice("store_and_fwd_flag", ["N"] * 49 + ["Y"]),
+        "PULocationID": columns.integers("PULocationID", 1, 265, location_type),
+        "DOLocationID": columns.integers("DOLocationID", 1, 265, location_type),
+        "payment_type": payment_type,
+        "fare_amount": fare_amount,
+        "extra": columns.choice("extra", [0.0, 1.0, 2.5]),
+        "mta_tax": columns.choice("mta_tax", [0.5] * 19 + [0.0]),
+        "tip_amount": tip_amount,
+        "tolls_amount": tolls_amount,
+        "improvement_surcharge": columns.choice("improvement_surcharge", [1.0]),
+        "total_amount": total_amount,
+        "congestion_surcharge": columns.choice("congestion_surcharge", [2.5] * 4 + [0.0]),
+    }
+
+
+def yellow_columns(columns: "RandomColumns", drift: "bool") -> "dict[str, pa.Array]":
+    data = taximeter_columns(columns, "tpep", drift)
+    airport_fee = columns.choice("airport_fee", [0.0] * 9 + [1.25])
+    # A capitalização da coluna muda entre os anos
+    data["Airport_fee" if drift else "airport_fee"] = airport_fee
+    return data
+
+
+def green_columns(columns: "RandomColumns", drift: "bool") -> "dict[str, pa.Array]":
+    data = taximeter_columns(columns, "lpep", drift)
+    data["ehail_fee"] = pa.nulls(columns.rows, pa.float64())
+    trip_type = columns.choice("trip_type", [1] * 19 + [2], pa.int64())
+    data["trip_type"] = trip_type if drift else pc.cast(trip_type, pa.float64())
+    data["payment_type"] = (
+        data["payment_type"] if drift else pc.cast(data["payment_type"], pa.float64())
+    )
+    return data
+
+
+def forhire_columns(columns: "RandomColumns", drift: "bool") -> "dict[str, pa.Array]":
+    pickup = columns.timestamps("pickup")
+    location_type = pa.int64() if drift else pa.float64()
+    return {
+        "dispatching_base_num": columns.choice("dispatching_base_num", BASE_NUMBERS),
+        "pickup_datetime": pc.cast(pickup, pa.timestamp("us")),
+        "dropOff_datetime": columns.shift(pickup, "dropoff", 60, 3600),
+        "PUlocationID": columns.with_nulls(
+            pc.cast(columns.integers("PUlocationID", 1, 265), location_type),
+            "PUlocationID",
+            0.2,
+        ),
+        "DOlocationID": columns.with_nulls(
+            pc.cast(columns.integers("DOlocationID", 1, 265), location_type),
+            "DOlocationID",
+            0.2,
+        ),
+        "SR_Flag": pa.nulls(columns.rows, location_type),
+        "Affiliated_base_number": columns.choice("Affiliated_base_number", BASE_NUMBERS),
+    }
+
+
+def highvolumeforhire_columns(
+    columns: "RandomColumns", drift: "bool"
+) -> "dict[str, pa.Array]":
+    request = columns.timestamps("request")
+    on_scene = columns.shift(request, "on_scene", 60, 600)
+    pickup = columns.shift(request, "pickup", 120, 900)
+    location_type = pa.int32() if drift else pa.int64()
+    flags = ["N"] * 9 + ["Y"]
+    return {
+        "hvfhs_license_num": columns.choice("hvfhs_license_num", HVFHS_LICENSES),
+        "dispatching_base_num": columns.choice("dispatching_base_num", BASE_NUMBERS),
+        "originating_base_num": columns.choice("originating_base_num", BASE_NUMBERS),
+        "request_datetime": pc.cast(request, pa.timestamp("us")),
+        "on_scene_datetime": on_scene,
+        "pickup_datetime": pickup,
+        "dropoff_datetime": columns.shift(pickup, "dropoff", 60, 3600),
+        "PULocationID": columns.integers("PULocationID", 1, 265, location_type),
+        "DOLocationID": columns.integers("DOLocationID", 1, 265, location_type),
+        "trip_miles": columns.amounts("trip_miles", 0.3, 25.0),
+        "trip_time": columns.integers("trip_time", 60, 3600),
+        "base_passenger_fare": columns.amounts("base_passenger_fare", 5.0, 80.0),
+        "tolls": columns.choice("tolls", [0.0] * 9 + [6.94]),
+        "bcf": columns.amounts("bcf", 0.1, 2.5),
+        "sales_tax": columns.amounts("sales_tax", 0.5, 7.0),
+        "congestion_surcharge": columns.choice("congestion_surcharge", [2.75] * 4 + [0.0]),
+        "airport_fee": columns.choice("airport_fee", [0.0] * 9 + [2.5]),
+        "tips": columns.choice("tips", [0.0] * 4 + [2.0, 5.0]),
+        "driver_pay": columns.amounts("driver_pay", 5.0, 60.0),
+        "shared_request_flag": columns.choice("shared_request_flag", flags),
+        "shared_match_flag": columns.choice("shared_match_flag", flags),
+        "access_a_ride_flag": columns.choice("access_a_ride_flag", [" "] * 9 + ["N"]),
+        "wav_request_flag": columns.choice("wav_request_flag", flags),
+        "wav_match_flag": columns.choice("wav_match_flag", flags),
+    }
+
+
+COLUMN_BUILDERS = {
+    "yellow": yellow_columns,
+    "green": green_columns,
+    "forhire": forhire_columns,
+    "highvolumeforhire": highvolumeforhire_columns,
+}
+
+
+def generate_table(base: "str", month: "str", rows: "int", seed: "int") -> "pa.Table":
+    """Gera o conteúdo de um arquivo mensal da base, com o schema do ano do mês."""
+    columns = RandomColumns(seed, base, month, rows)
+    drift = int(month[:4]) >= DRIFT_YEAR
+    return pa.table(COLUMN_BUILDERS[base](columns, drift))
+
+
+def generate_dataset(
+    root: "str",
+    bases: "list[str]",
+    months: "list[str]",
+    rows_per_file: "int",
+    seed: "int" = 42,
+) -> "dict[str, str]":
+    """
+    Escreve um arquivo por base e mês em `root` no layout da landing.
+
+    Returns:
+        Diretório gerado para cada base (equivalente ao prefixo da landing)
+    """
+    prefixes = {}
+    for base in bases:
+        prefix = os.path.join(root, f"nyc_taxi_data_{base}")
+        for month in months:
+            directory = os.path.join(prefix, f"ano_mes_referencia={month}")
+            os.makedirs(directory, exist_ok=True)
+            pq.write_table(
+                generate_table(base, month, rows_per_file, seed),
+                os.path.join(directory, f"{FILE_PREFIXES[base]}_{month}.parquet"),
+            )
+        prefixes[base] = prefix
+
+    return prefixes
@@ -0,0 +1,405 @@
+"""
+Motor Arrow da ingestão bronze.
+
+Para cargas pequenas, a ingestão roda em um único processo com pyarrow: os Parquets da
+landing são lidos em lotes de registros (memória limitada pelo tamanho do lote),
+convertidos para o schema da tabela bronze com as mesmas regras do motor Spark (nomes em
+minúsculo, coluna de partição extraída do caminho, colunas ausentes nulas e colunas extras
+ignoradas) e gravados em um diretório de preparação. Só depois de todos gravados, os
+arquivos entram nas partições da tabela, que são registradas no catálogo.
+
+Só tabelas Parquet (backend local) são gravadas pelo motor. Tabelas Delta seguem pelo motor
+Spark: escritas fora do Spark não passam pelo Unity Catalog (permissões, linhagem e
+credenciais da tabela) nem pelo controle de concorrência dos commits no S3.
+
+O motor só aceita conversões que o pyarrow faz com o mesmo resultado do Spark (tipos
+iguais ou conversões sem perda); as demais divergências de schema ficam com o motor Spark.
+"""
+
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Iterator
+import uuid
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+from pyspark.sql.types import (
+    BooleanType,
+    ByteType,
+    DataType,
+    DateType,
+    DecimalType,
+    DoubleType,
+    FloatType,
+    IntegerType,
+    LongType,
+    ShortType,
+    StringType,
+    StructField,
+    StructType,
+    TimestampNTZType,
+    TimestampType,
+)
+
+if TYPE_CHECKING:
+    from pyspark.sql import SparkSession
+
+    from backends import Backend
+    from bronze_layer_ingestion import SchemaReconciler
+
+PARTITION_COLUMN = "ano_mes_referencia"
+INGESTION_COLUMN = "data_hora_ingestao"
+
+# Linhas por lote lido da landing: limita a memória do processo
+ARROW_BATCH_ROWS = 128 * 1024
+
+# Tipos simples do Spark e seus equivalentes no Arrow. TIMESTAMP do Spark é um instante
+# (UTC); TIMESTAMP_NTZ não tem fuso
+SPARK_TO_ARROW = [
+    (BooleanType, pa.bool_()),
+    (ByteType, pa.int8()),
+    (ShortType, pa.int16()),
+    (IntegerType, pa.int32()),
+    (LongType, pa.int64()),
+    (FloatType, pa.float32()),
+    (DoubleType, pa.float64()),
+    (StringType, pa.string()),
+    (DateType, pa.date32()),
+    (TimestampType, pa.timestamp("us", tz="UTC")),
+    (TimestampNTZType, pa.timestamp("us")),
+]
+
+
+def to_arrow_type(data_type: "DataType") -> "pa.DataType | None":
+    if isinstance(data_type, DecimalType):
+        return pa.decimal128(data_type.precision, data_type.scale)
+    for spark_type, arrow_type in SPARK_TO_ARROW:
+        if isinstance(data_type, spark_type):
+            return arrow_type
+    return None
+
+
+def to_spark_type(arrow_type: "pa.DataType") -> "DataType | None":
+    # Tipo com que o Spark leria a coluna do Parquet
+    if pa.types.is_timestamp(arrow_type):
+        return TimestampType() if arrow_type.tz is not None else TimestampNTZType()
+    if pa.types.is_large_string(arrow_type) or pa.types.is_dictionary(arrow_type):
+        return to_spark_type(
+            pa.string() if pa.types.is_large_string(arrow_type) else arrow_type.value_type
+        )
+    if pa.types.is_decimal(arrow_type):
+        return DecimalType(arrow_type.precision, arrow_type.scale)
+    for spark_type, candidate in SPARK_TO_ARROW:
+        if not pa.types.is_timestamp(candidate) and candidate == arrow_type:
+            return spark_type()
+    return None
+
+
+def strip_scheme(path: "str") -> "str | None":
+    """Caminho sem esquema, como o pyarrow o recebe, ou None se o esquema não é suportado."""
+    if path.startswith("file:"):
+        return path.removeprefix("file:")
+    if path.startswith("/"):
+        return path
+    for scheme in ["s3://", "s3a://"]:
+        if path.startswith(scheme):
+            return path.removeprefix(scheme)
+    return None
+
+
+def resolve_filesystem(
+    backend: "Backend", path: "str"
+) -> "tuple[pafs.FileSystem, str] | None":
+    """Sistema de arquivos do pyarrow e caminho sem esquema, ou None se não suportado."""
+    bare_path = strip_scheme(path)
+    if bare_path is None:
+        return None
+    if bare_path == path or path.startswith("file:"):
+        return pafs.LocalFileSystem(), bare_path
+
+    endpoint = backend.s3_endpoint_url
+    filesystem = pafs.S3FileSystem(
+        access_key=backend.get_secret("s3-access-keys", "AWS_ACCESS_KEY_ID"),
+        secret_key=backend.get_secret("s3-access-keys", "AWS_SECRET_ACCESS_KEY"),
+        endpoint_override=endpoint,
+        region=None if endpoint else pafs.resolve_s3_region(bare_path.split("/")[0]),
+    )
+    return filesystem, bare_path
+
+
+def read_spark_schema(filesystem: "pafs.FileSystem", path: "str") -> "StructType | None":
+    """
+    Schema com que o Spark leria o Parquet, a partir apenas do footer; None se alguma
+    coluna não tem tipo equivalente no Spark.
+    """
+    with filesystem.open_input_file(path) as source:
+        parquet_file = pq.ParquetFile(source)
+        # INT96 (timestamps legados do Spark e do Hive) é lido pelo Spark como TIMESTAMP;
+        # o pyarrow o apresenta sem fuso
+        int96 = {
+            parquet_file.schema.column(index).path
+            for index in range(len(parquet_file.schema))
+            if parquet_file.schema.column(index).physical_type == "INT96"
+        }
+        arrow_schema = parquet_file.schema_arrow
+
+    fields = []
+    for field in arrow_schema:
+        data_type = TimestampType() if field.name in int96 else to_spark_type(field.type)
+        if data_type is None:
+            return None
+        fields.append(StructField(field.name, data_type))
+    return StructType(fields)
+
+
+class ArrowIngestion:
+    """
+    Ingestão de arquivos da landing em uma tabela bronze com pyarrow.
+
+    Args:
+        spark: Sessão usada apenas para os metadados da tabela e o registro das partições
+        backend: Backend de execução (segredos e endpoint do S3)
+        target_table: Tabela bronze de destino
+        reconciler: Reconciliador do motor Spark, cujas regras de conversão são reaproveitadas
+        batch_rows: Linhas por lote lido da landing
+    """
+
+    def __init__(
+        self,
+        spark: "SparkSession",
+        backend: "Backend",
+        target_table: "str",
+        reconciler: "SchemaReconciler",
+        batch_rows: "int" = ARROW_BATCH_ROWS,
+    ):
+        self.spark = spark
+        self.backend = backend
+        self.target_table = target_table
+        self.reconciler = reconciler
+        self.target_schema = reconciler.target_schema
+        self.batch_rows = batch_rows
+        arrow_types = [to_arrow_type(field.dataType) for field in self.target_schema.fields]
+        self.arrow_schema: "pa.Schema | None" = (
+            pa.schema(
+                [
+                    pa.field(field.name, arrow_type)
+                    for field, arrow_type in zip(self.target_schema.fields, arrow_types)
+                ]
+            )
+            if all(arrow_types)
+            else None
+        )
+        # Schema de cada arquivo lido pelo footer (preenchido por unsupported_reasons)
+        self.source_schemas: "dict[str, StructType]" = {}
+
+        details = {
+            row.col_name: row.data_type
+            for row in spark.sql(f"DESCRIBE TABLE EXTENDED {target_table}").collect()
+        }
+        self.table_format = (details.get("Provider") or "").lower()
+        self.location = details.get("Location") or ""
+
+    def is_compatible(self, source: "DataType", target: "DataType") -> "bool":
+        # Conversões em que o pyarrow e o Spark produzem o mesmo valor. Strings ficam
+        # de fora: o Spark converte textos inválidos em nulo e formata números de outro jeito
+        if source == target:
+            return True
+        if isinstance(source, StringType) or isinstance(target, StringType):
+            return False
+        if not self.reconciler.is_lossless_cast(source, target):
+            return False
+        # TIMESTAMP_NTZ e DATE viram instantes no fuso da sessão; o Arrow assume UTC
+        if isinstance(source, (TimestampNTZType, DateType)) and isinstance(
+            target, TimestampType
+        ):
+            return self.spark.conf.get("spark.sql.session.timeZone") in ["UTC", "Etc/UTC"]
+        return True
+
+    def read_schema(self, path: "str") -> "StructType | None":
+        # Lê só o footer do Parquet; None se alguma coluna não tem tipo equivalente no Spark
+        return read_spark_schema(*resolve_filesystem(self.backend, path))
+
+    def with_job_columns(self, schema: "StructType") -> "StructType":
+        # Schema de origem acrescido das colunas que o job adiciona a cada registro
+        fields = [
+            field
+            for field in schema.fields
+            if field.name.lower() not in [INGESTION_COLUMN, PARTITION_COLUMN]
+        ]
+        return StructType(
+            fields
+            + [
+                StructField(PARTITION_COLUMN, StringType()),
+                StructField(INGESTION_COLUMN, TimestampType()),
+            ]
+        )
+
+    def unsupported_reasons(self, paths: "list[str]") -> "list[str]":
+        """Motivos que impedem o motor Arrow de ingerir os arquivos (vazio se suportado)."""
+        if self.arrow_schema is None:
+            return [f"{self.target_table} tem tipos sem equivalente no Arrow"]
+        if self.table_format != "parquet":
+            return [f"formato {self.table_format or 'desconhecido'} não suportado"]
+        if resolve_filesystem(self.backend, self.location) is None:
+            return [f"local da tabela não suportado: {self.location}"]
+
+        reasons = []
+        target_fields = {field.name: field.dataType for field in self.target_schema.fields}
+        for path in paths:
+            if resolve_filesystem(self.backend, path) is None:
+                return [f"caminho não suportado: {path}"]
+
+            schema = self.read_schema(path)
+            if schema is None:
+                reasons.append(f"{path}: tipos sem equivalente no Spark")
+                continue
+            self.source_schemas[path] = schema
+
+            seen = set()
+            for field in schema.fields:
+                name = field.name.lower()
+                if name in seen or name not in target_fields:
+                    continue
+                seen.add(name)
+                if not self.is_compatible(field.dataType, target_fields[name]):
+                    reasons.append(
+                        f"{path}: {name} {field.dataType.simpleString()} -> "
+                        f"{target_fields[name].simpleString()}"
+                    )
+
+        return reasons
+
+    def reconcile_batch(
+        self, batch: "pa.RecordBatch", month: "str", ingested_at: "datetime"
+    ) -> "pa.RecordBatch":
+        """Converte um lote da landing para o schema da tabela de destino."""
+        # Nomes de origem indexados em minúsculo (o primeiro vence em caso de duplicidade)
+        columns: "dict[str, pa.Array]" = {}
+        for name, column in zip(batch.schema.names, batch.columns):
+            columns.setdefault(name.lower(), column)
+        # Colunas adicionadas pelo job, como no withColumn do motor Spark
+        rows = batch.num_rows
+        columns[INGESTION_COLUMN] = pa.array([ingested_at] * rows, pa.timestamp("us", tz="UTC"))
+        columns[PARTITION_COLUMN] = pa.array([month] * rows, pa.string())
+
+        arrays = []
+        for field in self.arrow_schema:
+            column = columns.get(field.name)
+            if column is None:
+                arrays.append(pa.nulls(rows, field.type))
+                continue
+            if pa.types.is_dictionary(column.type):
+                column = column.dictionary_decode()
+            arrays.append(column if column.type == field.type else pc.cast(column, field.type))
+
+        return pa.RecordBatch.from_arrays(arrays, schema=self.arrow_schema)
+
+    def iter_batches(
+        self, months_by_path: "dict[str, str]", ingested_at: "datetime"
+    ) -> "Iterator[pa.RecordBatch]":
+        for path, month in months_by_path.items():
+            filesystem, file_path = resolve_filesystem(self.backend, path)
+            with filesystem.open_input_file(file_path) as source:
+                for batch in pq.ParquetFile(source).iter_batches(batch_size=self.batch_rows):
+                    yield self.reconcile_batch(batch, month, ingested_at)
+
+    def write(self, months_by_path: "dict[str, str]", months: "list[str] | None") -> "int":
+        """
+        Sobrescreve na tabela os meses dos arquivos (ou a tabela inteira, se `months`
+        é None) e retorna a quantidade de linhas gravadas.
+        """
+        rows = self.write_parquet(months_by_path, months, datetime.now(timezone.utc))
+        self.spark.sql(f"REFRESH TABLE {self.target_table}")
+        return rows
+
+    def write_parquet(
+        self,
+        months_by_path: "dict[str, str]",
+        months: "list[str] | None",
+        ingested_at: "datetime",
+    ) -> "int":
+        filesystem, location = resolve_filesystem(self.backend, self.location)
+        # Nas tabelas Parquet a partição fica só no caminho, não no arquivo
+        file_schema = self.arrow_schema.remove(
+            self.arrow_schema.get_field_index(PARTITION_COLUMN)
+        )
+
+        # Os arquivos novos são gravados primeiro em um diretório de preparação, ignorado
+        # pelo Spark (prefixo "_"). As partições da tabela só são tocadas depois que todos
+        # foram gravados: uma falha na leitura ou na conversão deixa a tabela intacta
+        write_id = uuid.uuid4().hex
+        staging = f"{location}/_staging_arrow-{write_id}"
+        staged: "dict[str, list[str]]" = {}
+        rows = 0
+        filesystem.create_dir(staging)
+        try:
+            # Um arquivo de saída por arquivo da landing, gravado lote a lote
+            for index, (path, month) in enumerate(months_by_path.items()):
+                directory = f"{staging}/{PARTITION_COLUMN}={month}"
+                filesystem.create_dir(directory)
+                name = f"part-{index:05d}-{write_id}.parquet"
+                with pq.ParquetWriter(
+                    f"{directory}/{name}", file_schema, filesystem=filesystem
+                ) as writer:
+                    for batch in self.iter_batches({path: month}, ingested_at):
+                        writer.write_batch(batch.drop_columns([PARTITION_COLUMN]))
+                        rows += batch.num_rows
+                staged.setdefault(month, []).append(name)
+        except Exception:
+            filesystem.delete_dir(staging)
+            raise
+
+        self.swap_partitions(filesystem, location, staging, staged, months)
+        return rows
+
+    def swap_partitions(
+        self,
+        filesystem: "pafs.FileSystem",
+        location: "str",
+        staging: "str",
+        staged: "dict[str, list[str]]",
+        months: "list[str] | None",
+    ) -> "None":
+        # Mesma semântica do insertInto: sobrescrita dinâmica dos meses ou da tabela inteira
+        selector = pafs.FileSelector(location, allow_not_found=True)
+        existing = {
+            info.base_name.split("=", 1)[1]
+            for info in filesystem.get_file_info(selector)
+            if info.type == pafs.FileType.Directory
+            and info.base_name.startswith(f"{PARTITION_COLUMN}=")
+        }
+        written = set(staged)
+        replaced = (existing & written) if months is not None else existing
+
+        # Em cada mês, os arquivos novos entram antes de os antigos saírem: leitores
+        # concorrentes nunca encontram o mês vazio
+        for month in sorted(written):
+            directory = f"{location}/{PARTITION_COLUMN}={month}"
+            old_files = []
+            if month in replaced:
+                old_files = [
+                    info.path
+                    for info in filesystem.get_file_info(pafs.FileSelector(directory))
+                    if info.type == pafs.FileType.File
+                ]
+            filesystem.create_dir(directory)
+            for name in staged[month]:
+                filesystem.move(
+                    f"{staging}/{PARTITION_COLUMN}={month}/{name}", f"{directory}/{name}"
+                )
+            for path in old_files:
+                filesystem.delete_file(path)
+            self.spark.sql(
+                f"ALTER TABLE {self.target_table} ADD IF NOT EXISTS "
+                f"PARTITION ({PARTITION_COLUMN}='{month}')"
+            )
+
+        # Sobrescrita da tabela inteira: meses ausentes da carga deixam de existir
+        for month in sorted(replaced - written):
+            filesystem.delete_dir(f"{location}/{PARTITION_COLUMN}={month}")
+            self.spark.sql(
+                f"ALTER TABLE {self.target_table} DROP IF EXISTS "
+                f"PARTITION ({PARTITION_COLUMN}='{month}')"
+            )
+        filesystem.delete_dir(staging)
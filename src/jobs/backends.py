@@ -0,0 +1,219 @@
+"""
+Backends de execução dos jobs.
+
+Os jobs dependem do ambiente para três coisas: listar arquivos da landing, ler segredos
+e obter uma SparkSession com o catálogo das camadas (`bronze_db`, `silver_db`, `gold_db`).
+
+- `DatabricksBackend`: `dbutils` do workspace e a sessão ativa do cluster (padrão dos jobs)
+- `LocalBackend`: disco local, variáveis de ambiente e uma SparkSession local com as
+  tabelas criadas a partir das migrações em `migrations/`
+"""
+
+from dataclasses import dataclass
+import glob
+import os
+import re
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from pyspark.sql import SparkSession
+
+BACKENDS = ["databricks", "local"]
+
+MIGRATIONS_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "migrations"
+)
+DATABASES = ["bronze_db", "silver_db", "gold_db"]
+
+
+@dataclass
+class FileInfo:
+    """Arquivo ou diretório listado pelo backend (mesmos campos do `dbutils.fs.ls`)."""
+
+    path: "str"
+    name: "str"
+    size: "int"
+
+
+class Backend:
+    """Interface comum dos backends de execução."""
+
+    # Nome usado em --backend e em get_backend
+    name: "str"
+    # Recursos do Delta (MERGE, OPTIMIZE) disponíveis nas tabelas do catálogo
+    supports_delta: "bool" = False
+    # Endpoint de um serviço compatível com S3; None usa a AWS
+    s3_endpoint_url: "str | None" = None
+
+    def get_spark(self) -> "SparkSession":
+        raise NotImplementedError
+
+    def list_files(self, path: "str") -> "list[FileInfo]":
+        raise NotImplementedError
+
+    def get_secret(self, scope: "str", key: "str") -> "str":
+        raise NotImplementedError
+
+
+class DatabricksBackend(Backend):
+    """Execução em jobs do Databricks: dbutils do workspace e sessão ativa do cluster."""
+
+    name = "databricks"
+    supports_delta = True
+
+    def __init__(self):
+        self._dbutils = None
+
+    @property
+    def dbutils(self):
+        # Import tardio: o SDK só é necessário quando o backend é usado
+        if self._dbutils is None:
+            from databricks.sdk import WorkspaceClient
+
+            self._dbutils = WorkspaceClient().dbutils
+        return self._dbutils
+
+    def get_spark(self) -> "SparkSession":
+        from pyspark.sql import SparkSession
+
+        return SparkSession.getActiveSession()
+
+    def list_files(self, path: "str") -> "list[FileInfo]":
+        return [
+            FileInfo(path=file.path, name=file.name, size=file.size)
+            for file in self.dbutils.fs.ls(path)
+        ]
+
+    def get_secret(self, scope: "str", key: "str") -> "str":
+        return self.dbutils.secrets.get(scope, key)
+
+
+class LocalBackend(Backend):
+    """
+    Execução local: disco, variáveis de ambiente e uma SparkSession local.
+
+    Args:
+        warehouse_dir: Diretório das tabelas e do metastore (padrão: $LOCAL_WAREHOUSE_DIR
+            ou `.local_lakehouse`)
+        persistent_catalog: Mantém o catálogo em um metastore Derby no warehouse, para que
+            jobs executados em processos distintos enxerguem as mesmas tabelas. Sem ele, o
+            catálogo fica em memória e a sessão inicia mais rápido (testes)
+        shuffle_partitions: Partições de shuffle, dimensionadas para volumes pequenos
+        s3_endpoint_url: Endpoint de um serviço compatível com S3 (MinIO, moto_server) usado
+            pelo download (padrão: $LOCAL_S3_ENDPOINT_URL)
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        warehouse_dir: "str | None" = None,
+        persistent_catalog: "bool" = True,
+        shuffle_partitions: "int" = 4,
+        s3_endpoint_url: "str | None" = None,
+    ):
+        self.warehouse_dir = os.path.abspath(
+            warehouse_dir or os.environ.get("LOCAL_WAREHOUSE_DIR", ".local_lakehouse")
+        )
+        self.persistent_catalog = persistent_catalog
+        self.shuffle_partitions = shuffle_partitions
+        self.s3_endpoint_url = s3_endpoint_url or os.environ.get("LOCAL_S3_ENDPOINT_URL")
+        self._spark: "SparkSession | None" = None
+
+    def get_spark(self) -> "SparkSession":
+        if self._spark is None:
+            self._spark = self.create_session()
+            self.create_catalog(self._spark)
+        return self._spark
+
+    def create_session(self) -> "SparkSession":
+        # Import tardio: o download usa o backend sem depender do pyspark
+        from pyspark.sql import SparkSession
+
+        builder = (
+            SparkSession.builder.master(f"local[{min(os.cpu_count() or 1, 4)}]")
+            .appName("nyc_taxi_local")
+            .config("spark.sql.warehouse.dir", os.path.join(self.warehouse_dir, "warehouse"))
+            # Volumes pequenos: poucas partições de shuffle e sem UI/barra de progresso
+            .config("spark.sql.shuffle.partitions", str(self.shuffle_partitions))
+            .config("spark.default.parallelism", str(self.shuffle_partitions))
+            .config("spark.ui.enabled", "false")
+            .config("spark.ui.showConsoleProgress", "false")
+            .config("spark.sql.session.timeZone", "UTC")
+            # Pools do escalonador da ingestão bronze simultânea (--bases)
+            .config("spark.scheduler.mode", "FAIR")
+            # Tabelas das migrações sem USING viram tabelas Parquet, não Hive SerDe
+            .config("spark.sql.legacy.createHiveTableByDefault", "false")
+        )
+        if self.persistent_catalog:
+            metastore = os.path.join(self.warehouse_dir, "metastore_db")
+            builder = (
+                builder.config(
+                    "spark.hadoop.javax.jdo.option.ConnectionURL",
+                    f"jdbc:derby:;databaseName={metastore};create=true",
+                )
+                # derby.log no warehouse, e não no diretório corrente
+                .config(
+                    "spark.driver.extraJavaOptions",
+                    f"-Dderby.system.home={self.warehouse_dir}",
+                )
+                .enableHiveSupport()
+            )
+
+        return builder.getOrCreate()
+
+    def create_catalog(self, spark: "SparkSession") -> "None":
+        # As migrações são idempotentes (IF NOT EXISTS, INSERT OVERWRITE, OR REPLACE)
+        for database in DATABASES:
+            spark.sql(f"CREATE DATABASE IF NOT EXISTS {database}")
+
+        for path in sorted(glob.glob(os.path.join(MIGRATIONS_DIR, "*.sql"))):
+            with open(path, encoding="utf-8") as file:
+                sql = re.sub(r"^\s*--.*$", "", file.read(), flags=re.MULTILINE)
+            for statement in sql.split(";"):
+                if statement.strip():
+                    spark.sql(statement)
+
+    def list_files(self, path: "str") -> "list[FileInfo]":
+        directory = path.removeprefix("file:")
+        files = []
+        for name in sorted(os.listdir(directory)):
+            full_path = os.path.join(directory, name)
+            is_dir = os.path.isdir(full_path)
+            suffix = "/" if is_dir else ""
+            files.append(
+                FileInfo(
+                    path=f"file:{full_path}{suffix}",
+                    name=f"{name}{suffix}",
+                    size=0 if is_dir else os.path.getsize(full_path),
+                )
+            )
+        return files
+
+    def get_secret(self, scope: "str", key: "str") -> "str":
+        # Segredo lido de <ESCOPO>_<CHAVE> (ex.: S3_ACCESS_KEYS_AWS_ACCESS_KEY_ID) ou <CHAVE>
+        scoped = re.sub(r"[^0-9A-Za-z]", "_", f"{scope}_{key}").upper()
+        for variable in [scoped, key]:
+            if variable in os.environ:
+                return os.environ[variable]
+
+        raise KeyError(f"Segredo {scope}/{key} não encontrado (defina {scoped} ou {key})")
+
+
+def get_backend(name: "str") -> "Backend":
+    if name == "databricks":
+        return DatabricksBackend()
+    if name == "local":
+        return LocalBackend()
+
+    raise ValueError(f"Backend inválido: {name!r} (disponíveis: {', '.join(BACKENDS)})")
+
+
+def add_backend_argument(parser) -> "None":
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="databricks",
+        help="Ambiente de execução: 'databricks' (padrão) ou 'local' (disco local e Spark "
+        "local com as tabelas criadas a partir de migrations/)",
+    )
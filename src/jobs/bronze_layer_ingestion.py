@@ -1,30 +1,452 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+import hashlib
+import json
+import math
 import re
 import sys
+import time
+import traceback
+from typing import TYPE_CHECKING
 
 import pyspark.sql.functions as F
-from databricks.sdk import WorkspaceClient
 
 
-from pyspark.sql import SparkSession, DataFrame
-from databricks.sdk.dbutils import RemoteDbUtils
+from pyspark import inheritable_thread_target
+from pyspark.sql import Column, SparkSession, DataFrame
+from pyspark.sql.types import (
+    ByteType,
+    DataType,
+    DateType,
+    DecimalType,
+    DoubleType,
+    FloatType,
+    IntegerType,
+    LongType,
+    ShortType,
+    StringType,
+    StructType,
+    TimestampNTZType,
+    TimestampType,
+)
+
+from backends import Backend, FileInfo, add_backend_argument, get_backend
+from instrumentation import Instrumentation, add_instrumentation_argument
+from partitions import generate_months_range, partition_overwrite_mode
+from sampling import SAMPLE_SEED, add_sample_arguments, write_sample
+
+if TYPE_CHECKING:
+    from arrow_ingestion import ArrowIngestion
+
+PARTITION_PATTERN = r"ano_mes_referencia=(\d{4}-\d{2})"
+
+ENGINES = ["auto", "spark", "arrow"]
+# No modo auto, cargas até este tamanho (soma dos arquivos da landing) usam o motor Arrow
+ARROW_THRESHOLD_MB = 256
+
+# Tabelas ingeridas simultaneamente quando mais de uma base é informada
+MAX_PARALLEL_TABLES = 4
+
+# batch: lista e ingere os meses da landing; stream: ingere somente os arquivos novos;
+# compact: reescreve os meses fragmentados da tabela, sem ler a landing
+MODES = ["batch", "stream", "compact"]
+# No modo stream, arquivos novos por micro-lote (limita a memória e a duração de cada lote)
+MAX_FILES_PER_TRIGGER = 10
+# Schema fixo da fonte binaryFile, exigido por streams de arquivos
+BINARY_FILE_SCHEMA = "path string, modificationTime timestamp, length bigint, content binary"
+
+# Footers lidos em paralelo no driver para agrupar os caminhos por schema
+SCHEMA_READ_WORKERS = 16
+
+# Tamanho alvo dos arquivos da tabela: cada mês é distribuído em tantos arquivos quantos
+# forem necessários para que nenhum ultrapasse o alvo, estimado pelo tamanho na landing
+TARGET_FILE_MB = 128
+# Tabela de preparação da compactação das tabelas Parquet: <tabela>_compactacao
+COMPACTION_SUFFIX = "_compactacao"
+
+# Ordem de largura dos tipos inteiros, para identificar conversões sem perda
+INTEGRAL_RANK = {ByteType: 1, ShortType: 2, IntegerType: 3, LongType: 4}
+INTEGRAL_DIGITS = {ByteType: 3, ShortType: 5, IntegerType: 10, LongType: 19}
+
+
+def parse_bases(value: "str") -> "list[str]":
+    # Bases separadas por vírgula, sem repetições e na ordem informada
+    bases = []
+    for base in value.split(","):
+        base = base.strip()
+        if base and base not in bases:
+            bases.append(base)
+    return bases
+
+
+@dataclass
+class Arguments:
+    """Classe para armazenar os argumentos do script."""
+
+    target_table: "str"
+    source_prefix: "str"
+    start_month: "str | None" = None
+    end_month: "str | None" = None
+    backend: "str" = "databricks"
+    run_metrics: "bool" = False
+    engine: "str" = "auto"
+    arrow_threshold_mb: "int" = ARROW_THRESHOLD_MB
+    bases: "list[str] | None" = None
+    max_parallel_tables: "int" = MAX_PARALLEL_TABLES
+    mode: "str" = "batch"
+    checkpoint_location: "str | None" = None
+    max_files_per_trigger: "int" = MAX_FILES_PER_TRIGGER
+    target_file_mb: "float" = TARGET_FILE_MB
+    sample_fraction: "float | None" = None
+    sample_seed: "int" = SAMPLE_SEED
+
+    @classmethod
+    def parse_arguments(cls) -> "Arguments":
+        """Parse argumentos da linha de comando."""
+        parser = argparse.ArgumentParser(
+            description="Ingestão da landing zone para uma tabela bronze"
+        )
+        parser.add_argument(
+            "target_table",
+            help="Tabela bronze de destino. Aceita o marcador {base}, obrigatório com --bases",
+        )
+        parser.add_argument(
+            "source_prefix",
+            help="Prefixo da landing zone com os arquivos. Aceita o marcador {base}, "
+            "obrigatório com --bases",
+        )
+        parser.add_argument(
+            "start_month",
+            nargs="?",
+            help="Ano-mês de início (YYYY-MM). Se não informado, reprocessa todos os meses",
+        )
+        parser.add_argument(
+            "end_month",
+            nargs="?",
+            help="Ano-mês de fim (YYYY-MM). Se não informado, usa apenas start_month",
+        )
+        parser.add_argument(
+            "--engine",
+            choices=ENGINES,
+            default="auto",
+            help="Motor da ingestão: 'spark', 'arrow' (pyarrow em um único processo) ou "
+            "'auto', que usa o Arrow em cargas pequenas quando o formato da tabela e as "
+            "conversões de schema permitem (padrão: auto)",
+        )
+        parser.add_argument(
+            "--arrow-threshold-mb",
+            type=int,
+            default=ARROW_THRESHOLD_MB,
+            help="Tamanho máximo (MB) dos arquivos da carga para o modo auto escolher o "
+            f"motor Arrow (padrão: {ARROW_THRESHOLD_MB})",
+        )
+        parser.add_argument(
+            "--bases",
+            type=parse_bases,
+            help="Bases separadas por vírgula (ex: yellow,green). Cada base substitui {base} "
+            "na tabela e no prefixo, e as tabelas são ingeridas simultaneamente na mesma "
+            "sessão Spark, cada uma em um pool do escalonador",
+        )
+        parser.add_argument(
+            "--max-parallel-tables",
+            type=int,
+            default=MAX_PARALLEL_TABLES,
+            help="Quantidade máxima de tabelas ingeridas simultaneamente com --bases "
+            f"(padrão: {MAX_PARALLEL_TABLES})",
+        )
+        parser.add_argument(
+            "--mode",
+            choices=MODES,
+            default="batch",
+            help="'batch' (padrão) ingere os meses informados, ou todos; 'stream' ingere "
+            "somente os arquivos que chegaram à landing desde a execução anterior, "
+            "registrados no checkpoint, e encerra quando não há mais arquivos novos; "
+            "'compact' reescreve no lugar os meses da tabela com mais arquivos que o "
+            "necessário para o tamanho alvo (o prefixo da landing não é lido)",
+        )
+        parser.add_argument(
+            "--checkpoint-location",
+            help="Diretório do checkpoint do modo stream, fora do prefixo da landing. Aceita "
+            "o marcador {base}, obrigatório com --bases",
+        )
+        parser.add_argument(
+            "--max-files-per-trigger",
+            type=int,
+            default=MAX_FILES_PER_TRIGGER,
+            help="Quantidade máxima de arquivos novos por micro-lote no modo stream "
+            f"(padrão: {MAX_FILES_PER_TRIGGER})",
+        )
+        parser.add_argument(
+            "--target-file-mb",
+            type=float,
+            default=TARGET_FILE_MB,
+            help="Tamanho alvo (MB) dos arquivos escritos em cada mês da tabela "
+            f"(padrão: {TARGET_FILE_MB})",
+        )
+        add_sample_arguments(parser)
+        add_backend_argument(parser)
+        add_instrumentation_argument(parser)
+
+        args = parser.parse_args()
+
+        if args.bases and not (
+            "{base}" in args.target_table and "{base}" in args.source_prefix
+        ):
+            parser.error("target_table e source_prefix devem conter {base} com --bases")
+        if args.max_parallel_tables < 1:
+            parser.error("--max-parallel-tables deve ser no mínimo 1")
+        if args.target_file_mb <= 0:
+            parser.error("--target-file-mb deve ser positivo")
+        if args.mode == "stream":
+            if not args.checkpoint_location:
+                parser.error("--checkpoint-location é obrigatório no modo stream")
+            if args.bases and "{base}" not in args.checkpoint_location:
+                parser.error("--checkpoint-location deve conter {base} com --bases")
+            if args.start_month:
+                parser.error("o modo stream não aceita intervalo de meses")
+            if args.max_files_per_trigger < 1:
+                parser.error("--max-files-per-trigger deve ser no mínimo 1")
+        if args.mode == "compact" and args.sample_fraction is not None:
+            parser.error("o modo compact não escreve amostras")
+
+        return cls(
+            target_table=args.target_table,
+            source_prefix=args.source_prefix,
+            start_month=args.start_month,
+            end_month=args.end_month,
+            backend=args.backend,
+            run_metrics=args.run_metrics,
+            engine=args.engine,
+            arrow_threshold_mb=args.arrow_threshold_mb,
+            bases=args.bases,
+            max_parallel_tables=args.max_parallel_tables,
+            mode=args.mode,
+            checkpoint_location=args.checkpoint_location,
+            max_files_per_trigger=args.max_files_per_trigger,
+            target_file_mb=args.target_file_mb,
+            sample_fraction=args.sample_fraction,
+            sample_seed=args.sample_seed,
+        )
+
+    def get_months(self) -> "list[str] | None":
+        if not self.start_month:
+            return None
+        return generate_months_range(self.start_month, self.end_month)
+
+    def get_tables(self) -> "list[tuple[str, str, str | None]]":
+        # Tabela, prefixo da landing e checkpoint do modo stream, um por base
+        checkpoint = self.checkpoint_location if self.mode == "stream" else None
+        if not self.bases:
+            return [(self.target_table, self.source_prefix, checkpoint)]
+        return [
+            (
+                self.target_table.format(base=base),
+                self.source_prefix.format(base=base),
+                checkpoint.format(base=base) if checkpoint else None,
+            )
+            for base in self.bases
+        ]
+
+
+class SchemaReconciler:
+    """
+    Compila, para cada schema de origem, uma única projeção que converte as colunas
+    para o schema da tabela de destino.
+
+    Colunas com o mesmo tipo são mantidas; colunas string e conversões sem perda
+    (ex: INT32 -> INT64, INT64 -> DOUBLE, TIMESTAMP_NTZ -> TIMESTAMP) são convertidas
+    diretamente. Apenas as demais divergências de tipo passam por string, preservando
+    o resultado do comportamento anterior (cast para string e depois para o destino).
+    """
+
+    def __init__(self, target_schema: "StructType"):
+        self.target_schema = target_schema
+        self.projections: "dict[str, list[Column]]" = {}
+        self.drift_report: "list[dict]" = []
+
+    def is_lossless_cast(self, source: "DataType", target: "DataType") -> "bool":
+        if source == target or isinstance(target, StringType):
+            return True
+
+        source_type, target_type = type(source), type(target)
+        if source_type in INTEGRAL_RANK:
+            if target_type in INTEGRAL_RANK:
+                return INTEGRAL_RANK[source_type] <= INTEGRAL_RANK[target_type]
+            if isinstance(target, DecimalType):
+                return target.precision - target.scale >= INTEGRAL_DIGITS[source_type]
+            return isinstance(target, (FloatType, DoubleType))
+
+        if isinstance(source, FloatType):
+            return isinstance(target, DoubleType)
+
+        if isinstance(source, (DateType, TimestampType, TimestampNTZType)):
+            return isinstance(target, (TimestampType, TimestampNTZType))
+
+        return False
+
+    def compile_projection(
+        self, source_schema: "StructType", fingerprint: "str"
+    ) -> "list[Column]":
+        if fingerprint in self.projections:
+            return self.projections[fingerprint]
+
+        # Nomes de origem indexados em minúsculo (o primeiro vence em caso de duplicidade)
+        source_fields = {}
+        for field in source_schema.fields:
+            source_fields.setdefault(field.name.lower(), field)
+
+        projection = []
+        for target in self.target_schema.fields:
+            source = source_fields.pop(target.name.lower(), None)
+
+            if source is None:
+                strategy = "ausente_na_origem"
+                column = F.lit(None).cast(target.dataType)
+            elif source.dataType == target.dataType:
+                strategy = None
+                column = F.col(f"`{source.name}`")
+            elif isinstance(
+                source.dataType, StringType
+            ) or self.is_lossless_cast(source.dataType, target.dataType):
+                strategy = "direto"
+                column = F.col(f"`{source.name}`").cast(target.dataType)
+            else:
+                strategy = "via_string"
+                column = (
+                    F.col(f"`{source.name}`").cast("string").cast(target.dataType)
+                )
+
+            projection.append(column.alias(target.name))
+
+            if strategy is not None:
+                self.drift_report.append(
+                    {
+                        "schema": fingerprint,
+                        "coluna": target.name,
+                        "tipo_origem": source.dataType.simpleString() if source else None,
+                        "tipo_destino": target.dataType.simpleString(),
+                        "estrategia": strategy,
+                    }
+                )
+
+        for name, source in source_fields.items():
+            self.drift_report.append(
+                {
+                    "schema": fingerprint,
+                    "coluna": name,
+                    "tipo_origem": source.dataType.simpleString(),
+                    "tipo_destino": None,
+                    "estrategia": "ignorada",
+                }
+            )
+
+        self.projections[fingerprint] = projection
+        return projection
 
 
 class Pipeline:
     def __init__(
         self,
         spark: "SparkSession",
-        dbutils: "RemoteDbUtils",
+        backend: "Backend",
         source_prefix: "str",
         target_table: "str",
+        months: "list[str] | None" = None,
+        instrumentation: "Instrumentation | None" = None,
+        engine: "str" = "spark",
+        arrow_threshold_mb: "int" = ARROW_THRESHOLD_MB,
+        checkpoint_location: "str | None" = None,
+        max_files_per_trigger: "int" = MAX_FILES_PER_TRIGGER,
+        target_file_mb: "float" = TARGET_FILE_MB,
+        compact: "bool" = False,
+        sample_fraction: "float | None" = None,
+        sample_seed: "int" = SAMPLE_SEED,
     ):
         self.spark = spark
-        self.dbutils = dbutils
+        self.backend = backend
         self.source_prefix = source_prefix
         self.target_table = target_table
+        # Meses a reprocessar; None reprocessa a tabela inteira
+        self.months = months
+        self.instrumentation = instrumentation or Instrumentation("bronze")
+        self.engine = engine
+        self.arrow_threshold_mb = arrow_threshold_mb
+        # Com checkpoint, a ingestão roda no modo stream (somente arquivos novos)
+        self.checkpoint_location = checkpoint_location
+        self.max_files_per_trigger = max_files_per_trigger
+        self.target_file_mb = target_file_mb
+        # Com compact, reescreve os meses fragmentados da tabela em vez de ingerir
+        self.compact = compact
+        # Com fração, os meses escritos também são amostrados em <tabela>_amostra
+        self.sample_fraction = sample_fraction
+        self.sample_seed = sample_seed
 
-    def cast_columns_to_string(self, df: "DataFrame") -> "DataFrame":
-        for column in df.columns:
-            df = df.withColumn(column, F.col(column).cast("string"))
+    def extract_partition_value(self, path: "str") -> "str":
+        # Extrai o "YYYY-MM" de "ano_mes_referencia=YYYY-MM" no caminho do arquivo
+        partition = re.search(PARTITION_PATTERN, path)
+        if not partition:
+            raise ValueError(f"Não foi possível extrair a partição do arquivo: {path}")
+
+        return partition.group(1)
+
+    def schema_fingerprint(self, schema: "StructType") -> "str":
+        # Colunas comparadas sem diferenciar maiúsculas e sem depender da ordem,
+        # pois a leitura e o unionByName resolvem as colunas pelo nome
+        fields = sorted(
+            f"{field.name.lower()}:{field.dataType.simpleString()}"
+            for field in schema.fields
+        )
+        return hashlib.sha1(",".join(fields).encode("utf-8")).hexdigest()
+
+    def group_paths_by_schema(
+        self, paths: "list[str]", files: "list[FileInfo]"
+    ) -> "dict[str, list[str]]":
+        """
+        Agrupa os caminhos que podem ser lidos em uma única varredura.
+
+        Como na inferência do Spark, o schema de cada caminho é o do primeiro arquivo de
+        dados, lido apenas do footer com o pyarrow, em paralelo no driver e sem um job Spark
+        por caminho. Caminhos fora dos sistemas de arquivos do pyarrow, ou com tipos que
+        ele não traduz, usam a inferência do Spark.
+        """
+        # Import tardio, como na escolha do motor: o módulo do motor Arrow carrega o pyarrow
+        from arrow_ingestion import read_spark_schema, resolve_filesystem, strip_scheme
+
+        # Caminho de cada arquivo de dados: o próprio arquivo ou o diretório que o contém
+        known_paths = set(paths)
+        first_files: "dict[str, str]" = {}
+        for file in files:
+            owner = file.path if file.path in known_paths else file.path.rsplit("/", 1)[0] + "/"
+            first_files.setdefault(owner, file.path)
+
+        # Todos os caminhos estão sob o mesmo prefixo: um único sistema de arquivos
+        resolved = resolve_filesystem(self.backend, files[0].path) if files else None
+
+        def read_schema(path: "str") -> "StructType":
+            file_path = first_files.get(path)
+            bare_path = strip_scheme(file_path) if file_path is not None else None
+            schema = None
+            if resolved is not None and bare_path is not None:
+                schema = read_spark_schema(resolved[0], bare_path)
+            return schema if schema is not None else self.spark.read.parquet(path).schema
+
+        with ThreadPoolExecutor(max_workers=SCHEMA_READ_WORKERS) as executor:
+            schemas = list(executor.map(read_schema, paths))
+
+        groups: "dict[str, list[str]]" = {}
+        for path, schema in zip(paths, schemas):
+            groups.setdefault(self.schema_fingerprint(schema), []).append(path)
+        return groups
+
+    def read_group(self, paths: "list[str]") -> "DataFrame":
+        # Uma única varredura para todos os meses do grupo; a partição vem do caminho
+        df = self.spark.read.parquet(*paths)
+        df = df.withColumn(
+            "ano_mes_referencia",
+            F.regexp_extract(F.col("_metadata.file_path"), PARTITION_PATTERN, 1),
+        )
         return df
 
     def concatenate_dataframes(self, dfs: "list[DataFrame]") -> "DataFrame":
@@ -40,60 +462,533 @@ class Pipeline:
         return df
 
     def equalize_schemas(self, df: "DataFrame", target_df: "DataFrame") -> "DataFrame":
-        for field in target_df.schema.fields:
-            if field.name not in df.columns:
-                df = df.withColumn(field.name, F.lit(None).cast(field.dataType))
+        reconciler = SchemaReconciler(target_df.schema)
+        projection = reconciler.compile_projection(
+            df.schema, self.schema_fingerprint(df.schema)
+        )
+        return df.select(projection)
 
-            df = df.withColumn(field.name, F.col(field.name).cast(field.dataType))
+    def run(self):
+        if self.compact:
+            self.run_compaction()
+            return
+        if self.checkpoint_location is not None:
+            self.run_stream()
+            return
 
-        df = df.select([field.name for field in target_df.schema.fields])
+        target_df = self.spark.read.table(self.target_table)
+        with self.instrumentation.stage("listagem", tabela=self.target_table) as stage:
+            files = self.backend.list_files(f"{self.source_prefix}/")
+            stage["arquivos"] = len(files)
 
-        return df
+        # Valida que todos os caminhos possuem a partição antes de ler os dados
+        paths = [file.path for file in files]
+        for path in paths:
+            self.extract_partition_value(path)
 
-    def run(self):
-        target_df = self.spark.read.table(self.target_table)
-        files = self.dbutils.fs.ls(f"{self.source_prefix}/")
+        # Em reprocessamentos parciais, lê somente os meses solicitados
+        if self.months is not None:
+            paths = [
+                path
+                for path in paths
+                if self.extract_partition_value(path) in self.months
+            ]
+            if not paths:
+                print(f"Nenhum arquivo encontrado para os meses {self.months}")
+                return
+
+        with self.instrumentation.stage("escolha_motor", motor=self.engine) as stage:
+            arrow, data_files = self.choose_arrow_engine(paths, target_df.schema)
+            stage["motor"] = "arrow" if arrow else "spark"
+        if arrow is not None:
+            self.run_arrow(arrow, [file.path for file in data_files])
+            self.write_sample(target_df.columns)
+            return
 
-        # Lê arquivo por arquivo e faz o cast de todas as colunas para string
-        dfs: "list[DataFrame]" = []
+        # O motor Spark não lista os arquivos de dados quando o Arrow não é avaliado
+        data_files = data_files or self.list_data_files(paths)
+        with self.instrumentation.stage("leitura_schemas", arquivos=len(paths)) as stage:
+            groups = self.group_paths_by_schema(paths, data_files)
+            stage["schemas"] = len(groups)
+        print(f"{len(paths)} meses agrupados em {len(groups)} schemas distintos")
+
+        # Lê cada grupo de schema de uma vez e o converte para o schema de destino
+        # com uma única projeção (renomeia, converte e ordena as colunas). Só o plano é
+        # montado aqui; leitura, conversão e união são executadas pela escrita
+        with self.instrumentation.stage("projecao"):
+            reconciler = SchemaReconciler(target_df.schema)
+            dfs: "list[DataFrame]" = []
+            for fingerprint, group_paths in groups.items():
+                df = self.read_group(group_paths)
+                df = df.withColumn("data_hora_ingestao", F.current_timestamp())
+                df = df.select(reconciler.compile_projection(df.schema, fingerprint))
+                dfs.append(df)
+
+            self.report_schema_drift(reconciler, groups)
+            df = self.concatenate_dataframes(dfs)
+
+            files_per_month = self.files_per_month(self.estimate_month_bytes(data_files))
+            df = self.distribute(df, files_per_month)
+
+        with self.instrumentation.stage(
+            "escrita",
+            tabela=self.target_table,
+            arquivos_alvo=sum(files_per_month.values()),
+        ):
+            self.write(df)
+
+        self.write_sample(target_df.columns)
+
+    def write_sample(self, columns: "list[str]") -> "None":
+        # Amostra dos meses recém-escritos, lida da própria tabela; a data/hora de ingestão
+        # fica fora do hash para que recargas dos mesmos dados escolham os mesmos registros
+        if self.sample_fraction is None:
+            return
+
+        with self.instrumentation.stage("amostra", tabela=self.target_table):
+            write_sample(
+                self.spark,
+                self.target_table,
+                self.sample_fraction,
+                self.sample_seed,
+                [column for column in columns if column != "data_hora_ingestao"],
+                self.months,
+            )
+
+    def list_data_files(self, paths: "list[str]") -> "list[FileInfo]":
+        # Arquivos de dados dos diretórios de partição, ignorando marcadores (_SUCCESS)
+        files = []
+        for path in paths:
+            entries = (
+                self.backend.list_files(path)
+                if path.endswith("/")
+                else [FileInfo(path=path, name=path.rsplit("/", 1)[-1], size=0)]
+            )
+            files.extend(
+                entry
+                for entry in entries
+                if not entry.name.endswith("/") and not entry.name.startswith(("_", "."))
+            )
+        return files
+
+    def estimate_month_bytes(self, files: "list[FileInfo]") -> "dict[str, int]":
+        # Tamanho de cada mês na landing: o Parquet escrito na tabela tem compressão e
+        # tamanho próximos aos da origem, e a listagem já traz o tamanho dos arquivos
+        month_bytes: "dict[str, int]" = {}
         for file in files:
+            month = self.extract_partition_value(file.path)
+            month_bytes[month] = month_bytes.get(month, 0) + file.size
+        return month_bytes
+
+    def files_per_month(self, month_bytes: "dict[str, int]") -> "dict[str, int]":
+        # Arquivos necessários para que cada mês fique abaixo do tamanho alvo
+        target_bytes = self.target_file_mb * 1024 * 1024
+        return {
+            month: max(1, math.ceil(size / target_bytes))
+            for month, size in month_bytes.items()
+        }
+
+    def distribute(
+        self, df: "DataFrame", files_per_month: "dict[str, int]"
+    ) -> "DataFrame":
+        """
+        Distribui as linhas de cada mês em `files_per_month[mês]` partições.
+
+        Sem a redistribuição, a escrita herda o particionamento da leitura: meses pequenos
+        espalhados em um arquivo por tarefa e meses grandes concentrados em poucos
+        arquivos enormes. Cada linha recebe um balde determinístico (hash das colunas,
+        para que uma tarefa reexecutada reproduza a mesma distribuição) entre 0 e a
+        quantidade de arquivos do mês, e o DataFrame é reparticionado por mês e balde.
+        Baldes que colidem na mesma partição formam um arquivo maior, de no máximo
+        algumas vezes o alvo.
+        """
+        buckets = F.create_map(
+            *[
+                F.lit(value)
+                for month, files in sorted(files_per_month.items())
+                for value in (month, files)
+            ]
+        )
+        columns = [
+            F.col(f"`{column}`")
+            for column in df.columns
+            if column not in ("ano_mes_referencia", "data_hora_ingestao")
+        ]
+        bucket = F.pmod(F.xxhash64(*columns), buckets[F.col("ano_mes_referencia")])
+        return df.repartition(
+            sum(files_per_month.values()), F.col("ano_mes_referencia"), bucket
+        )
+
+    def choose_arrow_engine(
+        self, paths: "list[str]", target_schema: "StructType"
+    ) -> "tuple[ArrowIngestion | None, list[FileInfo]]":
+        # Motor Arrow quando solicitado, ou no modo auto para cargas pequenas cujo formato
+        # de tabela e conversões de schema ele suporta; senão, o motor Spark
+        if self.engine == "spark":
+            return None, []
+
+        files = self.list_data_files(paths)
+        size_mb = sum(file.size for file in files) / 1024 / 1024
+        if self.engine == "auto" and size_mb > self.arrow_threshold_mb:
+            print(f"Motor spark: {size_mb:.0f} MB acima do limite de {self.arrow_threshold_mb} MB")
+            return None, files
+
+        # Import tardio: o pyarrow só é necessário para o motor Arrow
+        from arrow_ingestion import ArrowIngestion
 
-            # Extrai o "ano_mes_referencia=YYYY-MM" do nome do arquivo (file)
-            partition = re.search(r"ano_mes_referencia=\d{4}-\d{2}", file.path)
-            if not partition:
-                raise ValueError(
-                    f"Não foi possível extrair a partição do arquivo: {file.path}"
+        arrow = ArrowIngestion(
+            self.spark, self.backend, self.target_table, SchemaReconciler(target_schema)
+        )
+        reasons = arrow.unsupported_reasons([file.path for file in files])
+        if not reasons:
+            print(f"Motor arrow: {len(files)} arquivos, {size_mb:.1f} MB")
+            return arrow, files
+        if self.engine == "arrow":
+            raise ValueError("Motor arrow indisponível: " + "; ".join(reasons))
+
+        print("Motor spark: " + "; ".join(reasons))
+        return None, files
+
+    def run_arrow(self, arrow: "ArrowIngestion", paths: "list[str]") -> "None":
+        # Mesmo agrupamento por schema do motor Spark, apenas para o relatório de deriva
+        groups: "dict[str, list[str]]" = {}
+        for path in paths:
+            fingerprint = self.schema_fingerprint(arrow.source_schemas[path])
+            groups.setdefault(fingerprint, []).append(path)
+        for fingerprint, group_paths in groups.items():
+            arrow.reconciler.compile_projection(
+                arrow.with_job_columns(arrow.source_schemas[group_paths[0]]), fingerprint
+            )
+        self.report_schema_drift(arrow.reconciler, groups)
+
+        with self.instrumentation.stage(
+            "escrita", tabela=self.target_table, motor="arrow"
+        ) as stage:
+            stage["linhas_escritas"] = arrow.write(
+                {path: self.extract_partition_value(path) for path in paths}, self.months
+            )
+
+    def overwrite_mode(self) -> "str":
+        # Reprocessamentos parciais, micro-lotes e compactações sobrescrevem apenas os
+        # meses da carga
+        if self.months is not None or self.checkpoint_location is not None or self.compact:
+            return "dynamic"
+        return "static"
+
+    def partition_layout(self) -> "dict[str, tuple[int, int]]":
+        # Quantidade de arquivos e bytes de cada mês da tabela, pelos metadados de arquivo
+        # da leitura (nenhuma coluna de dados é decodificada)
+        df = self.spark.read.table(self.target_table)
+        if self.months is not None:
+            df = df.where(F.col("ano_mes_referencia").isin(self.months))
+
+        rows = (
+            df.select("ano_mes_referencia", "_metadata.file_path", "_metadata.file_size")
+            .distinct()
+            .groupBy("ano_mes_referencia")
+            .agg(F.count("file_path").alias("arquivos"), F.sum("file_size").alias("bytes"))
+            .collect()
+        )
+        return {row["ano_mes_referencia"]: (row["arquivos"], row["bytes"]) for row in rows}
+
+    def run_compaction(self) -> "None":
+        """
+        Reescreve no lugar os meses da tabela fragmentados em mais arquivos que o
+        necessário para o tamanho alvo.
+
+        No Delta, o OPTIMIZE compacta os meses em uma transação, com o tamanho alvo
+        registrado na propriedade `delta.targetFileSize` da tabela. Nas tabelas Parquet,
+        a sobrescrita não pode ler os arquivos que substitui: os meses são copiados para a
+        tabela de preparação `<tabela>_compactacao` e reescritos a partir dela, com a mesma
+        distribuição da ingestão. A cópia só é removida depois da reescrita; se ela falhar,
+        a tabela de preparação guarda os meses.
+        """
+        with self.instrumentation.stage("diagnostico", tabela=self.target_table) as stage:
+            layout = self.partition_layout()
+            month_bytes = {month: size for month, (_, size) in layout.items()}
+            files_per_month = self.files_per_month(month_bytes)
+            fragmented = sorted(
+                month
+                for month, (files, _) in layout.items()
+                if files > files_per_month[month]
+            )
+            stage["meses"] = len(layout)
+            stage["meses_fragmentados"] = len(fragmented)
+
+        for month in fragmented:
+            files, size = layout[month]
+            print(
+                f"{self.target_table} {month}: {files} arquivos, {size / 1024 / 1024:.1f} MB "
+                f"-> {files_per_month[month]} arquivos"
+            )
+        if not fragmented:
+            print(f"Nenhum mês fragmentado em {self.target_table}")
+            return
+
+        with self.instrumentation.stage(
+            "compactacao",
+            tabela=self.target_table,
+            arquivos=sum(layout[month][0] for month in fragmented),
+            arquivos_alvo=sum(files_per_month[month] for month in fragmented),
+        ):
+            months = ", ".join(repr(month) for month in fragmented)
+            if self.backend.supports_delta:
+                target_bytes = int(self.target_file_mb * 1024 * 1024)
+                self.spark.sql(
+                    f"ALTER TABLE {self.target_table} "
+                    f"SET TBLPROPERTIES ('delta.targetFileSize' = '{target_bytes}')"
+                )
+                self.spark.sql(
+                    f"OPTIMIZE {self.target_table} WHERE ano_mes_referencia IN ({months})"
                 )
+                return
 
-            partition_value = partition.group(0).split("=")[1]
-            df = self.spark.read.parquet(file.path)
-            df = df.withColumn("ano_mes_referencia", F.lit(partition_value))
-            df = self.cast_columns_to_string(df)
-            df = self.lowercase_columns_names(df)
-            dfs.append(df)
+            staging_table = f"{self.target_table}{COMPACTION_SUFFIX}"
+            self.spark.read.table(self.target_table).where(
+                F.col("ano_mes_referencia").isin(fragmented)
+            ).write.format("parquet").mode("overwrite").saveAsTable(staging_table)
 
-        df = self.concatenate_dataframes(dfs)
-        df = df.withColumn("data_hora_ingestao", F.current_timestamp())
+            df = self.spark.read.table(staging_table)
+            self.write(
+                self.distribute(df, {month: files_per_month[month] for month in fragmented})
+            )
+            self.spark.catalog.refreshTable(self.target_table)
+            self.spark.sql(f"DROP TABLE {staging_table}")
 
-        df = self.equalize_schemas(df, target_df)
-        df.write.mode("overwrite").insertInto(self.target_table)
+    def run_stream(self) -> "None":
+        """
+        Ingere os arquivos que chegaram à landing desde a execução anterior.
 
+        Um stream de arquivos (`binaryFile`, apenas os caminhos, sem ler o conteúdo)
+        registra no checkpoint os arquivos já processados e entrega os novos em micro-lotes
+        de até `max_files_per_trigger` arquivos. Com o gatilho `availableNow`, o stream
+        processa tudo o que está disponível e encerra. Cada micro-lote reingere os meses
+        dos seus arquivos (`ingest_micro_batch`), com a mesma leitura agrupada por schema
+        e conversão do modo batch. A sobrescrita por mês torna a reexecução de um
+        micro-lote interrompido idempotente.
+        """
+        files = (
+            self.spark.readStream.format("binaryFile")
+            .schema(BINARY_FILE_SCHEMA)
+            .option("pathGlobFilter", "*.parquet")
+            .option("recursiveFileLookup", "true")
+            .option("maxFilesPerTrigger", self.max_files_per_trigger)
+            .load(self.source_prefix)
+            .select("path")
+        )
+        settings = StreamSettings(
+            source_prefix=self.source_prefix,
+            target_table=self.target_table,
+            backend=self.backend.name,
+            engine=self.engine,
+            arrow_threshold_mb=self.arrow_threshold_mb,
+            target_file_mb=self.target_file_mb,
+            sample_fraction=self.sample_fraction,
+            sample_seed=self.sample_seed,
+            run_id=self.instrumentation.run_id,
+        )
 
-def main():
-    table_name = sys.argv[1]
-    source_prefix = sys.argv[2]
+        with self.instrumentation.stage(
+            "stream", tabela=self.target_table, checkpoint=self.checkpoint_location
+        ) as stage:
+            query = (
+                files.writeStream.foreachBatch(partial(ingest_micro_batch, settings))
+                .option("checkpointLocation", self.checkpoint_location)
+                .trigger(availableNow=True)
+                .start()
+            )
+            query.awaitTermination()
+            # Os micro-lotes escrevem pela sessão clonada do stream: a listagem de arquivos
+            # da tabela em cache nesta sessão fica desatualizada
+            self.spark.catalog.refreshTable(self.target_table)
+
+            progress = [p for p in query.recentProgress if p["numInputRows"] > 0]
+            stage["micro_lotes"] = len(progress)
+            stage["arquivos"] = sum(p["numInputRows"] for p in progress)
+
+    def write(self, df: "DataFrame") -> "None":
+        # Sobrescreve apenas as partições (ano_mes_referencia) presentes no DataFrame
+        with partition_overwrite_mode(self.spark, self.overwrite_mode()):
+            df.write.mode("overwrite").insertInto(self.target_table)
+
+    def report_schema_drift(
+        self, reconciler: "SchemaReconciler", groups: "dict[str, list[str]]"
+    ) -> "None":
+        # Uma linha JSON por coluna divergente do schema de destino, com os meses afetados
+        for entry in reconciler.drift_report:
+            months = sorted(
+                self.extract_partition_value(path) for path in groups[entry["schema"]]
+            )
+            print(
+                json.dumps(
+                    {"tabela": self.target_table, "meses": months, **entry},
+                    ensure_ascii=False,
+                )
+            )
+
+
+@dataclass(frozen=True)
+class StreamSettings:
+    """
+    Parâmetros de um micro-lote do modo stream. No Spark Connect, a função do
+    foreachBatch é serializada e executada no servidor: ela não pode levar a sessão, o
+    backend nem a instrumentação do cliente, apenas valores simples.
+    """
+
+    source_prefix: "str"
+    target_table: "str"
+    backend: "str"
+    engine: "str"
+    arrow_threshold_mb: "int"
+    target_file_mb: "float"
+    sample_fraction: "float | None"
+    sample_seed: "int"
+    run_id: "str"
+
+
+def ingest_micro_batch(settings: "StreamSettings", df: "DataFrame", batch_id: "int") -> "None":
+    # Reingere os meses dos arquivos novos do micro-lote, sobrescrevendo somente esses meses
+    paths = [row.path for row in df.collect()]
+    if not paths:
+        return
 
-    dbutils = WorkspaceClient().dbutils
-    spark = SparkSession.getActiveSession()
     pipeline = Pipeline(
-        spark, dbutils, source_prefix=source_prefix, target_table=table_name
+        df.sparkSession,
+        get_backend(settings.backend),
+        settings.source_prefix,
+        settings.target_table,
+        instrumentation=Instrumentation("bronze", run_id=settings.run_id),
+        engine=settings.engine,
+        arrow_threshold_mb=settings.arrow_threshold_mb,
+        target_file_mb=settings.target_file_mb,
+        sample_fraction=settings.sample_fraction,
+        sample_seed=settings.sample_seed,
+    )
+    pipeline.months = sorted({pipeline.extract_partition_value(path) for path in paths})
+    print(
+        f"Micro-lote {batch_id} de {settings.target_table}: {len(paths)} arquivos novos, "
+        f"meses {pipeline.months}"
     )
     pipeline.run()
 
 
-if __name__ == "__main__":
-    import traceback
+def set_scheduler_pool(spark: "SparkSession", pool: "str") -> "bool":
+    # Pool do escalonador das consultas disparadas pela thread corrente. No Spark Connect
+    # não há SparkContext: o servidor agenda as consultas simultâneas por conta própria
+    try:
+        spark.sparkContext.setLocalProperty("spark.scheduler.pool", pool)
+        return True
+    except Exception:
+        return False
+
+
+def run_pipelines(
+    spark: "SparkSession",
+    pipelines: "list[Pipeline]",
+    instrumentation: "Instrumentation",
+    max_parallel_tables: "int" = MAX_PARALLEL_TABLES,
+) -> "dict[str, Exception | None]":
+    """
+    Ingere várias tabelas simultaneamente na mesma sessão Spark.
+
+    Cada tabela roda em uma thread e em um pool próprio do escalonador, para que as
+    tarefas das tabelas pequenas não esperem na fila das grandes. A falha de uma tabela
+    não interrompe as demais: o resultado de cada uma é emitido como um evento `tabela`.
+
+    As consultas das tabelas se sobrepõem e não podem ser atribuídas a uma etapa de uma
+    tabela: as etapas das tabelas registram apenas a duração, e as métricas das consultas
+    são somadas na etapa `ingestao`.
 
+    Returns:
+        Tabela -> exceção da ingestão, ou None em caso de sucesso
+    """
+
+    def ingest(pipeline: "Pipeline") -> "tuple[float, Exception | None]":
+        set_scheduler_pool(spark, pipeline.target_table)
+        started = time.perf_counter()
+        try:
+            pipeline.run()
+            return time.perf_counter() - started, None
+        except Exception as e:
+            print(f"Falha na ingestão de {pipeline.target_table}:\n{traceback.format_exc()}")
+            return time.perf_counter() - started, e
+
+    # Todas as tabelas reprocessam os mesmos meses: o modo de sobrescrita é definido uma
+    # única vez, antes das threads
+    with partition_overwrite_mode(spark, pipelines[0].overwrite_mode()):
+        with instrumentation.stage("ingestao", tabelas=len(pipelines)) as stage:
+            with ThreadPoolExecutor(max_workers=max_parallel_tables) as executor:
+                futures = {
+                    pipeline.target_table: executor.submit(
+                        inheritable_thread_target(ingest), pipeline
+                    )
+                    for pipeline in pipelines
+                }
+
+            errors = {}
+            for table, future in futures.items():
+                seconds, error = future.result()
+                errors[table] = error
+                instrumentation.emit(
+                    "tabela",
+                    table,
+                    status="falha" if error else "sucesso",
+                    segundos=round(seconds, 3),
+                    **({"erro": str(error)} if error else {}),
+                )
+            stage["falhas"] = sum(1 for error in errors.values() if error)
+
+    return errors
+
+
+def main():
+    args = Arguments.parse_arguments()
+
+    backend = get_backend(args.backend)
+    spark = backend.get_spark()
+    instrumentation = Instrumentation("bronze", spark)
+    tables = args.get_tables()
+    # Com várias tabelas simultâneas, as etapas de cada uma registram apenas a duração
+    table_instrumentation = (
+        instrumentation if len(tables) == 1 else instrumentation.without_query_metrics()
+    )
+    pipelines = [
+        Pipeline(
+            spark,
+            backend,
+            source_prefix=source_prefix,
+            target_table=target_table,
+            months=args.get_months(),
+            instrumentation=table_instrumentation,
+            engine=args.engine,
+            arrow_threshold_mb=args.arrow_threshold_mb,
+            checkpoint_location=checkpoint_location,
+            max_files_per_trigger=args.max_files_per_trigger,
+            target_file_mb=args.target_file_mb,
+            compact=args.mode == "compact",
+            sample_fraction=args.sample_fraction,
+            sample_seed=args.sample_seed,
+        )
+        for target_table, source_prefix, checkpoint_location in tables
+    ]
+    try:
+        if len(pipelines) == 1:
+            pipelines[0].run()
+        else:
+            errors = run_pipelines(
+                spark, pipelines, instrumentation, args.max_parallel_tables
+            )
+            failed = [table for table, error in errors.items() if error]
+            print(f"\nResumo: {len(pipelines) - len(failed)}/{len(pipelines)} tabelas ingeridas")
+            if failed:
+                raise RuntimeError(f"Falha na ingestão das tabelas: {', '.join(failed)}")
+    finally:
+        instrumentation.close()
+        if args.run_metrics:
+            instrumentation.save(spark)
+
+
+if __name__ == "__main__":
     try:
         main()
     except Exception as e:
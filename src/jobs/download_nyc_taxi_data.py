@@ -3,37 +3,106 @@ Script para fazer download dos dados de táxis de NYC direto para S3.
 Este script baixa dados de Yellow Taxi, Green Taxi e FHV (For-Hire Vehicle).
 
 Uso:
-    python download_nyc_taxi_data.py <base> [start_month] [end_month] --s3-bucket BUCKET [--s3-prefix PREFIX] [--base-url URL]
+    python download_nyc_taxi_data.py <base[,base...]> [start_month] [end_month] --s3-bucket BUCKET [--s3-prefix PREFIX] [--base-url URL]
+        [--upload-mode {auto,streaming,ranged,buffered}] [--part-size-mb N] [--max-in-flight-parts N]
+        [--ranged-threshold-mb N] [--segment-connections N] [--checkpoint-prefix PREFIX]
+        [--max-workers N] [--requests-per-second N] [--max-retries N]
+        [--index-key KEY] [--index-max-age-hours N]
+        [--transcode] [--transcode-columns {all,silver,COL[,COL...]}] [--row-group-rows N] [--spool-dir DIR]
 
 Dados disponíveis em: https://www.nyc.gov/site/tlc/about/tlc-trip-record-data.page
 """
 
 import argparse
-from dataclasses import dataclass
-from datetime import datetime
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
 import io
+import json
+import os
+import random
+import tempfile
+import threading
 import time
-from typing import Dict, List, Self
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Self, Tuple
 from mypy_boto3_s3 import S3Client
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 from dateutil.relativedelta import relativedelta
 import requests
 
-from databricks.sdk import WorkspaceClient
+from backends import add_backend_argument, get_backend
+from instrumentation import Instrumentation, add_instrumentation_argument
+
+if TYPE_CHECKING:
+    from transcode import Transcoder
+
+# Tamanho mínimo de parte aceito pelo S3 em multipart uploads (exceto a última parte)
+MIN_PART_SIZE_MB = 5
+
+AVAILABLE_BASES = ["yellow", "green", "forhire", "highvolumeforhire"]
+
+# Backoff exponencial (em segundos) entre tentativas de download
+RETRY_BACKOFF_BASE = 1.0
+RETRY_BACKOFF_MAX = 30.0
+
+
+def parse_bases(value: "str") -> "List[str]":
+    """
+    Converte a lista de bases separadas por vírgula informada na linha de comando.
+
+    Args:
+        value: Bases separadas por vírgula (ex: yellow,green)
+
+    Returns:
+        Lista de bases, sem repetições e na ordem informada
+    """
+    bases = []
+    for base in value.split(","):
+        base = base.strip()
+        if base not in AVAILABLE_BASES:
+            raise argparse.ArgumentTypeError(
+                f"Base inválida: {base!r} (disponíveis: {', '.join(AVAILABLE_BASES)})"
+            )
+        if base not in bases:
+            bases.append(base)
+    return bases
 
 
 @dataclass
 class Arguments:
     """Classe para armazenar os argumentos do script."""
 
-    base: "str"
+    bases: "List[str]"
     s3_bucket: "str"
     start_month: "str | None" = None
     end_month: "str | None" = None
     s3_prefix: "str" = "nyc_taxi_data"
     base_url: "str" = "https://d37ci6vzurychx.cloudfront.net/trip-data"
+    upload_mode: "str" = "auto"
+    part_size_mb: "int" = 16
+    max_in_flight_parts: "int" = 4
+    ranged_threshold_mb: "int" = 256
+    segment_connections: "int" = 4
+    checkpoint_prefix: "str" = "_metadata/checkpoints"
+    max_workers: "int" = 4
+    requests_per_second: "float" = 2.0
+    max_retries: "int" = 3
+    index_key: "str" = "_metadata/availability_index.json"
+    index_max_age_hours: "float" = 24.0
+    index_recent_months: "int" = 3
+    transcode: "bool" = False
+    transcode_columns: "str" = "all"
+    row_group_rows: "int" = 1_000_000
+    spool_dir: "str | None" = None
+    backend: "str" = "databricks"
+    run_metrics: "bool" = False
+
+    def get_s3_prefix(self, base: "str") -> "str":
+        """Retorna o prefixo no S3 de uma base, substituindo o marcador {base}."""
+        return self.s3_prefix.format(base=base)
 
     @classmethod
     def parse_arguments(cls) -> "Self":
@@ -47,6 +116,8 @@ class Arguments:
                     python download_nyc_taxi_data.py green 2023-01 2023-05 --s3-bucket my-bucket              # Green de jan/2023 a mai/2023
                     python download_nyc_taxi_data.py forhire 2022-12 2023-02 --s3-bucket my-bucket            # For-hire de dez/2022 a fev/2023
                     python download_nyc_taxi_data.py highvolumeforhire 2023-06 --s3-bucket my-bucket          # High volume for-hire apenas jun/2023
+                    python download_nyc_taxi_data.py yellow,green 2023-01 2023-05 --s3-bucket my-bucket --s3-prefix nyc_taxi_data_{base}
+                                                                                                              # Yellow e green em paralelo, um prefixo por base
 
                 Bases disponíveis:
                     - yellow: Yellow Taxi
@@ -57,9 +128,9 @@ class Arguments:
         )
 
         parser.add_argument(
-            "base",
-            choices=["yellow", "green", "forhire", "highvolumeforhire"],
-            help="Base de dados para download",
+            "bases",
+            type=parse_bases,
+            help="Base(s) de dados para download, separadas por vírgula",
         )
 
         parser.add_argument(
@@ -83,7 +154,8 @@ class Arguments:
         parser.add_argument(
             "--s3-prefix",
             default="nyc_taxi_data",
-            help="Prefixo (pasta) no S3 para salvar os dados (padrão: nyc_taxi_data)",
+            help="Prefixo (pasta) no S3 para salvar os dados. Aceita o marcador {base}, obrigatório quando "
+            "mais de uma base é informada (padrão: nyc_taxi_data)",
         )
 
         parser.add_argument(
@@ -92,16 +164,322 @@ class Arguments:
             help="URL base para download dos dados (padrão: https://d37ci6vzurychx.cloudfront.net/trip-data)",
         )
 
+        parser.add_argument(
+            "--upload-mode",
+            choices=["auto", "streaming", "ranged", "buffered"],
+            default="auto",
+            help="Modo de envio para o S3: 'streaming' envia partes do multipart upload conforme o download avança; "
+            "'ranged' baixa segmentos (HTTP Range) em paralelo com checkpoint para retomada; "
+            "'buffered' baixa o arquivo inteiro em memória antes do upload; "
+            "'auto' usa 'ranged' para arquivos a partir de --ranged-threshold-mb e 'streaming' para os demais (padrão: auto)",
+        )
+
+        parser.add_argument(
+            "--part-size-mb",
+            type=int,
+            default=16,
+            help=f"Tamanho (MB) de cada parte do multipart upload no modo streaming (mínimo: {MIN_PART_SIZE_MB}, padrão: 16)",
+        )
+
+        parser.add_argument(
+            "--max-in-flight-parts",
+            type=int,
+            default=4,
+            help="Quantidade máxima de partes sendo enviadas simultaneamente no modo streaming (padrão: 4)",
+        )
+
+        parser.add_argument(
+            "--ranged-threshold-mb",
+            type=int,
+            default=256,
+            help="Tamanho (MB) a partir do qual o modo auto usa downloads segmentados (padrão: 256)",
+        )
+
+        parser.add_argument(
+            "--segment-connections",
+            type=int,
+            default=4,
+            help="Quantidade de conexões simultâneas por arquivo no modo ranged (padrão: 4)",
+        )
+
+        parser.add_argument(
+            "--checkpoint-prefix",
+            default="_metadata/checkpoints",
+            help="Prefixo no bucket onde ficam os checkpoints dos downloads segmentados (padrão: _metadata/checkpoints)",
+        )
+
+        parser.add_argument(
+            "--max-workers",
+            type=int,
+            default=4,
+            help="Quantidade máxima de arquivos baixados simultaneamente (padrão: 4)",
+        )
+
+        parser.add_argument(
+            "--requests-per-second",
+            type=float,
+            default=2.0,
+            help="Limite de requisições por segundo ao servidor de origem (padrão: 2)",
+        )
+
+        parser.add_argument(
+            "--max-retries",
+            type=int,
+            default=3,
+            help="Quantidade de novas tentativas em falhas transitórias de download (padrão: 3)",
+        )
+
+        parser.add_argument(
+            "--index-key",
+            default="_metadata/availability_index.json",
+            help="Chave no bucket onde o índice de disponibilidade dos arquivos é mantido "
+            "(padrão: _metadata/availability_index.json)",
+        )
+
+        parser.add_argument(
+            "--index-max-age-hours",
+            type=float,
+            default=24.0,
+            help="Idade máxima (horas) de uma entrada do índice antes de ser verificada novamente na origem (padrão: 24)",
+        )
+
+        parser.add_argument(
+            "--index-recent-months",
+            type=int,
+            default=3,
+            help="Últimos meses disponíveis de cada base que continuam sendo verificados na origem, pois "
+            "a TLC revisa os arquivos recentes; meses anteriores com ETag ou tamanho conhecidos são "
+            "considerados estáveis (padrão: 3)",
+        )
+
+        parser.add_argument(
+            "--transcode",
+            action="store_true",
+            help="Recodifica cada arquivo antes da publicação: zstd, grupos de linhas de --row-group-rows "
+            "linhas e registros ordenados pela data/hora de embarque. O arquivo é baixado para disco "
+            "e publicado somente após validar o footer e a contagem de linhas",
+        )
+
+        parser.add_argument(
+            "--transcode-columns",
+            default="all",
+            help="Colunas mantidas na recodificação: 'all' (padrão), 'silver' (colunas lidas pelo ETL silver) "
+            "ou uma lista separada por vírgula",
+        )
+
+        parser.add_argument(
+            "--row-group-rows",
+            type=int,
+            default=1_000_000,
+            help="Linhas por grupo de linhas dos arquivos recodificados (padrão: 1000000)",
+        )
+
+        parser.add_argument(
+            "--spool-dir",
+            help="Diretório dos arquivos temporários da recodificação (padrão: diretório temporário do sistema)",
+        )
+        add_backend_argument(parser)
+        add_instrumentation_argument(parser)
+
         args = parser.parse_args()
+
+        if len(args.bases) > 1 and "{base}" not in args.s3_prefix:
+            parser.error("--s3-prefix deve conter {base} quando mais de uma base é informada")
+        if args.part_size_mb < MIN_PART_SIZE_MB:
+            parser.error(f"--part-size-mb deve ser no mínimo {MIN_PART_SIZE_MB}")
+        if args.max_in_flight_parts < 1:
+            parser.error("--max-in-flight-parts deve ser no mínimo 1")
+        if args.segment_connections < 1:
+            parser.error("--segment-connections deve ser no mínimo 1")
+        if args.max_workers < 1:
+            parser.error("--max-workers deve ser no mínimo 1")
+        if args.requests_per_second <= 0:
+            parser.error("--requests-per-second deve ser maior que zero")
+        if args.max_retries < 0:
+            parser.error("--max-retries não pode ser negativo")
+        if args.index_recent_months < 0:
+            parser.error("--index-recent-months não pode ser negativo")
+        if args.row_group_rows < 1:
+            parser.error("--row-group-rows deve ser no mínimo 1")
+
         return cls(
-            base=args.base,
+            bases=args.bases,
             s3_bucket=args.s3_bucket,
             start_month=args.start_month,
             end_month=args.end_month,
             s3_prefix=args.s3_prefix,
             base_url=args.base_url,
+            upload_mode=args.upload_mode,
+            part_size_mb=args.part_size_mb,
+            max_in_flight_parts=args.max_in_flight_parts,
+            ranged_threshold_mb=args.ranged_threshold_mb,
+            segment_connections=args.segment_connections,
+            checkpoint_prefix=args.checkpoint_prefix,
+            max_workers=args.max_workers,
+            requests_per_second=args.requests_per_second,
+            max_retries=args.max_retries,
+            index_key=args.index_key,
+            index_max_age_hours=args.index_max_age_hours,
+            index_recent_months=args.index_recent_months,
+            transcode=args.transcode,
+            transcode_columns=args.transcode_columns,
+            row_group_rows=args.row_group_rows,
+            spool_dir=args.spool_dir,
+            backend=args.backend,
+            run_metrics=args.run_metrics,
+        )
+
+
+class TokenBucket:
+    """
+    Limitador de taxa (token bucket) compartilhado entre threads.
+
+    Os tokens são repostos continuamente a `rate` por segundo até o limite de `capacity`,
+    permitindo pequenas rajadas sem ultrapassar a taxa média configurada.
+    """
+
+    def __init__(self, rate: "float", capacity: "float | None" = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> "None":
+        """Bloqueia até que um token esteja disponível e o consome."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+@dataclass
+class DownloadTask:
+    """Arquivo (base, mês) a ser baixado para o S3."""
+
+    base: "str"
+    month: "str"
+    filename: "str"
+    url: "str"
+    s3_key: "str"
+
+
+@dataclass
+class IndexEntry:
+    """Situação de um arquivo na origem, conforme a última verificação (HEAD)."""
+
+    base: "str"
+    month: "str"
+    available: "bool"
+    checked_at: "str"
+    size: "Optional[int]" = None
+    etag: "Optional[str]" = None
+    # Versão (ETag/tamanho na origem) do arquivo publicado na landing
+    published_etag: "Optional[str]" = None
+    published_size: "Optional[int]" = None
+    # Parâmetros da recodificação do arquivo publicado; None se publicado como na origem
+    published_encoding: "Optional[str]" = None
+
+
+@dataclass
+class RangedCheckpoint:
+    """Estado de um download segmentado, usado para retomar execuções interrompidas."""
+
+    upload_id: "str"
+    source_etag: "Optional[str]"
+    size: "int"
+    part_size: "int"
+    # Número da parte -> ETag da parte no multipart upload
+    parts: "Dict[int, str]"
+
+
+class AvailabilityIndex:
+    """
+    Índice de disponibilidade dos arquivos da TLC, persistido em JSON no S3.
+
+    Guarda, por arquivo, se ele existe na origem, seu tamanho e ETag, e qual versão
+    já foi publicada na landing. Permite pular arquivos inexistentes e detectar
+    arquivos alterados na origem sem baixar nada.
+    """
+
+    def __init__(self, entries: "Dict[str, IndexEntry] | None" = None) -> None:
+        self.entries = entries or {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, s3_client: "S3Client", bucket: "str", key: "str") -> "Self":
+        """Carrega o índice do S3; retorna um índice vazio se ele ainda não existir."""
+        try:
+            body = s3_client.get_object(Bucket=bucket, Key=key)["Body"].read()
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return cls()
+            raise
+
+        data = json.loads(body)
+        return cls(
+            {
+                filename: IndexEntry(**entry)
+                for filename, entry in data.get("files", {}).items()
+            }
+        )
+
+    def save(self, s3_client: "S3Client", bucket: "str", key: "str") -> "None":
+        """Grava o índice no S3."""
+        with self.lock:
+            data = {
+                "files": {
+                    filename: asdict(entry)
+                    for filename, entry in sorted(self.entries.items())
+                }
+            }
+
+        s3_client.put_object(
+            Bucket=bucket,
+            Key=key,
+            Body=json.dumps(data, indent=1).encode("utf-8"),
+            ContentType="application/json",
         )
 
+    def get(self, filename: "str") -> "Optional[IndexEntry]":
+        with self.lock:
+            return self.entries.get(filename)
+
+    def put(self, filename: "str", entry: "IndexEntry") -> "None":
+        with self.lock:
+            self.entries[filename] = entry
+
+    def first_available_month(self, base: "str") -> "Optional[str]":
+        """Retorna o mês mais antigo disponível na origem para uma base."""
+        with self.lock:
+            months = [
+                entry.month
+                for entry in self.entries.values()
+                if entry.base == base and entry.available
+            ]
+        return min(months) if months else None
+
+    def last_available_month(self, base: "str") -> "Optional[str]":
+        """Retorna o mês mais recente disponível na origem para uma base."""
+        with self.lock:
+            months = [
+                entry.month
+                for entry in self.entries.values()
+                if entry.base == base and entry.available
+            ]
+        return max(months) if months else None
+
 
 class App:
     """Classe para fazer download dos dados de táxis de NYC para S3."""
@@ -115,9 +493,38 @@ class App:
         "highvolumeforhire": "fhvhv_tripdata",  # Alias para fhvhv
     }
 
-    def __init__(self, args: "Arguments", s3_client: "S3Client") -> None:
+    def __init__(
+        self,
+        args: "Arguments",
+        s3_client: "S3Client",
+        instrumentation: "Instrumentation | None" = None,
+    ) -> None:
         self.args = args
         self.s3_client = s3_client
+        self.instrumentation = instrumentation or Instrumentation("download")
+        self.rate_limiter = TokenBucket(args.requests_per_second)
+        self.index = AvailabilityIndex()
+
+        self.transcoder: "Optional[Transcoder]" = None
+        if args.transcode:
+            # Import tardio: o pyarrow só é necessário para a recodificação
+            from transcode import Transcoder, parse_transcode_columns
+
+            self.transcoder = Transcoder(
+                args.row_group_rows, parse_transcode_columns(args.transcode_columns)
+            )
+        # Tamanho dos arquivos recodificados publicados nesta execução
+        self.landing_sizes: "Dict[str, int]" = {}
+
+        # Sessão compartilhada entre as threads para reaproveitar conexões (keep-alive). No
+        # download segmentado, cada arquivo abre até segment_connections conexões ao host
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=args.max_workers,
+            pool_maxsize=args.max_workers * args.segment_connections,
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
 
     def generate_months_range(self, start_date: "str", end_date: "str") -> "List[str]":
         """
@@ -167,64 +574,730 @@ class App:
 
         return months
 
-    def check_s3_file_exists(self, s3_key: "str") -> "bool":
+    def list_s3_objects(self, prefix: "str") -> "Dict[str, Dict[str, object]]":
         """
-        Verifica se um arquivo já existe no S3.
+        Lista os objetos de um prefixo do S3 com uma única varredura paginada.
 
         Args:
-            s3_key: Chave (path) do arquivo no S3
+            prefix: Prefixo (pasta) no S3
 
         Returns:
-            True se o arquivo existe, False caso contrário
+            Dicionário chave -> {"size", "etag"} dos objetos encontrados
         """
-        try:
-            self.s3_client.head_object(Bucket=self.args.s3_bucket, Key=s3_key)
+        objects = {}
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+
+        for page in paginator.paginate(Bucket=self.args.s3_bucket, Prefix=f"{prefix}/"):
+            for obj in page.get("Contents", []):
+                objects[obj["Key"]] = {"size": obj["Size"], "etag": obj["ETag"]}
+
+        return objects
+
+    def probe(self, task: "DownloadTask") -> "IndexEntry":
+        """
+        Verifica com uma requisição HEAD se um arquivo existe na origem.
+
+        Args:
+            task: Arquivo a verificar
+
+        Returns:
+            Entrada do índice com disponibilidade, tamanho e ETag na origem
+        """
+        self.rate_limiter.acquire()
+        response = self.session.head(task.url, timeout=30, allow_redirects=True)
+
+        checked_at = datetime.now(timezone.utc).isoformat()
+        previous = self.index.get(task.filename)
+
+        # A origem (CloudFront) responde 403 ou 404 para arquivos inexistentes
+        if response.status_code in (403, 404):
+            return IndexEntry(task.base, task.month, available=False, checked_at=checked_at)
+
+        response.raise_for_status()
+        content_length = response.headers.get("Content-Length")
+
+        return IndexEntry(
+            base=task.base,
+            month=task.month,
+            available=True,
+            checked_at=checked_at,
+            size=int(content_length) if content_length is not None else None,
+            etag=response.headers.get("ETag"),
+            published_etag=previous.published_etag if previous else None,
+            published_size=previous.published_size if previous else None,
+            published_encoding=previous.published_encoding if previous else None,
+        )
+
+    def needs_probe(self, task: "DownloadTask") -> "bool":
+        """
+        Indica se a entrada do índice de um arquivo precisa ser atualizada na origem.
+
+        Entradas ainda não verificadas são sempre verificadas; as demais, quando mais
+        antigas que `index_max_age_hours`, exceto nos casos estáveis:
+
+        - meses anteriores ao primeiro mês disponível de uma base nunca são publicados
+          depois, então sua ausência é considerada definitiva
+        - arquivos disponíveis com ETag ou tamanho conhecidos só mudam quando a TLC revisa
+          os arquivos recentes: apenas os últimos `index_recent_months` meses disponíveis
+          da base são verificados novamente
+        """
+        entry = self.index.get(task.filename)
+        if entry is None:
             return True
-        except ClientError:
-            return False
 
-    def download_to_s3(self, url: "str", s3_key: "str", filename: "str") -> "bool":
+        if not entry.available:
+            first_month = self.index.first_available_month(task.base)
+            if first_month is not None and task.month < first_month:
+                return False
+        elif entry.etag is not None or entry.size is not None:
+            last_month = self.index.last_available_month(task.base)
+            cutoff = datetime.strptime(last_month, "%Y-%m") - relativedelta(
+                months=self.args.index_recent_months
+            )
+            if task.month <= cutoff.strftime("%Y-%m"):
+                return False
+
+        checked_at = datetime.fromisoformat(entry.checked_at)
+        max_age = timedelta(hours=self.args.index_max_age_hours)
+        return datetime.now(timezone.utc) - checked_at >= max_age
+
+    def refresh_index(self, tasks: "List[DownloadTask]") -> "None":
         """
-        Faz download de um arquivo direto para S3.
+        Atualiza incrementalmente o índice de disponibilidade, verificando em paralelo
+        somente os arquivos cuja entrada está ausente ou expirada.
 
         Args:
-            url: URL do arquivo
+            tasks: Arquivos candidatos ao download
+        """
+        stale = [task for task in tasks if self.needs_probe(task)]
+        print(f"Verificando disponibilidade na origem: {len(stale)}/{len(tasks)} arquivos")
+
+        with ThreadPoolExecutor(max_workers=self.args.max_workers) as executor:
+            futures = {task.filename: executor.submit(self.probe, task) for task in stale}
+
+        for filename, future in futures.items():
+            try:
+                self.index.put(filename, future.result())
+            except requests.exceptions.RequestException as e:
+                print(f"Erro ao verificar disponibilidade de {filename}: {e}")
+
+    def is_up_to_date(
+        self, task: "DownloadTask", listing: "Dict[str, Dict[str, object]]"
+    ) -> "Tuple[bool, bool]":
+        """
+        Indica se o arquivo publicado na landing corresponde à versão atual da origem.
+
+        Um arquivo presente na landing é baixado novamente se seu tamanho ou o ETag
+        publicado diferirem do que a origem informa no índice, ou se ele foi publicado com
+        outra recodificação (ou sem ela). O tamanho de um arquivo recodificado é comparado
+        com o registrado na publicação.
+
+        Returns:
+            Se o arquivo está atualizado e se a versão da origem ainda precisa ser
+            registrada como publicada no índice (`mark_published`)
+        """
+        obj = listing.get(task.s3_key)
+        entry = self.index.get(task.filename)
+        if obj is None or entry is None:
+            return False, False
+
+        if entry.published_encoding != self.landing_encoding():
+            return False, False
+
+        size = entry.published_size if entry.published_encoding else entry.size
+        if size is not None and obj["size"] != size:
+            return False, False
+
+        # Objetos publicados antes do índice existir: aceita pelo tamanho; a versão ainda
+        # não consta no índice
+        if entry.published_etag is None:
+            return True, True
+
+        return entry.published_etag == entry.etag, False
+
+    def landing_encoding(self) -> "Optional[str]":
+        """Parâmetros da recodificação desta execução; None se os arquivos são publicados como na origem."""
+        return self.transcoder.encoding if self.transcoder is not None else None
+
+    def mark_published(self, task: "DownloadTask") -> "None":
+        """Registra no índice que a versão atual da origem foi publicada na landing."""
+        entry = self.index.get(task.filename)
+        if entry is not None:
+            entry.published_etag = entry.etag
+            entry.published_size = self.landing_sizes.get(task.filename, entry.size)
+            entry.published_encoding = self.landing_encoding()
+            self.index.put(task.filename, entry)
+
+    def plan_downloads(self, tasks: "List[DownloadTask]") -> "List[DownloadTask]":
+        """
+        Seleciona os arquivos que precisam ser baixados, comparando o índice de
+        disponibilidade com uma única listagem do prefixo de cada base na landing.
+
+        Args:
+            tasks: Arquivos candidatos ao download
+
+        Returns:
+            Arquivos disponíveis na origem e ausentes ou desatualizados na landing
+        """
+        listings = {
+            base: self.list_s3_objects(self.args.get_s3_prefix(base))
+            for base in {task.base for task in tasks}
+        }
+
+        pending = []
+        unavailable = up_to_date = 0
+        for task in tasks:
+            entry = self.index.get(task.filename)
+            if entry is not None and not entry.available:
+                unavailable += 1
+                continue
+
+            current, unrecorded = self.is_up_to_date(task, listings[task.base])
+            if unrecorded:
+                self.mark_published(task)
+            if current:
+                up_to_date += 1
+            else:
+                pending.append(task)
+
+        print(
+            f"Arquivos indisponíveis na origem: {unavailable}; "
+            f"já atualizados no S3: {up_to_date}; a baixar: {len(pending)}"
+        )
+        return pending
+
+    def buffer_to_s3(self, response: "requests.Response", s3_key: "str") -> "None":
+        """
+        Acumula todo o conteúdo da resposta em memória e faz um único upload para o S3.
+
+        Args:
+            response: Resposta HTTP aberta em modo stream
             s3_key: Chave (path) onde salvar o arquivo no S3
-            filename: Nome do arquivo (para exibição)
+        """
+        file_data = io.BytesIO()
+
+        for chunk in response.iter_content(chunk_size=8192):
+            if chunk:
+                file_data.write(chunk)
+
+        # Volta para o início do buffer antes de fazer upload
+        file_data.seek(0)
+
+        self.s3_client.upload_fileobj(
+            file_data,
+            self.args.s3_bucket,
+            s3_key,
+            ExtraArgs={"ContentType": "application/octet-stream"},
+        )
+
+    def iter_parts(
+        self, response: "requests.Response", part_size: "int"
+    ) -> "Iterator[bytes]":
+        """
+        Agrupa os chunks de uma resposta HTTP em blocos de `part_size` bytes.
+
+        O último bloco pode ser menor que `part_size`. Uma resposta vazia gera um
+        único bloco vazio, para que o multipart upload sempre tenha ao menos uma parte.
+
+        Args:
+            response: Resposta HTTP aberta em modo stream
+            part_size: Tamanho de cada bloco em bytes
 
         Returns:
-            True se o download foi bem-sucedido, False caso contrário
+            Iterador de blocos de bytes
+        """
+        buffer = bytearray()
+        emitted = False
+
+        for chunk in response.iter_content(chunk_size=1024 * 1024):
+            if not chunk:
+                continue
+
+            buffer.extend(chunk)
+            while len(buffer) >= part_size:
+                yield bytes(buffer[:part_size])
+                del buffer[:part_size]
+                emitted = True
+
+        if buffer or not emitted:
+            yield bytes(buffer)
+
+    def upload_part(
+        self, s3_key: "str", upload_id: "str", part_number: "int", body: "bytes"
+    ) -> "Dict[str, object]":
+        """
+        Envia uma parte de um multipart upload.
+
+        Returns:
+            Dicionário com PartNumber e ETag, no formato esperado por complete_multipart_upload
+        """
+        response = self.s3_client.upload_part(
+            Bucket=self.args.s3_bucket,
+            Key=s3_key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=body,
+        )
+        return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+    def stream_to_s3(self, response: "requests.Response", s3_key: "str") -> "None":
+        """
+        Envia o conteúdo de uma resposta HTTP para o S3 via multipart upload, parte a parte.
+
+        Cada parte completa é enviada por uma thread enquanto os próximos chunks continuam
+        sendo baixados, sobrepondo download e upload. O número de partes em memória é limitado
+        por `max_in_flight_parts`, então o pico de memória fica em torno de
+        part_size x (max_in_flight_parts + 1), independentemente do tamanho do arquivo.
+        Em caso de erro o multipart upload é abortado para não deixar partes órfãs no bucket.
+
+        Args:
+            response: Resposta HTTP aberta em modo stream
+            s3_key: Chave (path) onde salvar o arquivo no S3
+        """
+        part_size = self.args.part_size_mb * 1024 * 1024
+        upload_id = self.s3_client.create_multipart_upload(
+            Bucket=self.args.s3_bucket,
+            Key=s3_key,
+            ContentType="application/octet-stream",
+        )["UploadId"]
+
+        # Cada parte ocupa um slot desde que é montada até terminar o upload
+        slots = threading.BoundedSemaphore(self.args.max_in_flight_parts)
+        futures: "List[Future]" = []
+
+        try:
+            with ThreadPoolExecutor(
+                max_workers=self.args.max_in_flight_parts
+            ) as executor:
+                for part_number, body in enumerate(
+                    self.iter_parts(response, part_size), start=1
+                ):
+                    slots.acquire()
+
+                    # Interrompe o download assim que alguma parte falhar
+                    for future in futures:
+                        if future.done() and future.exception():
+                            slots.release()
+                            raise future.exception()
+
+                    future = executor.submit(
+                        self.upload_part, s3_key, upload_id, part_number, body
+                    )
+                    future.add_done_callback(lambda _: slots.release())
+                    futures.append(future)
+                    del body
+
+                parts = [future.result() for future in futures]
+
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.args.s3_bucket,
+                Key=s3_key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+
+        except BaseException:
+            self.s3_client.abort_multipart_upload(
+                Bucket=self.args.s3_bucket, Key=s3_key, UploadId=upload_id
+            )
+            raise
+
+    def is_retryable(self, error: "Exception") -> "bool":
+        """
+        Indica se uma falha de download é transitória e vale uma nova tentativa.
+
+        Falhas de conexão, timeouts, HTTP 429 e erros 5xx são transitórios; demais erros
+        HTTP (ex: 404 de um mês ainda não publicado) não são repetidos.
         """
+        if isinstance(error, requests.exceptions.HTTPError):
+            status = error.response.status_code if error.response is not None else None
+            return status == 429 or (status is not None and status >= 500)
+
+        return isinstance(
+            error,
+            (
+                requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout,
+                requests.exceptions.ChunkedEncodingError,
+            ),
+        )
+
+    def checkpoint_key(self, s3_key: "str") -> "str":
+        """Retorna a chave do checkpoint de um download segmentado."""
+        return f"{self.args.checkpoint_prefix}/{s3_key}.json"
+
+    def load_checkpoint(self, s3_key: "str") -> "Optional[RangedCheckpoint]":
+        """Carrega o checkpoint de um download segmentado, se existir."""
         try:
-            # Verifica se o arquivo já existe no S3
-            if self.check_s3_file_exists(s3_key):
-                print(f"Arquivo já existe no S3: {filename}")
-                return True
+            body = self.s3_client.get_object(
+                Bucket=self.args.s3_bucket, Key=self.checkpoint_key(s3_key)
+            )["Body"].read()
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                return None
+            raise
+
+        data = json.loads(body)
+        data["parts"] = {int(number): etag for number, etag in data["parts"].items()}
+        return RangedCheckpoint(**data)
+
+    def save_checkpoint(self, s3_key: "str", checkpoint: "RangedCheckpoint") -> "None":
+        """Grava o checkpoint de um download segmentado."""
+        self.s3_client.put_object(
+            Bucket=self.args.s3_bucket,
+            Key=self.checkpoint_key(s3_key),
+            Body=json.dumps(asdict(checkpoint)).encode("utf-8"),
+            ContentType="application/json",
+        )
 
-            print(f"Baixando {filename}...")
-            response = requests.get(url, stream=True, timeout=30)
+    def resume_checkpoint(
+        self, s3_key: "str", size: "int", etag: "Optional[str]", part_size: "int"
+    ) -> "RangedCheckpoint":
+        """
+        Retoma o multipart upload de um download segmentado interrompido ou inicia um novo.
+
+        O checkpoint só é reaproveitado se o arquivo na origem (tamanho e ETag) e o tamanho
+        das partes forem os mesmos, e somente as partes confirmadas pelo S3 são mantidas.
+        """
+        checkpoint = self.load_checkpoint(s3_key)
+
+        if checkpoint is not None and (
+            checkpoint.size != size
+            or checkpoint.source_etag != etag
+            or checkpoint.part_size != part_size
+        ):
+            print(f"Arquivo alterado na origem, descartando checkpoint: {s3_key}")
+            try:
+                self.s3_client.abort_multipart_upload(
+                    Bucket=self.args.s3_bucket, Key=s3_key, UploadId=checkpoint.upload_id
+                )
+            except ClientError:
+                pass
+            checkpoint = None
+
+        if checkpoint is not None:
+            try:
+                uploaded = {}
+                paginator = self.s3_client.get_paginator("list_parts")
+                for page in paginator.paginate(
+                    Bucket=self.args.s3_bucket, Key=s3_key, UploadId=checkpoint.upload_id
+                ):
+                    for part in page.get("Parts", []):
+                        uploaded[part["PartNumber"]] = part["ETag"]
+
+                checkpoint.parts = {
+                    number: etag
+                    for number, etag in checkpoint.parts.items()
+                    if uploaded.get(number) == etag
+                }
+                print(
+                    f"Retomando {s3_key}: {len(checkpoint.parts)} partes já enviadas"
+                )
+                return checkpoint
+            except ClientError:
+                # Upload expirado ou abortado: recomeça do zero
+                pass
+
+        upload_id = self.s3_client.create_multipart_upload(
+            Bucket=self.args.s3_bucket,
+            Key=s3_key,
+            ContentType="application/octet-stream",
+        )["UploadId"]
+        checkpoint = RangedCheckpoint(upload_id, etag, size, part_size, parts={})
+        self.save_checkpoint(s3_key, checkpoint)
+        return checkpoint
+
+    def fetch_segment_to_part(
+        self,
+        url: "str",
+        s3_key: "str",
+        checkpoint: "RangedCheckpoint",
+        part_number: "int",
+    ) -> "Dict[str, object]":
+        """
+        Baixa um segmento (HTTP Range) do arquivo e o envia como uma parte do multipart upload.
+
+        Returns:
+            Dicionário com PartNumber e ETag da parte enviada
+        """
+        start = (part_number - 1) * checkpoint.part_size
+        end = min(start + checkpoint.part_size, checkpoint.size) - 1
+
+        headers = {"Range": f"bytes={start}-{end}"}
+        if checkpoint.source_etag:
+            # Se o arquivo mudar na origem, o servidor devolve o arquivo inteiro (200)
+            headers["If-Range"] = checkpoint.source_etag
+
+        self.rate_limiter.acquire()
+        with self.session.get(url, headers=headers, timeout=30) as response:
             response.raise_for_status()
+            if response.status_code != 206:
+                raise ValueError(f"Origem não respeitou o segmento bytes={start}-{end}")
 
-            # Faz o download em streaming direto para S3
-            # Usa BytesIO para acumular os chunks e fazer upload
-            file_data = io.BytesIO()
+            body = response.content
 
-            for chunk in response.iter_content(chunk_size=8192):
+        if len(body) != end - start + 1:
+            raise requests.exceptions.ChunkedEncodingError(
+                f"Segmento incompleto bytes={start}-{end}: {len(body)} bytes recebidos"
+            )
+
+        return self.upload_part(s3_key, checkpoint.upload_id, part_number, body)
+
+    def ranged_to_s3(self, url: "str", s3_key: "str") -> "bool":
+        """
+        Baixa um arquivo em segmentos (HTTP Range) por várias conexões e envia cada
+        segmento como uma parte do multipart upload.
+
+        As partes concluídas são registradas em um checkpoint no S3, de modo que uma
+        execução interrompida retoma apenas os segmentos faltantes. O pico de memória
+        fica em torno de part_size x segment_connections.
+
+        Args:
+            url: URL do arquivo
+            s3_key: Chave (path) onde salvar o arquivo no S3
+
+        Returns:
+            True se o arquivo foi enviado; False se a origem não aceita requisições
+            por intervalo e o download deve seguir pelo modo streaming
+        """
+        self.rate_limiter.acquire()
+        head = self.session.head(url, timeout=30, allow_redirects=True)
+        head.raise_for_status()
+
+        size = int(head.headers.get("Content-Length", 0))
+        if head.headers.get("Accept-Ranges", "").lower() != "bytes" or size == 0:
+            return False
+
+        part_size = self.args.part_size_mb * 1024 * 1024
+        checkpoint = self.resume_checkpoint(
+            s3_key, size, head.headers.get("ETag"), part_size
+        )
+
+        total_parts = (size + part_size - 1) // part_size
+        pending = [
+            number
+            for number in range(1, total_parts + 1)
+            if number not in checkpoint.parts
+        ]
+
+        error = None
+        with ThreadPoolExecutor(max_workers=self.args.segment_connections) as executor:
+            futures = [
+                executor.submit(
+                    self.fetch_segment_to_part, url, s3_key, checkpoint, number
+                )
+                for number in pending
+            ]
+
+            for future in futures:
+                if future.cancelled():
+                    continue
+
+                try:
+                    part = future.result()
+                except Exception as e:
+                    # Não inicia novos segmentos, mas registra os que já estão em andamento
+                    error = error or e
+                    for other in futures:
+                        other.cancel()
+                    continue
+
+                checkpoint.parts[part["PartNumber"]] = part["ETag"]
+                self.save_checkpoint(s3_key, checkpoint)
+
+        if error is not None:
+            # Mantém o multipart upload e o checkpoint para a próxima tentativa
+            raise error
+
+        self.s3_client.complete_multipart_upload(
+            Bucket=self.args.s3_bucket,
+            Key=s3_key,
+            UploadId=checkpoint.upload_id,
+            MultipartUpload={
+                "Parts": [
+                    {"PartNumber": number, "ETag": checkpoint.parts[number]}
+                    for number in sorted(checkpoint.parts)
+                ]
+            },
+        )
+        self.s3_client.delete_object(
+            Bucket=self.args.s3_bucket, Key=self.checkpoint_key(s3_key)
+        )
+        return True
+
+    def spool_response(self, response: "requests.Response", path: "str") -> "int":
+        """
+        Grava o conteúdo de uma resposta HTTP em disco, chunk a chunk.
+
+        Returns:
+            Quantidade de bytes gravados
+        """
+        size = 0
+        with open(path, "wb") as file:
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
                 if chunk:
-                    file_data.write(chunk)
+                    file.write(chunk)
+                    size += len(chunk)
 
-            # Volta para o início do buffer antes de fazer upload
-            file_data.seek(0)
+        expected = response.headers.get("Content-Length")
+        if expected is not None and size != int(expected):
+            raise requests.exceptions.ChunkedEncodingError(
+                f"Download incompleto: {size} de {expected} bytes recebidos"
+            )
+        return size
+
+    def transcode_to_s3(self, url: "str", s3_key: "str", filename: "str") -> "None":
+        """
+        Baixa um arquivo para disco, recodifica e envia o resultado para o S3.
 
-            # Faz upload para o S3
-            self.s3_client.upload_fileobj(
-                file_data,
+        O arquivo de origem e o recodificado ficam em um diretório temporário em
+        `spool_dir`, removido ao final. A recodificação lê o arquivo lote a lote e o envio
+        usa multipart upload a partir do disco, então a memória não depende do tamanho do
+        arquivo. O objeto só é publicado depois de validados o footer e a contagem de
+        linhas; uma falha não altera a versão já publicada na landing.
+
+        Args:
+            url: URL do arquivo
+            s3_key: Chave (path) onde salvar o arquivo no S3
+            filename: Nome do arquivo
+        """
+        from transcode import extract_month
+
+        with tempfile.TemporaryDirectory(dir=self.args.spool_dir) as spool_dir:
+            source_path = os.path.join(spool_dir, "origem.parquet")
+            output_path = os.path.join(spool_dir, "recodificado.parquet")
+
+            self.rate_limiter.acquire()
+            with self.session.get(url, stream=True, timeout=30) as response:
+                response.raise_for_status()
+                self.spool_response(response, source_path)
+
+            result = self.transcoder.transcode(
+                source_path, output_path, extract_month(s3_key), spool_dir
+            )
+
+            part_size = self.args.part_size_mb * 1024 * 1024
+            self.s3_client.upload_file(
+                output_path,
                 self.args.s3_bucket,
                 s3_key,
                 ExtraArgs={"ContentType": "application/octet-stream"},
+                Config=TransferConfig(
+                    multipart_threshold=part_size,
+                    multipart_chunksize=part_size,
+                    max_concurrency=self.args.max_in_flight_parts,
+                ),
             )
 
+        self.landing_sizes[filename] = result.output_bytes
+        self.instrumentation.emit(
+            "transcodificacao",
+            filename,
+            bytes_origem=result.source_bytes,
+            bytes_landing=result.output_bytes,
+            linhas=result.rows,
+            grupos_de_linhas=result.row_groups,
+            colunas=result.columns,
+            ordenado_por=result.sort_column,
+            segundos=round(result.seconds, 3),
+        )
+
+    def resolve_upload_mode(self, filename: "str") -> "str":
+        """
+        Define o modo de envio de um arquivo. Com recodificação, todos os arquivos passam
+        por disco. No modo auto, arquivos cujo tamanho no índice atinge
+        `ranged_threshold_mb` usam download segmentado.
+        """
+        if self.transcoder is not None:
+            return "transcode"
+
+        if self.args.upload_mode != "auto":
+            return self.args.upload_mode
+
+        entry = self.index.get(filename)
+        threshold = self.args.ranged_threshold_mb * 1024 * 1024
+        if entry is not None and entry.size is not None and entry.size >= threshold:
+            return "ranged"
+
+        return "streaming"
+
+    def transfer_to_s3(self, url: "str", s3_key: "str", filename: "str") -> "str":
+        """
+        Baixa um arquivo e envia para o S3, propagando qualquer erro.
+
+        Args:
+            url: URL do arquivo
+            s3_key: Chave (path) onde salvar o arquivo no S3
+            filename: Nome do arquivo
+
+        Returns:
+            Modo de envio efetivamente usado (streaming quando a origem recusa o segmentado)
+        """
+        upload_mode = self.resolve_upload_mode(filename)
+
+        if upload_mode == "transcode":
+            self.transcode_to_s3(url, s3_key, filename)
+            return upload_mode
+
+        if upload_mode == "ranged":
+            if self.ranged_to_s3(url, s3_key):
+                return upload_mode
+            upload_mode = "streaming"
+
+        self.rate_limiter.acquire()
+
+        with self.session.get(url, stream=True, timeout=30) as response:
+            response.raise_for_status()
+
+            if upload_mode == "streaming":
+                self.stream_to_s3(response, s3_key)
+            else:
+                self.buffer_to_s3(response, s3_key)
+
+        return upload_mode
+
+    def download_to_s3(self, url: "str", s3_key: "str", filename: "str") -> "bool":
+        """
+        Faz download de um arquivo direto para S3.
+
+        Falhas transitórias são repetidas até `max_retries` vezes, com backoff
+        exponencial e jitter entre as tentativas.
+
+        Args:
+            url: URL do arquivo
+            s3_key: Chave (path) onde salvar o arquivo no S3
+            filename: Nome do arquivo (para exibição)
+
+        Returns:
+            True se o download foi bem-sucedido, False caso contrário
+        """
+        try:
+            attempt = 0
+            started = time.perf_counter()
+            while True:
+                print(f"Baixando {filename}...")
+                try:
+                    upload_mode = self.transfer_to_s3(url, s3_key, filename)
+                    break
+                except Exception as e:
+                    if attempt >= self.args.max_retries or not self.is_retryable(e):
+                        raise
+
+                    # Full jitter: espera aleatória até o teto exponencial da tentativa
+                    delay = random.uniform(
+                        0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2**attempt)
+                    )
+                    attempt += 1
+                    print(
+                        f"Falha transitória em {filename} ({e}); "
+                        f"nova tentativa {attempt}/{self.args.max_retries} em {delay:.1f}s"
+                    )
+                    time.sleep(delay)
+
             print(f"Upload concluído para S3: s3://{self.args.s3_bucket}/{s3_key}")
+            self.record_throughput(
+                filename, s3_key, time.perf_counter() - started, attempt, upload_mode
+            )
             return True
 
         except requests.exceptions.RequestException as e:
@@ -239,40 +1312,122 @@ class App:
             print(f"Erro inesperado em {filename}: {e}")
             return False
 
-    def download_dataset(
+    def record_throughput(
+        self,
+        filename: "str",
+        s3_key: "str",
+        seconds: "float",
+        retries: "int",
+        upload_mode: "str",
+    ) -> "None":
+        """
+        Registra o tamanho, a duração e a vazão do envio de um arquivo. O tamanho vem do
+        índice (HEAD na origem) ou, se ausente, do objeto publicado no S3.
+        """
+        entry = self.index.get(filename)
+        size = entry.size if entry is not None else None
+        if size is None:
+            # A métrica não deve falhar um arquivo já publicado
+            try:
+                size = self.s3_client.head_object(Bucket=self.args.s3_bucket, Key=s3_key)[
+                    "ContentLength"
+                ]
+            except ClientError as e:
+                print(f"Tamanho de {filename} indisponível para a métrica de vazão: {e}")
+
+        self.instrumentation.emit(
+            "arquivo",
+            filename,
+            bytes=size,
+            segundos=round(seconds, 3),
+            mb_por_segundo=(
+                round(size / 1024 / 1024 / seconds, 2) if size is not None and seconds else None
+            ),
+            tentativas=retries + 1,
+            modo=upload_mode,
+        )
+
+    def build_tasks(
         self, data_type: "str", months: "List[str]"
-    ) -> "Dict[str, bool]":
+    ) -> "List[DownloadTask]":
         """
-        Faz download de um tipo específico de dados para S3.
+        Monta a lista de arquivos a baixar de um tipo de dados.
 
         Args:
             data_type: Tipo de dados (yellow, green, fhv, fhvhv)
             months: Lista de meses no formato YYYY-MM
 
         Returns:
-            Dicionário com status do download para cada arquivo
+            Lista de tarefas de download, uma por mês
         """
         if data_type not in self.data_types:
             raise ValueError(f"Tipo de dados inválido: {data_type}")
 
-        results = {}
         data_prefix = self.data_types[data_type]
+        s3_prefix = self.args.get_s3_prefix(data_type)
 
+        tasks = []
         for month in months:
             # Cria a estrutura de particionamento Hive no S3
             # Formato: s3://bucket/prefix/ano_mes_referencia=<ano-mes>/arquivo.parquet
             filename = f"{data_prefix}_{month}.parquet"
-            s3_key = f"{self.args.s3_prefix}/ano_mes_referencia={month}/{filename}"
-            url = f"{self.args.base_url}/{filename}"
+            tasks.append(
+                DownloadTask(
+                    base=data_type,
+                    month=month,
+                    filename=filename,
+                    url=f"{self.args.base_url}/{filename}",
+                    s3_key=f"{s3_prefix}/ano_mes_referencia={month}/{filename}",
+                )
+            )
+
+        return tasks
 
-            success = self.download_to_s3(url, s3_key, filename)
-            results[filename] = success
+    def download_tasks(self, tasks: "List[DownloadTask]") -> "Dict[str, bool]":
+        """
+        Baixa um conjunto de arquivos em paralelo.
+
+        Os arquivos são distribuídos em um pool de `max_workers` threads que compartilham
+        a mesma sessão HTTP e o mesmo limitador de taxa, de modo que o tempo total tende
+        ao tempo dos arquivos mais lentos e não à soma de todos.
+
+        Args:
+            tasks: Tarefas de download
+
+        Returns:
+            Dicionário com status do download para cada arquivo
+        """
+        with ThreadPoolExecutor(max_workers=self.args.max_workers) as executor:
+            futures = {
+                task.filename: executor.submit(
+                    self.download_to_s3, task.url, task.s3_key, task.filename
+                )
+                for task in tasks
+            }
 
-            # Pequena pausa entre downloads
-            time.sleep(1)
+        results = {}
+        for task in tasks:
+            results[task.filename] = futures[task.filename].result()
+            if results[task.filename]:
+                self.mark_published(task)
 
         return results
 
+    def download_dataset(
+        self, data_type: "str", months: "List[str]"
+    ) -> "Dict[str, bool]":
+        """
+        Faz download de um tipo específico de dados para S3.
+
+        Args:
+            data_type: Tipo de dados (yellow, green, fhv, fhvhv)
+            months: Lista de meses no formato YYYY-MM
+
+        Returns:
+            Dicionário com status do download para cada arquivo
+        """
+        return self.download_tasks(self.build_tasks(data_type, months))
+
     def run(self) -> None:
         """
         Executa o processo de download baseado nos argumentos fornecidos.
@@ -285,13 +1440,33 @@ class App:
         else:
             months = self.get_all_available_months()
 
+        tasks = [
+            task for base in self.args.bases for task in self.build_tasks(base, months)
+        ]
+
         print(
-            f"Iniciando download da base {self.args.base} para S3://{self.args.s3_bucket}/{self.args.s3_prefix}/"
+            f"Iniciando download das bases {', '.join(self.args.bases)} para S3://{self.args.s3_bucket}/{self.args.s3_prefix}/"
         )
-        print(f"Total de meses a baixar: {len(months)}")
+        print(f"Total de meses candidatos: {len(months)}")
+
+        # Atualiza o índice de disponibilidade e decide o que baixar
+        with self.instrumentation.stage("indice", arquivos=len(tasks)):
+            self.index = AvailabilityIndex.load(
+                self.s3_client, self.args.s3_bucket, self.args.index_key
+            )
+            self.refresh_index(tasks)
+        with self.instrumentation.stage("planejamento") as stage:
+            tasks = self.plan_downloads(tasks)
+            stage["arquivos"] = len(tasks)
+        print(f"Total de arquivos a baixar: {len(tasks)} ({self.args.max_workers} em paralelo)")
 
         # Faz o download dos dados
-        results = self.download_dataset(self.args.base, months)
+        try:
+            with self.instrumentation.stage("download", arquivos=len(tasks)) as stage:
+                results = self.download_tasks(tasks)
+                stage["sucessos"] = sum(1 for success in results.values() if success)
+        finally:
+            self.index.save(self.s3_client, self.args.s3_bucket, self.args.index_key)
 
         # Resumo dos resultados
         successful = sum(1 for success in results.values() if success)
@@ -310,20 +1485,25 @@ class App:
 def main():
     args = Arguments.parse_arguments()
 
-    dbutils = WorkspaceClient().dbutils
-    aws_access_key_id = dbutils.secrets.get("s3-access-keys", "AWS_ACCESS_KEY_ID")
-    aws_secret_access_key = dbutils.secrets.get(
-        "s3-access-keys", "AWS_SECRET_ACCESS_KEY"
-    )
+    backend = get_backend(args.backend)
+    aws_access_key_id = backend.get_secret("s3-access-keys", "AWS_ACCESS_KEY_ID")
+    aws_secret_access_key = backend.get_secret("s3-access-keys", "AWS_SECRET_ACCESS_KEY")
 
     s3_client = boto3.client(
         "s3",
         aws_access_key_id=aws_access_key_id,
         aws_secret_access_key=aws_secret_access_key,
+        endpoint_url=backend.s3_endpoint_url,
     )
 
-    app = App(args, s3_client)
-    app.run()
+    instrumentation = Instrumentation("download")
+    app = App(args, s3_client, instrumentation)
+    try:
+        app.run()
+    finally:
+        # O download não usa Spark; a sessão só é obtida para gravar as métricas
+        if args.run_metrics:
+            instrumentation.save(backend.get_spark())
 
 
 if __name__ == "__main__":
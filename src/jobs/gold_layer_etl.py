@@ -0,0 +1,180 @@
+import argparse
+from dataclasses import dataclass
+from datetime import datetime
+import sys
+from pyspark.sql import SparkSession, functions as F, DataFrame
+
+from backends import add_backend_argument, get_backend
+from instrumentation import Instrumentation, add_instrumentation_argument
+from partitions import generate_months_range, partition_overwrite_mode
+
+GOLD_TABLE = "gold_db.tb_agregado_corrida_hora"
+SILVER_TABLE = "silver_db.tb_corrida_taxi_ny"
+CONTROL_TABLE = "silver_db.tb_controle_processamento"
+
+# Granularidade da tabela gold: serviço, mês, hora do embarque e indicadores da corrida
+GROUPING_COLUMNS = [
+    "tipo_servico",
+    "hora_embarque",
+    "indicador_cancelamento",
+    "indicador_viagem_sem_cobranca",
+    "ano_mes_referencia",
+]
+
+
+@dataclass
+class Arguments:
+    """Classe para armazenar os argumentos do script."""
+
+    start_month: "str | None" = None
+    end_month: "str | None" = None
+    backend: "str" = "databricks"
+    run_metrics: "bool" = False
+
+    @classmethod
+    def parse_arguments(cls) -> "Arguments":
+        """Parse argumentos da linha de comando."""
+        parser = argparse.ArgumentParser(
+            description="Agregação de silver_db.tb_corrida_taxi_ny para gold_db.tb_agregado_corrida_hora"
+        )
+        parser.add_argument(
+            "start_month",
+            nargs="?",
+            help="Ano-mês de início (YYYY-MM). Se não informado, recalcula somente os meses "
+            "reprocessados pela silver desde a última execução",
+        )
+        parser.add_argument(
+            "end_month",
+            nargs="?",
+            help="Ano-mês de fim (YYYY-MM). Se não informado, usa apenas start_month",
+        )
+        add_backend_argument(parser)
+        add_instrumentation_argument(parser)
+
+        args = parser.parse_args()
+        return cls(
+            start_month=args.start_month,
+            end_month=args.end_month,
+            backend=args.backend,
+            run_metrics=args.run_metrics,
+        )
+
+    def get_months(self) -> "list[str] | None":
+        if not self.start_month:
+            return None
+        return generate_months_range(self.start_month, self.end_month)
+
+
+class Pipeline:
+    def __init__(
+        self,
+        spark: "SparkSession",
+        months: "list[str] | None" = None,
+        instrumentation: "Instrumentation | None" = None,
+    ):
+        self.spark = spark
+        # Meses a recalcular; None usa os meses reprocessados pela silver desde a última execução
+        self.months = months
+        self.instrumentation = instrumentation or Instrumentation("gold")
+
+    def read_watermark(self) -> "datetime | None":
+        # Maior data_hora_processamento da silver já refletida na gold
+        return (
+            self.spark.read.table(GOLD_TABLE)
+            .agg(F.max("data_hora_processamento_silver"))
+            .first()[0]
+        )
+
+    def find_pending_months(
+        self, watermark: "datetime | None"
+    ) -> "tuple[list[str], datetime | None]":
+        # Meses com cargas processadas pela silver depois da marca d'água, e a nova marca d'água
+        control = self.spark.read.table(CONTROL_TABLE)
+        if watermark is not None:
+            control = control.filter(F.col("data_hora_processamento") > watermark)
+
+        rows = (
+            control.groupBy("ano_mes_referencia")
+            .agg(F.max("data_hora_processamento").alias("data_hora_processamento"))
+            .collect()
+        )
+        months = sorted(row.ano_mes_referencia for row in rows)
+        new_watermark = max((row.data_hora_processamento for row in rows), default=watermark)
+        return months, new_watermark
+
+    def aggregate(self, df: "DataFrame") -> "DataFrame":
+        # Somas e contagens aditivas: médias são obtidas somando numeradores e
+        # denominadores em qualquer nível de agregação (mês, serviço, hora)
+        valor_positivo = F.when(F.col("valor_corrida") > 0, F.col("valor_corrida"))
+        df = df.withColumn("hora_embarque", F.hour("data_hora_embarque"))
+        return df.groupBy(*GROUPING_COLUMNS).agg(
+            F.count(F.lit(1)).alias("quantidade_corridas"),
+            F.sum(valor_positivo).alias("soma_valor_corrida_positivo"),
+            F.count(valor_positivo).alias("quantidade_corridas_valor_positivo"),
+            F.sum("quantidade_passageiros").cast("bigint").alias("soma_passageiros"),
+            F.count("quantidade_passageiros").alias("quantidade_corridas_com_passageiros"),
+        )
+
+    def write(self, df: "DataFrame", watermark: "datetime | None"):
+        df = df.select(
+            "tipo_servico",
+            "hora_embarque",
+            "indicador_cancelamento",
+            "indicador_viagem_sem_cobranca",
+            "quantidade_corridas",
+            F.col("soma_valor_corrida_positivo").cast("decimal(20,2)"),
+            "quantidade_corridas_valor_positivo",
+            "soma_passageiros",
+            "quantidade_corridas_com_passageiros",
+            F.lit(watermark).cast("timestamp").alias("data_hora_processamento_silver"),
+            F.current_timestamp().alias("data_hora_atualizacao"),
+            "ano_mes_referencia",
+        )
+
+        # Sobrescreve somente os meses recalculados
+        with partition_overwrite_mode(self.spark, "dynamic"):
+            df.write.insertInto(GOLD_TABLE, overwrite=True)
+
+    def run(self):
+        with self.instrumentation.stage("marca_dagua"):
+            watermark = self.read_watermark()
+            if self.months is not None:
+                # Reprocessamento explícito não avança a marca d'água
+                months, new_watermark = self.months, watermark
+            else:
+                months, new_watermark = self.find_pending_months(watermark)
+
+        if not months:
+            print("Nenhum mês reprocessado pela silver; nada a agregar")
+            return
+
+        print(f"Recalculando meses {months}")
+        with self.instrumentation.stage("escrita", tabela=GOLD_TABLE, meses=months):
+            df = self.spark.read.table(SILVER_TABLE).filter(
+                F.col("ano_mes_referencia").isin(months)
+            )
+            self.write(self.aggregate(df), new_watermark)
+
+
+def main():
+    args = Arguments.parse_arguments()
+
+    spark = get_backend(args.backend).get_spark()
+    instrumentation = Instrumentation("gold", spark)
+    pipeline = Pipeline(spark, months=args.get_months(), instrumentation=instrumentation)
+    try:
+        pipeline.run()
+    finally:
+        instrumentation.close()
+        if args.run_metrics:
+            instrumentation.save(spark)
+
+
+if __name__ == "__main__":
+    import traceback
+
+    try:
+        main()
+    except Exception as e:
+        print(traceback.format_exc())
+        sys.exit(1)
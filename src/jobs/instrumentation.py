@@ -0,0 +1,254 @@
+"""
+Instrumentação dos jobs: etapas cronometradas e métricas das consultas Spark.
+
+Cada evento é emitido como uma linha JSON no stdout, com o job e o id da execução:
+
+- `etapa`: duração de uma etapa nomeada do job e, nos jobs Spark, a soma das métricas das
+  consultas executadas durante ela (arquivos, bytes e linhas lidos e escritos, shuffle e
+  spill). Transformações do Spark são preguiçosas: leitura, conversão e união são
+  executadas, e portanto medidas, pela etapa que dispara a ação (normalmente a escrita)
+- `consulta`: duração e métricas de cada consulta Spark concluída
+- `tabela`: resultado e duração de cada tabela da ingestão bronze simultânea (`--bases`)
+- `arquivo`: tamanho, duração e vazão de cada arquivo enviado pelo download
+- `transcodificacao`: bytes na origem e na landing, linhas e grupos de linhas de cada arquivo
+  recodificado pelo download (`--transcode`)
+
+Com `--run-metrics`, os eventos também são gravados em `silver_db.tb_metricas_execucao`.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import json
+import threading
+import time
+from typing import TYPE_CHECKING, Iterator
+import uuid
+
+if TYPE_CHECKING:
+    from pyspark.sql import SparkSession
+
+RUN_METRICS_TABLE = "silver_db.tb_metricas_execucao"
+
+# Métricas dos nós do plano físico somadas por consulta: o nó é identificado por um trecho
+# do nome da sua classe (FileSourceScanExec, DataWritingCommandExec, ShuffleExchangeExec)
+QUERY_METRICS = {
+    ("Scan", "numFiles"): "arquivos_lidos",
+    ("Scan", "filesSize"): "bytes_lidos",
+    ("Scan", "numOutputRows"): "linhas_lidas",
+    ("Writ", "numFiles"): "arquivos_escritos",
+    ("Writ", "numOutputBytes"): "bytes_escritos",
+    ("Writ", "numOutputRows"): "linhas_escritas",
+    ("Exchange", "shuffleBytesWritten"): "bytes_shuffle",
+    ("Exchange", "shuffleRecordsWritten"): "linhas_shuffle",
+    ("", "spillSize"): "bytes_spill",
+}
+
+# Tempo máximo de espera (ms) pela entrega dos eventos de consultas ao fim de uma etapa
+LISTENER_FLUSH_TIMEOUT_MS = 10_000
+
+
+class QueryMetricsListener:
+    """
+    QueryExecutionListener implementado em Python via py4j.
+
+    Recebe da JVM cada consulta concluída e guarda sua duração e as métricas do plano
+    físico executado até que a etapa corrente as consuma.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queries: "list[dict]" = []
+
+    def onSuccess(self, funcName, qe, durationNs) -> "None":
+        # Exceções não podem voltar para a JVM: uma falha de coleta só descarta a métrica
+        try:
+            metrics: "dict[str, int]" = {}
+            self.collect(qe.executedPlan(), metrics)
+            query = {"operacao": funcName, "segundos": round(durationNs / 1e9, 3), **metrics}
+        except Exception as e:
+            query = {"operacao": funcName, "erro_coleta": str(e)}
+
+        with self.lock:
+            self.queries.append(query)
+
+    def onFailure(self, funcName, qe, exception) -> "None":
+        with self.lock:
+            self.queries.append({"operacao": funcName, "falha": str(exception)})
+
+    def collect(self, plan, metrics: "dict[str, int]") -> "None":
+        name = plan.getClass().getSimpleName()
+        # Planos adaptativos (AQE) e estágios de consulta envolvem o plano executado
+        if name == "AdaptiveSparkPlanExec":
+            self.collect(plan.executedPlan(), metrics)
+            return
+        if name.endswith("QueryStageExec"):
+            self.collect(plan.plan(), metrics)
+            return
+
+        iterator = plan.metrics().iterator()
+        while iterator.hasNext():
+            entry = iterator.next()
+            for (node, metric), alias in QUERY_METRICS.items():
+                if node in name and metric == entry._1():
+                    metrics[alias] = metrics.get(alias, 0) + entry._2().value()
+
+        children = plan.children()
+        for i in range(children.size()):
+            self.collect(children.apply(i), metrics)
+
+    def drain(self) -> "list[dict]":
+        with self.lock:
+            queries, self.queries = self.queries, []
+        return queries
+
+    class Java:
+        implements = ["org.apache.spark.sql.util.QueryExecutionListener"]
+
+
+class Instrumentation:
+    """
+    Registro dos eventos de uma execução de job.
+
+    Args:
+        job: Nome do job (download, bronze, silver, gold)
+        spark: Sessão cujas consultas são medidas. O listener depende do py4j e não está
+            disponível no Spark Connect; nesse caso, apenas as durações são registradas
+        run_id: Id da execução; por padrão, um novo id
+    """
+
+    def __init__(
+        self,
+        job: "str",
+        spark: "SparkSession | None" = None,
+        run_id: "str | None" = None,
+    ):
+        self.job = job
+        self.run_id = run_id or uuid.uuid4().hex
+        self.events: "list[dict]" = []
+        self.lock = threading.Lock()
+        self.spark = spark
+        self.listener: "QueryMetricsListener | None" = None
+        if spark is not None:
+            self.attach(spark)
+
+    def without_query_metrics(self) -> "Instrumentation":
+        """
+        Instância da mesma execução, com os mesmos eventos, que registra apenas durações.
+        Usada por etapas executadas em paralelo, cujas consultas se sobrepõem e não podem
+        ser atribuídas a uma delas.
+        """
+        other = Instrumentation(self.job, run_id=self.run_id)
+        other.events = self.events
+        other.lock = self.lock
+        return other
+
+    def attach(self, spark: "SparkSession") -> "None":
+        try:
+            from pyspark.java_gateway import ensure_callback_server_started
+
+            ensure_callback_server_started(spark.sparkContext._gateway)
+            listener = QueryMetricsListener()
+            spark._jsparkSession.listenerManager().register(listener)
+            self.listener = listener
+        except Exception as e:
+            print(f"Métricas de consultas Spark indisponíveis nesta sessão: {e}")
+
+    def close(self) -> "None":
+        if self.listener is not None:
+            self.spark._jsparkSession.listenerManager().unregister(self.listener)
+            self.listener = None
+
+    def emit(self, event: "str", name: "str", **fields) -> "dict":
+        record = {
+            "job": self.job,
+            "id_execucao": self.run_id,
+            "evento": event,
+            "nome": name,
+            "data_hora": datetime.now(timezone.utc).isoformat(),
+            **fields,
+        }
+        # O download emite eventos a partir das threads do pool
+        with self.lock:
+            self.events.append(record)
+            print(json.dumps(record, ensure_ascii=False, default=str))
+        return record
+
+    def drain_queries(self) -> "list[dict]":
+        if self.listener is None:
+            return []
+
+        # Os eventos chegam pelo listener bus, de forma assíncrona às ações; se a espera
+        # expirar, as consultas atrasadas são atribuídas à etapa seguinte
+        try:
+            self.spark.sparkContext._jsc.sc().listenerBus().waitUntilEmpty(
+                LISTENER_FLUSH_TIMEOUT_MS
+            )
+        except Exception as e:
+            print(f"Eventos de consultas Spark ainda pendentes: {e}")
+        return self.listener.drain()
+
+    @contextmanager
+    def stage(self, name: "str", **fields) -> "Iterator[dict]":
+        """
+        Cronometra uma etapa. O dicionário retornado recebe atributos da etapa
+        (ex.: quantidade de arquivos) que são emitidos junto com a duração.
+        """
+        started = time.perf_counter()
+        status = "sucesso"
+        try:
+            yield fields
+        except BaseException:
+            status = "falha"
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            totals: "dict[str, int]" = {}
+            queries = self.drain_queries()
+            for query in queries:
+                self.emit("consulta", name, **query)
+                for alias in QUERY_METRICS.values():
+                    if alias in query:
+                        totals[alias] = totals.get(alias, 0) + query[alias]
+
+            self.emit(
+                "etapa",
+                name,
+                status=status,
+                segundos=round(elapsed, 3),
+                **fields,
+                **({"consultas": len(queries), **totals} if self.listener else {}),
+            )
+
+    def save(self, spark: "SparkSession", table: "str" = RUN_METRICS_TABLE) -> "None":
+        # Campos comuns viram colunas; os demais ficam em `detalhes` (JSON)
+        common = {"job", "id_execucao", "evento", "nome", "data_hora", "segundos"}
+        rows = [
+            (
+                event["id_execucao"],
+                event["evento"],
+                event["nome"],
+                event.get("segundos"),
+                json.dumps(
+                    {k: v for k, v in event.items() if k not in common},
+                    ensure_ascii=False,
+                    default=str,
+                ),
+                datetime.fromisoformat(event["data_hora"]),
+                event["job"],
+            )
+            for event in self.events
+        ]
+        df = spark.createDataFrame(
+            rows,
+            "id_execucao string, evento string, nome string, segundos double, "
+            "detalhes string, data_hora_evento timestamp, job string",
+        )
+        df.write.insertInto(table)
+
+
+def add_instrumentation_argument(parser) -> "None":
+    parser.add_argument(
+        "--run-metrics",
+        action="store_true",
+        help=f"Grava os eventos de instrumentação da execução em {RUN_METRICS_TABLE}",
+    )
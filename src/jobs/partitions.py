@@ -0,0 +1,64 @@
+"""
+Partições mensais das tabelas das camadas.
+
+Todas as tabelas da bronze, da silver e da gold são particionadas por `ano_mes_referencia`
+(YYYY-MM). Os jobs compartilham a lista de meses de um intervalo, a listagem dos meses de
+uma tabela pelo catálogo e a troca do modo de sobrescrita de partições da sessão, usada
+pelas escritas com `insertInto`.
+"""
+
+from contextlib import contextmanager
+from datetime import datetime
+from typing import TYPE_CHECKING, Iterator
+
+if TYPE_CHECKING:
+    from pyspark.sql import SparkSession
+
+OVERWRITE_MODE_CONF = "spark.sql.sources.partitionOverwriteMode"
+
+
+def generate_months_range(start_month: "str", end_month: "str | None") -> "list[str]":
+    # Lista de meses YYYY-MM entre start_month e end_month (inclusive)
+    start = datetime.strptime(start_month, "%Y-%m")
+    end = datetime.strptime(end_month or start_month, "%Y-%m")
+    if start > end:
+        raise ValueError("Data de início deve ser anterior à data de fim")
+
+    months = []
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+    return months
+
+
+def list_partition_months(spark: "SparkSession", table: "str") -> "list[str]":
+    # Meses com partição na tabela, lidos do catálogo (SHOW PARTITIONS) sem ler os dados. O
+    # Hive devolve "ano_mes_referencia=YYYY-MM" e o Delta, o valor da coluna
+    months = []
+    for row in spark.sql(f"SHOW PARTITIONS {table}").collect():
+        months.append(row[0].split("=", 1)[-1])
+    return sorted(months)
+
+
+def overwrite_mode_for(months: "list[str] | None") -> "str":
+    # Meses informados: sobrescreve só as partições escritas; None reescreve a tabela inteira
+    return "dynamic" if months is not None else "static"
+
+
+@contextmanager
+def partition_overwrite_mode(spark: "SparkSession", mode: "str") -> "Iterator[None]":
+    # O insertInto não repassa opções do writer, por isso o modo vai na sessão. Se a sessão
+    # já está no modo pedido, nada é alterado: ingestões simultâneas na mesma sessão não
+    # restauram o modo enquanto outra tabela ainda escreve
+    previous_mode = spark.conf.get(OVERWRITE_MODE_CONF)
+    if previous_mode.lower() == mode:
+        yield
+        return
+
+    spark.conf.set(OVERWRITE_MODE_CONF, mode)
+    try:
+        yield
+    finally:
+        spark.conf.set(OVERWRITE_MODE_CONF, previous_mode)
@@ -0,0 +1,126 @@
+"""
+Tabelas de amostra para desenvolvimento e exploração.
+
+Cada tabela da bronze e da silver pode ter uma amostra `<tabela>_amostra`, com o mesmo
+schema e particionamento, escrita pelos jobs com --sample-fraction. A escolha dos registros
+é estratificada por mês de referência e tipo de serviço (nas tabelas da bronze, que têm um
+serviço cada, só pelo mês). A contagem de cada estrato define a sua fração: a fração pedida,
+elevada para que estratos pequenos tenham ao menos `SAMPLE_MIN_ROWS` registros (ou todos,
+se tiverem menos). Cada registro entra na amostra quando o hash das suas colunas, com uma
+semente, fica abaixo da fração do seu estrato, e a distribuição de cada estrato mantém a
+forma da tabela completa. Reprocessar um mês com os mesmos dados e a mesma semente
+reproduz a mesma amostra.
+"""
+
+import argparse
+from typing import TYPE_CHECKING
+
+import pyspark.sql.functions as F
+
+from partitions import overwrite_mode_for, partition_overwrite_mode
+
+if TYPE_CHECKING:
+    from pyspark.sql import DataFrame, SparkSession
+
+SAMPLE_SUFFIX = "_amostra"
+SAMPLE_SEED = 42
+# Resolução da fração: o hash de cada registro é reduzido a um valor em [0, SAMPLE_BUCKETS)
+SAMPLE_BUCKETS = 1_000_000
+# Estratos da amostra; as colunas ausentes da tabela são ignoradas
+SAMPLE_STRATA = ["ano_mes_referencia", "tipo_servico"]
+# Registros mínimos esperados por estrato, para que meses e serviços pequenos não sumam
+SAMPLE_MIN_ROWS = 1000
+
+
+def sample_table_name(table: "str") -> "str":
+    return f"{table}{SAMPLE_SUFFIX}"
+
+
+def parse_fraction(value: "str") -> "float":
+    fraction = float(value)
+    if not 0 < fraction < 1:
+        raise argparse.ArgumentTypeError("a fração deve estar entre 0 e 1 (exclusive)")
+    return fraction
+
+
+def add_sample_arguments(parser) -> "None":
+    parser.add_argument(
+        "--sample-fraction",
+        type=parse_fraction,
+        help="Também escreve os meses processados na tabela de amostra <tabela>"
+        f"{SAMPLE_SUFFIX}, com esta fração dos registros de cada mês e serviço (ex: 0.01) e "
+        f"ao menos {SAMPLE_MIN_ROWS} registros por estrato",
+    )
+    parser.add_argument(
+        "--sample-seed",
+        type=int,
+        default=SAMPLE_SEED,
+        help=f"Semente do hash que escolhe os registros da amostra (padrão: {SAMPLE_SEED})",
+    )
+
+
+def sample(
+    df: "DataFrame",
+    fraction: "float",
+    seed: "int",
+    columns: "list[str]",
+    min_rows: "int" = SAMPLE_MIN_ROWS,
+) -> "DataFrame":
+    # Mantém os registros cujo hash de `columns` cai na fração do seu estrato; colunas que
+    # mudam a cada carga (data/hora de ingestão) não devem entrar no hash
+    strata = [column for column in SAMPLE_STRATA if column in df.columns]
+    # Uma linha por estrato: a tabela de limites vai inteira para cada tarefa do join
+    stratum_fraction = F.least(
+        F.lit(1.0), F.greatest(F.lit(fraction), F.lit(min_rows) / F.count("*"))
+    )
+    limits = df.groupBy(*strata).agg(
+        (stratum_fraction * SAMPLE_BUCKETS).alias("limite_amostra")
+    )
+    bucket = F.pmod(
+        F.xxhash64(F.lit(seed), *[F.col(f"`{column}`") for column in columns]),
+        F.lit(SAMPLE_BUCKETS),
+    )
+    return (
+        df.join(F.broadcast(limits), strata)
+        .filter(bucket < F.col("limite_amostra"))
+        # O join traz os estratos para o início; insertInto escreve pela posição
+        .select(*[F.col(f"`{column}`") for column in df.columns])
+    )
+
+
+def ensure_sample_table(spark: "SparkSession", table: "str") -> "str":
+    # A amostra é criada na primeira escrita com o schema, o formato e as partições da tabela
+    name = sample_table_name(table)
+    spark.sql(f"CREATE TABLE IF NOT EXISTS {name} LIKE {table}")
+    return name
+
+
+def write_sample(
+    spark: "SparkSession",
+    table: "str",
+    fraction: "float",
+    seed: "int",
+    columns: "list[str]",
+    months: "list[str] | None",
+    min_rows: "int" = SAMPLE_MIN_ROWS,
+) -> "None":
+    """
+    Reescreve na amostra os meses de `table` a partir da tabela completa.
+
+    Args:
+        spark: Sessão Spark
+        table: Tabela completa, já escrita
+        fraction: Fração dos registros mantida na amostra
+        seed: Semente do hash
+        columns: Colunas do hash que escolhe os registros
+        months: Meses a reescrever; None reescreve a amostra inteira
+        min_rows: Registros mínimos esperados por estrato
+    """
+    target = ensure_sample_table(spark, table)
+    df = spark.read.table(table)
+    if months is not None:
+        df = df.filter(F.col("ano_mes_referencia").isin(months))
+
+    with partition_overwrite_mode(spark, overwrite_mode_for(months)):
+        sample(df, fraction, seed, columns, min_rows).write.insertInto(target, overwrite=True)
+    print(f"Amostra {target}: meses {months or 'todos'}, fração {fraction}")
@@ -1,111 +1,783 @@
+import argparse
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from functools import reduce
+import json
 import sys
-from pyspark.sql import SparkSession, functions as F, DataFrame
+from typing import Iterator
+from pyspark.sql import SparkSession, functions as F, DataFrame, Observation
+
+from backends import add_backend_argument, get_backend
+from instrumentation import Instrumentation, add_instrumentation_argument
+from partitions import (
+    generate_months_range,
+    list_partition_months,
+    overwrite_mode_for,
+    partition_overwrite_mode,
+)
+from sampling import (
+    SAMPLE_SEED,
+    add_sample_arguments,
+    ensure_sample_table,
+    sample_table_name,
+    write_sample,
+)
+from sketches import SKETCH_TABLE, build_sketches
+
+SILVER_TABLE = "silver_db.tb_corrida_taxi_ny"
+CONTROL_TABLE = "silver_db.tb_controle_processamento"
+PAYMENT_TYPE_TABLE = "silver_db.tb_dominio_tipo_pagamento"
+QUALITY_METRICS_TABLE = "silver_db.tb_metricas_qualidade"
+# Tabela de validação da carga: <tabela silver>_validacao
+VALIDATION_SUFFIX = "_validacao"
+
+# Atributos naturais da corrida usados para derivar o id determinístico
+TRIP_KEY_COLUMNS = [
+    "tipo_servico",
+    "id_fornecedor",
+    "data_hora_embarque",
+    "data_hora_desembarque",
+    "quantidade_passageiros",
+    "valor_corrida",
+    "id_tipo_pagamento",
+    "ano_mes_referencia",
+]
+
+# Colunas da tabela silver (migração 0005), na ordem da tabela, com os tipos do Spark
+SILVER_SCHEMA = [
+    ("id", "string"),
+    ("id_fornecedor", "int"),
+    ("quantidade_passageiros", "int"),
+    ("valor_corrida", "decimal(10,2)"),
+    ("data_hora_embarque", "timestamp"),
+    ("data_hora_desembarque", "timestamp"),
+    ("indicador_cancelamento", "boolean"),
+    ("indicador_viagem_sem_cobranca", "boolean"),
+    ("id_tipo_pagamento", "int"),
+    ("tipo_servico", "string"),
+    ("data_hora_criacao_registro", "timestamp"),
+    ("ano_mes_referencia", "string"),
+]
+
+# Colunas de clustering da silver: filtros e agrupamentos mais frequentes das análises
+CLUSTERING_COLUMNS = ["tipo_servico", "data_hora_embarque"]
+
+
+@dataclass(frozen=True)
+class SourceMapping:
+    """Mapeamento declarativo de uma tabela bronze para as colunas da silver."""
+
+    table: "str"
+    service: "str"
+    # Coluna da silver -> expressão SQL sobre as colunas da tabela bronze
+    columns: "dict[str, str]"
+    # Condições SQL aplicadas antes da projeção
+    filters: "list[str]" = field(default_factory=list)
+
+
+# Colunas da silver produzidas por cada mapeamento, além de tipo_servico e ano_mes_referencia
+MAPPED_COLUMNS = [
+    "id_fornecedor",
+    "quantidade_passageiros",
+    "valor_corrida",
+    "data_hora_embarque",
+    "data_hora_desembarque",
+    "id_tipo_pagamento",
+]
+
+SOURCE_MAPPINGS = [
+    SourceMapping(
+        table="bronze_db.nyc_taxi_data_yellow",
+        service="YELLOW",
+        columns={
+            "id_fornecedor": "vendorid",
+            "quantidade_passageiros": "passenger_count",
+            "valor_corrida": "total_amount",
+            "data_hora_embarque": "tpep_pickup_datetime",
+            "data_hora_desembarque": "tpep_dropoff_datetime",
+            "id_tipo_pagamento": "payment_type",
+        },
+    ),
+    SourceMapping(
+        table="bronze_db.nyc_taxi_data_green",
+        service="GREEN",
+        columns={
+            "id_fornecedor": "vendorid",
+            "quantidade_passageiros": "passenger_count",
+            "valor_corrida": "total_amount",
+            "data_hora_embarque": "lpep_pickup_datetime",
+            "data_hora_desembarque": "lpep_dropoff_datetime",
+            "id_tipo_pagamento": "payment_type",
+        },
+    ),
+    # FHV não publica fornecedor, passageiros, valores nem forma de pagamento
+    SourceMapping(
+        table="bronze_db.nyc_taxi_data_forhire",
+        service="FORHIRE",
+        columns={
+            "id_fornecedor": "CAST(NULL AS INT)",
+            "quantidade_passageiros": "CAST(NULL AS INT)",
+            "valor_corrida": "CAST(NULL AS DOUBLE)",
+            "data_hora_embarque": "pickup_datetime",
+            "data_hora_desembarque": "dropoff_datetime",
+            "id_tipo_pagamento": "CAST(NULL AS INT)",
+        },
+        filters=["pickup_datetime IS NOT NULL"],
+    ),
+    # HVFHS: valor da corrida equivalente ao total_amount (tarifa, taxas e gorjeta)
+    SourceMapping(
+        table="bronze_db.nyc_taxi_data_highvolumeforhire",
+        service="HIGHVOLUMEFORHIRE",
+        columns={
+            "id_fornecedor": "CAST(NULL AS INT)",
+            "quantidade_passageiros": "CAST(NULL AS INT)",
+            "valor_corrida": "base_passenger_fare + tolls + bcf + sales_tax"
+            " + COALESCE(congestion_surcharge, 0) + COALESCE(airport_fee, 0) + tips",
+            "data_hora_embarque": "pickup_datetime",
+            "data_hora_desembarque": "dropoff_datetime",
+            "id_tipo_pagamento": "CAST(NULL AS INT)",
+        },
+        filters=["pickup_datetime IS NOT NULL"],
+    ),
+]
+
+
+@dataclass(frozen=True)
+class QualityMetric:
+    """Métrica de qualidade contada por mês na passada que escreve a carga da silver."""
+
+    name: "str"
+    # Condição SQL sobre as colunas da silver que caracteriza o registro com problema
+    condition: "str"
+    # Fração máxima de registros do mês com o problema; None apenas registra a métrica
+    max_ratio: "float | None" = None
+
+
+QUALITY_METRICS = [
+    *[QualityMetric(f"{column}_nulo", f"{column} IS NULL") for column in MAPPED_COLUMNS],
+    QualityMetric("valor_corrida_negativo", "valor_corrida < 0", max_ratio=0.05),
+    *[
+        QualityMetric(
+            f"valor_corrida_negativo_tipo_pagamento_{code}",
+            f"valor_corrida < 0 AND id_tipo_pagamento = {code}",
+        )
+        for code in range(7)
+    ],
+    QualityMetric(
+        "quantidade_passageiros_fora_da_faixa",
+        "quantidade_passageiros NOT BETWEEN 1 AND 9",
+        max_ratio=0.1,
+    ),
+    QualityMetric(
+        "desembarque_antes_do_embarque",
+        "data_hora_desembarque < data_hora_embarque",
+        max_ratio=0.01,
+    ),
+]
+
+
+@dataclass
+class Arguments:
+    """Classe para armazenar os argumentos do script."""
+
+    start_month: "str | None" = None
+    end_month: "str | None" = None
+    mode: "str" = "overwrite"
+    optimize: "bool" = True
+    backend: "str" = "databricks"
+    run_metrics: "bool" = False
+    sample_fraction: "float | None" = None
+    sample_seed: "int" = SAMPLE_SEED
+    use_samples: "bool" = False
+    sketches: "bool" = True
+
+    @classmethod
+    def parse_arguments(cls) -> "Arguments":
+        """Parse argumentos da linha de comando."""
+        parser = argparse.ArgumentParser(
+            description="ETL das tabelas bronze para silver_db.tb_corrida_taxi_ny"
+        )
+        parser.add_argument(
+            "start_month",
+            nargs="?",
+            help="Ano-mês de início (YYYY-MM). Se não informado, reprocessa todos os meses",
+        )
+        parser.add_argument(
+            "end_month",
+            nargs="?",
+            help="Ano-mês de fim (YYYY-MM). Se não informado, usa apenas start_month",
+        )
+        parser.add_argument(
+            "--mode",
+            choices=["overwrite", "incremental"],
+            default="overwrite",
+            help="'overwrite' reescreve os meses (ou a tabela inteira); 'incremental' processa somente "
+            "as cargas da bronze ainda não processadas e aplica um MERGE (padrão: overwrite)",
+        )
+        parser.add_argument(
+            "--no-optimize",
+            dest="optimize",
+            action="store_false",
+            help="Não executa o OPTIMIZE ZORDER BY nos meses escritos após a carga",
+        )
+        parser.add_argument(
+            "--no-sketches",
+            dest="sketches",
+            action="store_false",
+            help=f"Não recalcula os sketches de quantis e contagens distintas ({SKETCH_TABLE}) "
+            "dos meses escritos",
+        )
+        add_sample_arguments(parser)
+        parser.add_argument(
+            "--use-samples",
+            action="store_true",
+            help="Lê as amostras das tabelas bronze (<tabela>_amostra) e escreve somente na "
+            "amostra da silver, sem registrar cargas nem métricas de qualidade. Para "
+            "desenvolvimento",
+        )
+        add_backend_argument(parser)
+        add_instrumentation_argument(parser)
+
+        args = parser.parse_args()
+
+        if args.use_samples and args.mode == "incremental":
+            parser.error("--use-samples não usa a tabela de controle do modo incremental")
+        if args.use_samples and args.sample_fraction is not None:
+            parser.error("--use-samples já escreve na amostra; não use --sample-fraction")
+
+        return cls(
+            start_month=args.start_month,
+            end_month=args.end_month,
+            mode=args.mode,
+            optimize=args.optimize,
+            backend=args.backend,
+            run_metrics=args.run_metrics,
+            sample_fraction=args.sample_fraction,
+            sample_seed=args.sample_seed,
+            use_samples=args.use_samples,
+            sketches=args.sketches,
+        )
+
+    def get_months(self) -> "list[str] | None":
+        if not self.start_month:
+            return None
+        return generate_months_range(self.start_month, self.end_month)
 
 
 class Pipeline:
     def __init__(
         self,
         spark: "SparkSession",
+        months: "list[str] | None" = None,
+        mode: "str" = "overwrite",
+        optimize: "bool" = True,
+        instrumentation: "Instrumentation | None" = None,
+        sample_fraction: "float | None" = None,
+        sample_seed: "int" = SAMPLE_SEED,
+        use_samples: "bool" = False,
+        sketches: "bool" = True,
     ):
         self.spark = spark
+        # Meses a reprocessar; None reprocessa a tabela inteira
+        self.months = months
+        self.mode = mode
+        # Executa a manutenção de layout (OPTIMIZE ZORDER BY) após a carga
+        self.optimize = optimize
+        # Meses a ler de cada tabela bronze (no modo incremental, só os com cargas novas)
+        self.source_months: "dict[str, list[str] | None]" = {}
+        self.instrumentation = instrumentation or Instrumentation("silver")
+        # Com fração, os meses escritos também são amostrados em <tabela>_amostra
+        self.sample_fraction = sample_fraction
+        self.sample_seed = sample_seed
+        # Com amostras, lê as amostras da bronze e escreve somente na amostra da silver
+        self.use_samples = use_samples
+        self.silver_table = sample_table_name(SILVER_TABLE) if use_samples else SILVER_TABLE
+        # Recalcula os sketches dos meses escritos após a carga
+        self.sketches = sketches
+        # Cargas (mês, data_hora_ingestao) observadas na leitura de cada tabela bronze
+        self.load_observations: "dict[str, Observation]" = {}
 
-    def compute_yellow(self) -> "DataFrame":
-        df = self.spark.read.table("bronze_db.nyc_taxi_data_yellow")
-        df = df.selectExpr(
-            "vendorid as id_fornecedor",
-            "passenger_count as quantidade_passageiros",
-            "total_amount as valor_corrida",
-            "tpep_pickup_datetime as data_hora_embarque",
-            "tpep_dropoff_datetime as data_hora_desembarque",
-            "payment_type as id_tipo_pagamento",
-            "ano_mes_referencia",
-            '"YELLOW" as tipo_servico',
-        )
+    def bronze_table(self, table: "str") -> "str":
+        return sample_table_name(table) if self.use_samples else table
+
+    def read_bronze(self, table: "str") -> "DataFrame":
+        df = self.spark.read.table(self.bronze_table(table))
+        months = self.source_months.get(table, self.months)
+
+        # Filtro na coluna de partição: lê somente os meses reprocessados
+        if months is not None:
+            df = df.filter(F.col("ano_mes_referencia").isin(months))
 
         return df
 
-    def compute_green(self) -> "DataFrame":
-        df = self.spark.read.table("bronze_db.nyc_taxi_data_green")
-        df = df.selectExpr(
-            "vendorid as id_fornecedor",
-            "passenger_count as quantidade_passageiros",
-            "total_amount as valor_corrida",
-            "lpep_pickup_datetime as data_hora_embarque",
-            "lpep_dropoff_datetime as data_hora_desembarque",
-            "payment_type as id_tipo_pagamento",
-            "ano_mes_referencia",
-            '"GREEN" as tipo_servico',
+    def list_bronze_loads(self, table: "str") -> "DataFrame":
+        # Cargas (mês, data_hora_ingestao) presentes na bronze
+        return (
+            self.read_bronze(table)
+            .select("ano_mes_referencia", "data_hora_ingestao")
+            .distinct()
         )
 
-        return df
+    def list_bronze_months(self, table: "str") -> "list[str]":
+        # Meses da bronze a processar, pelas partições da tabela, sem ler os dados
+        months = list_partition_months(self.spark, self.bronze_table(table))
+        return [month for month in months if self.months is None or month in self.months]
 
-    def compute_unified(
-        self, yellow_df: "DataFrame", green_df: "DataFrame"
-    ) -> "DataFrame":
-        df = yellow_df.union(green_df)
+    def observe_loads(self, table: "str", df: "DataFrame") -> "DataFrame":
+        # As cargas lidas são coletadas pela mesma ação que consome a leitura da tabela. O
+        # Observation do pyspark só converte valores simples: o conjunto vai como JSON, com
+        # a data/hora da ingestão em microssegundos desde a época
+        observation = Observation(f"cargas_{table.replace('.', '_')}")
+        self.load_observations[table] = observation
+        loads = F.collect_set(
+            F.struct(
+                "ano_mes_referencia",
+                F.unix_micros("data_hora_ingestao").alias("data_hora_ingestao"),
+            )
+        )
+        return df.observe(observation, F.to_json(loads).alias("cargas"))
 
-        df = df.withColumn(
-            "nome_fornecedor",
-            F.when(F.col("id_fornecedor") == 1, "Creative Mobile Technologies, LLC")
-            .when(F.col("id_fornecedor") == 2, "Curb Mobility, LLC")
-            .when(F.col("id_fornecedor") == 6, "Myle Technologies Inc")
-            .when(F.col("id_fornecedor") == 7, "Helix")
-            .otherwise("FORNECEDOR NÃO IDENTIFICADO"),
+    def observed_loads(self, table: "str") -> "list[tuple[str, object]]":
+        # Disponível depois da ação que leu a tabela; bloqueia até ela terminar
+        loads = []
+        for load in json.loads(self.load_observations[table].get["cargas"]):
+            micros = load.get("data_hora_ingestao")
+            ingested_at = (
+                None
+                if micros is None
+                else datetime.fromtimestamp(micros // 10**6)
+                + timedelta(microseconds=micros % 10**6)
+            )
+            loads.append((load["ano_mes_referencia"], ingested_at))
+        return sorted(loads, key=lambda load: (load[0], load[1] or datetime.min))
+
+    def find_pending_loads(self, table: "str") -> "list[tuple[str, object]]":
+        # Cargas da bronze que ainda não constam na tabela de controle
+        processed = (
+            self.spark.read.table(CONTROL_TABLE)
+            .filter(F.col("tabela_origem") == table)
+            .select("ano_mes_referencia", "data_hora_ingestao")
+        )
+        pending = self.list_bronze_loads(table).join(
+            processed, ["ano_mes_referencia", "data_hora_ingestao"], "left_anti"
+        )
+        return [
+            (row.ano_mes_referencia, row.data_hora_ingestao) for row in pending.collect()
+        ]
+
+    def register_loads(self, loads: "dict[str, list[tuple[str, object]]]") -> "None":
+        rows = [
+            (table, month, ingested_at)
+            for table, table_loads in loads.items()
+            for month, ingested_at in table_loads
+        ]
+        if not rows:
+            return
+
+        df = self.spark.createDataFrame(
+            rows, "tabela_origem string, ano_mes_referencia string, data_hora_ingestao timestamp"
         )
+        df = df.withColumn("data_hora_processamento", F.current_timestamp())
+        df.write.insertInto(CONTROL_TABLE)
 
+    def compute_trip_key(self, df: "DataFrame") -> "DataFrame":
+        # Hash dos atributos naturais da corrida; nulos têm marcador próprio para não
+        # colidirem com strings vazias
+        natural_key = F.concat_ws(
+            "|",
+            *[
+                F.coalesce(F.col(column).cast("string"), F.lit("\\N"))
+                for column in TRIP_KEY_COLUMNS
+            ],
+        )
+
+        # Corridas idênticas são reunidas em uma linha com a quantidade de repetições e
+        # recebem os sequenciais 1..n: os ids são únicos sem depender da ordem de leitura.
+        # A chave cobre todos os atributos da corrida (as demais colunas são derivadas
+        # deles), e corridas sem repetição recebem apenas o sequencial 1
+        df = df.groupBy(*df.columns).agg(F.count(F.lit(1)).alias("repeticoes"))
+        df = df.withColumn("chave_natural", natural_key).withColumn(
+            "sequencial", F.explode(F.sequence(F.lit(1), F.col("repeticoes")))
+        )
         df = df.withColumn(
-            "descricao_tipo_pagamento",
-            F.when(F.col("id_tipo_pagamento") == 0, "Viagem com tarifa flexível")
-            .when(F.col("id_tipo_pagamento") == 1, "Cartão de crédito")
-            .when(F.col("id_tipo_pagamento") == 2, "Dinheiro")
-            .when(F.col("id_tipo_pagamento") == 3, "Sem cobrança")
-            .when(F.col("id_tipo_pagamento") == 4, "Contestação")
-            .when(F.col("id_tipo_pagamento") == 5, "Desconhecido")
-            .when(F.col("id_tipo_pagamento") == 6, "Viagem cancelada")
-            .otherwise("TIPO DE PAGAMENTO NÃO IDENTIFICADO"),
+            "id",
+            F.sha2(F.concat_ws("|", F.col("chave_natural"), F.col("sequencial")), 256),
         )
+        return df.drop("chave_natural", "sequencial", "repeticoes")
+
+    def read_source(self, mapping: "SourceMapping") -> "DataFrame":
+        # Uma leitura por tabela bronze: filtro de meses na partição e projeção
+        # somente das colunas usadas pelo mapeamento
+        df = self.observe_loads(mapping.table, self.read_bronze(mapping.table))
+        for condition in mapping.filters:
+            df = df.filter(F.expr(condition))
 
+        return df.select(
+            *[F.expr(mapping.columns[column]).alias(column) for column in MAPPED_COLUMNS],
+            "ano_mes_referencia",
+            F.lit(mapping.service).alias("tipo_servico"),
+        )
+
+    def compute_unified(self, source_dfs: "list[DataFrame]") -> "DataFrame":
+        df = reduce(DataFrame.unionByName, source_dfs)
+
+        # Tipos da tabela silver aplicados antes do id, que é derivado desses valores
+        df = (
+            df.withColumn("id_fornecedor", F.col("id_fornecedor").cast("int"))
+            .withColumn("quantidade_passageiros", F.col("quantidade_passageiros").cast("int"))
+            .withColumn("valor_corrida", F.col("valor_corrida").cast("decimal(10,2)"))
+            .withColumn("id_tipo_pagamento", F.col("id_tipo_pagamento").cast("int"))
+        )
+
+        # Indicadores derivados do domínio de tipos de pagamento (tabela pequena,
+        # enviada por broadcast); códigos fora do domínio resultam em False
+        payment_types = self.spark.read.table(PAYMENT_TYPE_TABLE).select(
+            "id_tipo_pagamento",
+            F.col("indicador_cancelamento").alias("dominio_indicador_cancelamento"),
+            F.col("indicador_viagem_sem_cobranca").alias(
+                "dominio_indicador_viagem_sem_cobranca"
+            ),
+        )
+        df = df.join(F.broadcast(payment_types), "id_tipo_pagamento", "left")
         df = df.withColumn(
             "indicador_cancelamento",
-            F.when(F.col("id_tipo_pagamento") == 6, "S").otherwise("N"),
+            F.coalesce(F.col("dominio_indicador_cancelamento"), F.lit(False)),
         )
         df = df.withColumn(
             "indicador_viagem_sem_cobranca",
-            F.when(F.col("id_tipo_pagamento") == 3, "S").otherwise("N"),
+            F.coalesce(F.col("dominio_indicador_viagem_sem_cobranca"), F.lit(False)),
         )
-        df = df.withColumn("id", F.expr("uuid()"))
+        return df.drop("dominio_indicador_cancelamento", "dominio_indicador_viagem_sem_cobranca")
+
+    def with_trip_ids(self, df: "DataFrame") -> "DataFrame":
+        # Registros da silver, com o id de cada corrida, a partir dos dados unificados
+        df = self.compute_trip_key(df)
         df = df.withColumn("data_hora_criacao_registro", F.current_timestamp())
+        return df.select(*[column for column, _ in SILVER_SCHEMA])
 
-        df = df.select(
-            "id",
-            "id_fornecedor",
-            "nome_fornecedor",
-            "quantidade_passageiros",
-            "valor_corrida",
-            "data_hora_embarque",
-            "data_hora_desembarque",
-            "indicador_cancelamento",
-            "indicador_viagem_sem_cobranca",
-            "id_tipo_pagamento",
-            "descricao_tipo_pagamento",
-            "tipo_servico",
-            "data_hora_criacao_registro",
+    def check_schema(self, table: "str") -> "None":
+        # Tabelas criadas por versões anteriores da migração 0005 (descrições e indicadores
+        # S/N) não são alteradas pelo CREATE TABLE IF NOT EXISTS: falha antes de escrever
+        actual = [
+            (field.name, field.dataType.simpleString())
+            for field in self.spark.read.table(table).schema
+        ]
+        if actual == SILVER_SCHEMA:
+            return
+
+        expected = ", ".join(f"{name} {type_}" for name, type_ in SILVER_SCHEMA)
+        found = ", ".join(f"{name} {type_}" for name, type_ in actual)
+        raise ValueError(
+            f"Schema de {table} diferente do esperado pelo ETL; recrie a tabela com a "
+            f"migração 0005 e reprocesse os meses. Esperado: {expected}. Encontrado: {found}"
+        )
+
+    def cluster(self, df: "DataFrame") -> "DataFrame":
+        # Faixas contíguas de (mês, serviço, embarque) com tamanhos equilibrados pela
+        # amostragem do repartitionByRange: um mês e serviço grande ocupa várias tarefas e
+        # arquivos, e cada arquivo cobre um intervalo estreito de embarques. As estatísticas
+        # de mínimo/máximo por arquivo permitem pular os demais
+        columns = ["ano_mes_referencia", *CLUSTERING_COLUMNS]
+        return df.repartitionByRange(*columns).sortWithinPartitions(*columns)
+
+    def optimize_layout(self, months: "list[str] | None") -> "None":
+        # Compacta os arquivos pequenos deixados pela carga e reagrupa os meses
+        # escritos pelas colunas de clustering
+        if not self.optimize or months == []:
+            return
+
+        where = ""
+        if months is not None:
+            where = f" WHERE ano_mes_referencia IN ({', '.join(repr(m) for m in months)})"
+
+        print(f"OPTIMIZE {self.silver_table}: meses {months or 'todos'}")
+        self.spark.sql(
+            f"OPTIMIZE {self.silver_table}{where} ZORDER BY ({', '.join(CLUSTERING_COLUMNS)})"
+        )
+
+    def observe_quality(
+        self, df: "DataFrame", months: "list[str]"
+    ) -> "tuple[DataFrame, Observation]":
+        # Contagens condicionais por mês calculadas pela própria ação que consome o
+        # DataFrame, sem uma leitura adicional
+        metrics = []
+        for month in months:
+            in_month = F.col("ano_mes_referencia") == month
+            metrics.append(F.count(F.when(in_month, 1)).alias(f"{month}:quantidade_registros"))
+            metrics.extend(
+                F.count(F.when(in_month & F.expr(metric.condition), 1)).alias(
+                    f"{month}:{metric.name}"
+                )
+                for metric in QUALITY_METRICS
+            )
+
+        observation = Observation("qualidade_silver")
+        return df.observe(observation, *metrics), observation
+
+    def quality_counts(
+        self, observation: "Observation", months: "list[str]"
+    ) -> "dict[str, dict[str, int]]":
+        # Valores observados por mês e métrica; bloqueia até a ação observada terminar
+        values = observation.get
+        names = ["quantidade_registros", *[metric.name for metric in QUALITY_METRICS]]
+        return {month: {name: values[f"{month}:{name}"] for name in names} for month in months}
+
+    def store_quality_metrics(
+        self, counts: "dict[str, dict[str, int]]", months: "list[str]"
+    ) -> "list[str]":
+        # Grava as métricas calculadas e retorna as que ultrapassaram o limite
+        rows, violations = [], []
+        for month in months:
+            total = counts[month]["quantidade_registros"]
+            for metric in QUALITY_METRICS:
+                value = counts[month][metric.name]
+                ratio = value / total if total else None
+                violated = (
+                    metric.max_ratio is not None
+                    and ratio is not None
+                    and ratio > metric.max_ratio
+                )
+                if violated:
+                    violations.append(
+                        f"{month} {metric.name}: {ratio:.4f} > {metric.max_ratio}"
+                    )
+                rows.append(
+                    (metric.name, value, total, ratio, metric.max_ratio, violated, month)
+                )
+
+        df = self.spark.createDataFrame(
+            rows,
+            "nome_metrica string, valor bigint, quantidade_registros bigint, percentual double, "
+            "limite_percentual double, indicador_violacao boolean, ano_mes_referencia string",
+        )
+        df.select(
+            "nome_metrica",
+            "valor",
+            "quantidade_registros",
+            "percentual",
+            "limite_percentual",
+            "indicador_violacao",
+            F.current_timestamp().alias("data_hora_processamento"),
             "ano_mes_referencia",
+        ).write.insertInto(QUALITY_METRICS_TABLE)
+
+        return violations
+
+    def check_quality(
+        self, counts: "dict[str, dict[str, int]]", months: "list[str]"
+    ) -> "None":
+        # As métricas são gravadas mesmo quando falham; as cargas ficam sem registro para
+        # serem reprocessadas
+        with self.instrumentation.stage("metricas_qualidade", meses=months):
+            violations = self.store_quality_metrics(counts, months)
+        if violations:
+            raise ValueError(
+                "Métricas de qualidade acima do limite: " + "; ".join(violations)
+            )
+
+    @contextmanager
+    def validated(self, df: "DataFrame", months: "list[str]") -> "Iterator[DataFrame]":
+        """
+        Escreve a carga na tabela de validação `<silver>_validacao` e entrega a leitura
+        dela depois que as métricas de qualidade passam.
+
+        A escrita é a única passada sobre a bronze: as métricas são observadas nela
+        (`observe_quality`) e verificadas antes de a silver ser alterada. Quando uma métrica
+        ultrapassa o limite, o job falha com a silver intacta. A tabela de validação é
+        removida ao final, com ou sem falha.
+        """
+        staging_table = f"{self.silver_table}{VALIDATION_SUFFIX}"
+        self.spark.sql(f"DROP TABLE IF EXISTS {staging_table}")
+        self.spark.sql(f"CREATE TABLE {staging_table} LIKE {self.silver_table}")
+        try:
+            observed, observation = self.observe_quality(df, months)
+            target_columns = self.spark.read.table(staging_table).columns
+            with self.instrumentation.stage("validacao", tabela=staging_table):
+                observed.select(*target_columns).write.insertInto(staging_table, overwrite=True)
+            self.check_quality(self.quality_counts(observation, months), months)
+            yield self.spark.read.table(staging_table)
+        finally:
+            self.spark.sql(f"DROP TABLE IF EXISTS {staging_table}")
+
+    def merge(self, df: "DataFrame", services: "dict[str, list[str]]") -> "None":
+        # Insere corridas novas e remove as que deixaram de existir nos meses
+        # reprocessados de cada serviço; corridas inalteradas mantêm o mesmo id
+        scope = " OR ".join(
+            f"(t.tipo_servico = '{service}' AND t.ano_mes_referencia IN ({', '.join(repr(m) for m in months)}))"
+            for service, months in services.items()
+            if months
         )
-        return df
+        all_months = sorted({month for months in services.values() for month in months})
 
-    def run(self):
-        yellow_df = self.compute_yellow()
-        green_df = self.compute_green()
-        df = self.compute_unified(yellow_df, green_df)
+        df.createOrReplaceTempView("corridas_atualizadas")
+        self.spark.sql(
+            f"""
+            MERGE INTO {self.silver_table} t
+            USING corridas_atualizadas s
+            ON t.id = s.id
+              AND t.ano_mes_referencia IN ({', '.join(repr(m) for m in all_months)})
+            WHEN NOT MATCHED THEN INSERT *
+            WHEN NOT MATCHED BY SOURCE AND ({scope}) THEN DELETE
+            """
+        )
+
+    def run_incremental(self):
+        with self.instrumentation.stage("cargas_bronze"):
+            loads = {
+                mapping.table: self.find_pending_loads(mapping.table)
+                for mapping in SOURCE_MAPPINGS
+            }
+        self.source_months = {
+            table: sorted({month for month, _ in table_loads})
+            for table, table_loads in loads.items()
+        }
+
+        if not any(self.source_months.values()):
+            print("Nenhuma carga nova na bronze; nada a processar")
+            return
+
+        for table, months in self.source_months.items():
+            print(f"{table}: meses com cargas novas {months}")
+
+        mappings = [m for m in SOURCE_MAPPINGS if self.source_months[m.table]]
+        merged_months = sorted({month for m in mappings for month in self.source_months[m.table]})
+        with self.instrumentation.stage("transformacao"):
+            df = self.with_trip_ids(
+                self.compute_unified([self.read_source(m) for m in mappings])
+            )
+        # A origem do MERGE é a carga validada: as métricas observadas em um MERGE não são
+        # entregues de forma confiável, já que o Delta executa a origem internamente
+        with self.validated(df, merged_months) as validated:
+            with self.instrumentation.stage("merge", tabela=self.silver_table):
+                # Sem cluster(): o MERGE não preserva a ordem da origem nos arquivos que
+                # escreve, e o OPTIMIZE ZORDER BY em seguida reorganiza os meses alterados
+                self.merge(
+                    validated, {m.service: self.source_months[m.table] for m in mappings}
+                )
+        self.write_sample(merged_months)
+        self.write_sketches(merged_months)
+        with self.instrumentation.stage("registro_cargas"):
+            self.register_loads(loads)
+        with self.instrumentation.stage("optimize"):
+            self.optimize_layout(merged_months)
+
+    def run_overwrite(self):
+        # Meses pelo catálogo; as cargas de cada mês são observadas na própria escrita
+        with self.instrumentation.stage("meses_bronze"):
+            months = sorted(
+                {
+                    month
+                    for mapping in SOURCE_MAPPINGS
+                    for month in self.list_bronze_months(mapping.table)
+                }
+            )
+        if not months:
+            print("Nenhuma carga na bronze para os meses informados; nada a processar")
+            return
+
+        # Só o plano é montado aqui; leitura e transformação são executadas pela escrita
+        with self.instrumentation.stage("transformacao", meses=months):
+            df = self.with_trip_ids(
+                self.compute_unified([self.read_source(m) for m in SOURCE_MAPPINGS])
+            )
 
-        df.write.insertInto("silver_db.tb_corrida_taxi_ny", overwrite=True)
+        if self.use_samples:
+            self.overwrite(self.cluster(df))
+            print(
+                f"Execução sobre amostras: {self.silver_table} escrita, sem registro de "
+                "cargas, métricas de qualidade nem OPTIMIZE"
+            )
+            return
+
+        # A carga já chega à validação distribuída em faixas; a cópia para a silver só
+        # reordena cada tarefa, sem novo shuffle
+        with self.validated(self.cluster(df), months) as validated:
+            columns = ["ano_mes_referencia", *CLUSTERING_COLUMNS]
+            self.overwrite(validated.sortWithinPartitions(*columns))
+        loads = {mapping.table: self.observed_loads(mapping.table) for mapping in SOURCE_MAPPINGS}
+        self.write_sample(self.months)
+        self.write_sketches(self.months)
+        with self.instrumentation.stage("registro_cargas"):
+            self.register_loads(loads)
+        with self.instrumentation.stage("optimize"):
+            self.optimize_layout(self.months)
+
+    def overwrite(self, df: "DataFrame") -> "None":
+        # Sobrescreve apenas as partições (ano_mes_referencia) presentes no DataFrame.
+        # O insertInto não repassa opções do writer, por isso o modo vai na sessão
+        with self.instrumentation.stage("escrita", tabela=self.silver_table):
+            with partition_overwrite_mode(self.spark, overwrite_mode_for(self.months)):
+                # Colunas pela ordem da tabela: o insertInto associa as colunas pela posição
+                target_columns = self.spark.read.table(self.silver_table).columns
+                df.select(*target_columns).write.insertInto(self.silver_table, overwrite=True)
+
+    def write_sample(self, months: "list[str] | None") -> "None":
+        # Amostra dos meses recém-escritos, estratificada por mês e serviço. O id é
+        # derivado dos atributos da corrida: recargas escolhem as mesmas corridas
+        if self.sample_fraction is None:
+            return
+
+        with self.instrumentation.stage("amostra", tabela=SILVER_TABLE):
+            write_sample(
+                self.spark,
+                SILVER_TABLE,
+                self.sample_fraction,
+                self.sample_seed,
+                ["id"],
+                months,
+            )
+
+    def write_sketches(self, months: "list[str] | None") -> "None":
+        # Sketches dos meses recém-escritos, lidos da própria silver em uma única varredura
+        if not self.sketches or months == []:
+            return
+
+        df = self.spark.read.table(SILVER_TABLE)
+        if months is not None:
+            df = df.filter(F.col("ano_mes_referencia").isin(months))
+
+        with self.instrumentation.stage("sketches", tabela=SKETCH_TABLE):
+            with partition_overwrite_mode(self.spark, overwrite_mode_for(months)):
+                build_sketches(df).write.insertInto(SKETCH_TABLE, overwrite=True)
+
+    def run(self):
+        if self.use_samples:
+            ensure_sample_table(self.spark, SILVER_TABLE)
+        self.check_schema(self.silver_table)
+        if self.mode == "incremental":
+            self.run_incremental()
+        else:
+            self.run_overwrite()
 
 
 def main():
-    spark = SparkSession.getActiveSession()
-    pipeline = Pipeline(spark)
-    pipeline.run()
+    args = Arguments.parse_arguments()
+
+    backend = get_backend(args.backend)
+    if args.mode == "incremental" and not backend.supports_delta:
+        raise ValueError(f"O modo incremental usa MERGE e requer Delta (backend {args.backend})")
+
+    spark = backend.get_spark()
+    instrumentation = Instrumentation("silver", spark)
+    # OPTIMIZE ZORDER BY também é exclusivo do Delta
+    pipeline = Pipeline(
+        spark,
+        months=args.get_months(),
+        mode=args.mode,
+        optimize=args.optimize and backend.supports_delta,
+        instrumentation=instrumentation,
+        sample_fraction=args.sample_fraction,
+        sample_seed=args.sample_seed,
+        use_samples=args.use_samples,
+        sketches=args.sketches,
+    )
+    try:
+        pipeline.run()
+    finally:
+        instrumentation.close()
+        if args.run_metrics:
+            instrumentation.save(spark)
 
 
 if __name__ == "__main__":
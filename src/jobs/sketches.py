@@ -0,0 +1,296 @@
+"""
+Sketches mescláveis das corridas da silver.
+
+Perguntas de quantis e de contagens distintas sobre vários meses (percentis do valor por
+mês, p95 da duração por hora, fornecedores distintos por serviço) exigiriam uma varredura
+completa da silver. O ETL silver grava, para cada serviço, mês e hora do embarque, sketches
+que podem ser combinados entre meses e horas:
+
+- quantis de `valor_corrida` e da duração em segundos: histogramas em baldes logarítmicos
+  (como o DDSketch). O balde de um valor positivo x é ceil(log_gamma(x)); valores
+  negativos usam o mesmo balde do módulo em um mapa separado, e zeros são apenas contados.
+  Qualquer quantil estimado fica a no máximo `RELATIVE_ACCURACY` do valor exato, e a
+  combinação de sketches é a soma das contagens de cada balde
+- contagens distintas de `id_fornecedor` e `id`: sketches HLL do Spark (`hll_sketch_agg`),
+  combinados com `hll_union_agg`
+
+Cada serviço, mês e hora ocupa alguns kilobytes, independentemente da quantidade de
+corridas. As funções `quantiles` e `distinct_counts` combinam os sketches de qualquer
+intervalo de meses.
+"""
+
+from dataclasses import dataclass, field
+import math
+from typing import TYPE_CHECKING
+
+import pyspark.sql.functions as F
+
+if TYPE_CHECKING:
+    from pyspark.sql import Column, DataFrame, Row, SparkSession
+
+SKETCH_TABLE = "silver_db.tb_sketch_corrida_hora"
+SKETCH_KEYS = ["tipo_servico", "hora_embarque", "ano_mes_referencia"]
+
+# Erro relativo máximo dos quantis estimados
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+# Precisão do HLL: 2^12 registradores, erro padrão de ~1,6% e até ~4 KB por sketch
+HLL_LG_CONFIG_K = 12
+
+# Coluna do sketch de quantis -> expressão SQL sobre as colunas da silver
+QUANTILE_SKETCHES = {
+    "sketch_valor_corrida": "CAST(valor_corrida AS DOUBLE)",
+    "sketch_duracao_segundos": "CAST(unix_timestamp(data_hora_desembarque) "
+    "- unix_timestamp(data_hora_embarque) AS DOUBLE)",
+}
+# Coluna do sketch HLL -> coluna da silver contada
+DISTINCT_SKETCHES = {
+    "sketch_fornecedores": "id_fornecedor",
+    "sketch_corridas": "id",
+}
+# Entrada de cada corrida que carrega as colunas dos sketches HLL
+DISTINCT_ENTRY = "distintos"
+
+
+def bucket_index(value: "Column") -> "Column":
+    # Balde logarítmico do módulo do valor; nulo para zero e para valores nulos
+    return F.ceil(F.log(F.abs(value)) / math.log(GAMMA)).cast("int")
+
+
+def build_sketches(df: "DataFrame") -> "DataFrame":
+    """
+    Sketches por serviço, mês e hora do embarque das corridas da silver, com as colunas de
+    `SKETCH_TABLE`.
+
+    Uma única leitura: cada corrida gera uma entrada por sketch de quantis (sinal e balde
+    do valor) e uma entrada com as colunas dos sketches HLL. A primeira agregação conta as
+    entradas por balde e monta os sketches HLL; a segunda reúne os baldes de cada serviço,
+    mês e hora em mapas.
+    """
+    entries = [
+        F.struct(
+            F.lit(column).alias("metrica"),
+            F.signum(F.expr(expression)).cast("int").alias("sinal"),
+            bucket_index(F.expr(expression)).alias("balde"),
+        )
+        for column, expression in QUANTILE_SKETCHES.items()
+    ]
+    entries.append(
+        F.struct(
+            F.lit(DISTINCT_ENTRY).alias("metrica"),
+            F.lit(None).cast("int").alias("sinal"),
+            F.lit(None).cast("int").alias("balde"),
+        )
+    )
+
+    is_distinct = F.col("metrica") == DISTINCT_ENTRY
+    rows = (
+        df.withColumn("hora_embarque", F.hour("data_hora_embarque"))
+        .select(
+            *SKETCH_KEYS,
+            *DISTINCT_SKETCHES.values(),
+            F.explode(F.array(*entries)).alias("entrada"),
+        )
+        .select(
+            *SKETCH_KEYS,
+            "entrada.*",
+            # As colunas contadas só são lidas na entrada dos sketches HLL
+            *[
+                F.when(is_distinct, F.col(column)).alias(column)
+                for column in DISTINCT_SKETCHES.values()
+            ],
+        )
+        .where(is_distinct | F.col("sinal").isNotNull())
+    )
+    buckets = rows.groupBy(*SKETCH_KEYS, "metrica", "sinal", "balde").agg(
+        F.count("*").alias("quantidade"),
+        *[
+            F.hll_sketch_agg(column, HLL_LG_CONFIG_K).alias(sketch)
+            for sketch, column in DISTINCT_SKETCHES.items()
+        ],
+    )
+
+    def store(metric: "str", sign: "int") -> "Column":
+        condition = (F.col("metrica") == metric) & (F.col("sinal") == sign)
+        return F.map_from_entries(
+            F.collect_list(F.when(condition, F.struct("balde", "quantidade")))
+        )
+
+    quantile_columns = [
+        F.struct(
+            store(column, 1).alias("positivos"),
+            store(column, -1).alias("negativos"),
+            F.coalesce(
+                F.sum(
+                    F.when(
+                        (F.col("metrica") == column) & (F.col("sinal") == 0),
+                        F.col("quantidade"),
+                    )
+                ),
+                F.lit(0),
+            ).alias("zeros"),
+        ).alias(column)
+        for column in QUANTILE_SKETCHES
+    ]
+    distinct_columns = [
+        F.first(F.when(is_distinct, F.col(sketch)), ignorenulls=True).alias(sketch)
+        for sketch in DISTINCT_SKETCHES
+    ]
+    sketches = buckets.groupBy(*SKETCH_KEYS).agg(
+        F.sum(F.when(is_distinct, F.col("quantidade"))).alias("quantidade_corridas"),
+        *quantile_columns,
+        *distinct_columns,
+    )
+    return sketches.select(
+        "tipo_servico",
+        "hora_embarque",
+        "quantidade_corridas",
+        *QUANTILE_SKETCHES,
+        *DISTINCT_SKETCHES,
+        F.current_timestamp().alias("data_hora_processamento"),
+        "ano_mes_referencia",
+    )
+
+
+@dataclass
+class QuantileSketch:
+    """Histograma em baldes logarítmicos de um sketch de quantis, no driver."""
+
+    positives: "dict[int, int]" = field(default_factory=dict)
+    negatives: "dict[int, int]" = field(default_factory=dict)
+    zeros: "int" = 0
+
+    @property
+    def count(self) -> "int":
+        return sum(self.positives.values()) + sum(self.negatives.values()) + self.zeros
+
+    def add(self, sign: "int", bucket: "int | None", count: "int") -> "None":
+        if sign == 0:
+            self.zeros += count
+            return
+        store = self.positives if sign > 0 else self.negatives
+        store[bucket] = store.get(bucket, 0) + count
+
+    def quantile(self, probability: "float") -> "float | None":
+        # Valor do balde que contém a posição q * (n - 1), do mais negativo ao maior
+        if not 0 <= probability <= 1:
+            raise ValueError("O quantil deve estar entre 0 e 1")
+        if self.count == 0:
+            return None
+
+        def estimate(bucket: "int") -> "float":
+            # Ponto do balde (gamma^(b-1), gamma^b] com erro relativo de no máximo alfa
+            return 2 * GAMMA**bucket / (GAMMA + 1)
+
+        ordered = [
+            (-estimate(bucket), self.negatives[bucket])
+            for bucket in sorted(self.negatives, reverse=True)
+        ]
+        ordered.append((0.0, self.zeros))
+        ordered.extend(
+            (estimate(bucket), self.positives[bucket]) for bucket in sorted(self.positives)
+        )
+
+        rank = probability * (self.count - 1)
+        cumulative = 0
+        for value, count in ordered:
+            cumulative += count
+            if cumulative > rank:
+                return value
+        return ordered[-1][0]
+
+
+def read_sketches(
+    spark: "SparkSession",
+    start_month: "str",
+    end_month: "str | None" = None,
+    services: "list[str] | None" = None,
+    hours: "list[int] | None" = None,
+    table: "str" = SKETCH_TABLE,
+) -> "DataFrame":
+    # Sketches do intervalo de meses (inclusive), opcionalmente filtrados por serviço e hora
+    df = spark.read.table(table).where(
+        F.col("ano_mes_referencia").between(start_month, end_month or start_month)
+    )
+    if services is not None:
+        df = df.where(F.col("tipo_servico").isin(services))
+    if hours is not None:
+        df = df.where(F.col("hora_embarque").isin(hours))
+    return df
+
+
+def quantiles(
+    spark: "SparkSession",
+    column: "str",
+    probabilities: "list[float]",
+    group_by: "list[str]",
+    start_month: "str",
+    end_month: "str | None" = None,
+    services: "list[str] | None" = None,
+    hours: "list[int] | None" = None,
+    table: "str" = SKETCH_TABLE,
+) -> "dict[tuple, list[float | None]]":
+    """
+    Quantis estimados combinando os sketches de cada grupo.
+
+    Args:
+        column: Sketch de quantis (`sketch_valor_corrida` ou `sketch_duracao_segundos`)
+        probabilities: Quantis entre 0 e 1 (ex: [0.5, 0.95])
+        group_by: Colunas de SKETCH_KEYS que definem os grupos; [] combina todos os sketches
+
+    Returns:
+        Valores de `group_by` de cada grupo -> quantis na ordem de `probabilities`
+    """
+    df = read_sketches(spark, start_month, end_month, services, hours, table)
+    sketch = F.col(column)
+    entries = (
+        df.select(*group_by, F.lit(1).alias("sinal"), F.explode(sketch.positivos))
+        .unionByName(
+            df.select(*group_by, F.lit(-1).alias("sinal"), F.explode(sketch.negativos))
+        )
+        .unionByName(
+            df.select(
+                *group_by,
+                F.lit(0).alias("sinal"),
+                F.lit(None).cast("int").alias("key"),
+                sketch.zeros.alias("value"),
+            )
+        )
+    )
+    # A soma das contagens de cada balde é o sketch combinado; só os baldes vão ao driver
+    merged = entries.groupBy(*group_by, "sinal", "key").agg(F.sum("value").alias("quantidade"))
+
+    sketches: "dict[tuple, QuantileSketch]" = {}
+    for row in merged.collect():
+        group = tuple(row[key] for key in group_by)
+        sketches.setdefault(group, QuantileSketch()).add(
+            row["sinal"], row["key"], row["quantidade"] or 0
+        )
+    return {
+        group: [sketch.quantile(probability) for probability in probabilities]
+        for group, sketch in sorted(sketches.items(), key=lambda item: repr(item[0]))
+    }
+
+
+def distinct_counts(
+    spark: "SparkSession",
+    column: "str",
+    group_by: "list[str]",
+    start_month: "str",
+    end_month: "str | None" = None,
+    services: "list[str] | None" = None,
+    hours: "list[int] | None" = None,
+    table: "str" = SKETCH_TABLE,
+) -> "list[Row]":
+    """
+    Contagens distintas estimadas pela união dos sketches HLL de cada grupo.
+
+    Args:
+        column: Sketch HLL (`sketch_fornecedores` ou `sketch_corridas`)
+        group_by: Colunas de SKETCH_KEYS que definem os grupos; [] une todos os sketches
+    """
+    df = read_sketches(spark, start_month, end_month, services, hours, table)
+    df = df.groupBy(*group_by).agg(
+        F.hll_sketch_estimate(F.hll_union_agg(column)).alias("quantidade_distinta")
+    )
+    return (df.orderBy(*group_by) if group_by else df).collect()
@@ -0,0 +1,272 @@
+"""
+Recodificação dos Parquets da TLC antes da publicação na landing.
+
+Os arquivos são publicados pela TLC com a compressão e os grupos de linhas escolhidos na
+origem e com colunas que nenhuma camada lê. A recodificação lê o arquivo baixado (em disco)
+lote a lote e grava um novo Parquet:
+
+- compressão zstd e grupos de linhas de tamanho fixo (`row_group_rows`)
+- ordenado pela data/hora de embarque, para que as estatísticas de cada grupo de linhas
+  cubram intervalos estreitos e os filtros por período pulem grupos inteiros
+- opcionalmente restrito a um conjunto de colunas
+
+A ordenação não carrega o arquivo inteiro em memória: os registros são distribuídos por
+dia de embarque em arquivos temporários e cada dia é ordenado separadamente. O mês de
+referência tem no máximo 31 dias; embarques fora dele (erros de digitação da origem) ficam
+em faixas anteriores e posteriores ao mês, e embarques nulos por último.
+
+Antes da publicação, o footer do arquivo gerado é relido e sua contagem de linhas e schema
+são comparados com os do arquivo de origem.
+"""
+
+from dataclasses import dataclass
+import os
+import re
+import time
+from typing import Iterator
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+TRANSCODE_COMPRESSION = "zstd"
+TRANSCODE_COMPRESSION_LEVEL = 3
+
+# Linhas por lote lido do arquivo de origem
+READ_BATCH_ROWS = 64 * 1024
+
+# Colunas de embarque das bases, em ordem de preferência (nomes em minúsculo)
+PICKUP_COLUMNS = ["tpep_pickup_datetime", "lpep_pickup_datetime", "pickup_datetime"]
+
+# Colunas das bases lidas pelo ETL silver (SOURCE_MAPPINGS em silver_layer_etl.py)
+SILVER_SOURCE_COLUMNS = [
+    "vendorid",
+    "passenger_count",
+    "total_amount",
+    "payment_type",
+    "tpep_pickup_datetime",
+    "tpep_dropoff_datetime",
+    "lpep_pickup_datetime",
+    "lpep_dropoff_datetime",
+    "pickup_datetime",
+    "dropoff_datetime",
+    "base_passenger_fare",
+    "tolls",
+    "bcf",
+    "sales_tax",
+    "congestion_surcharge",
+    "airport_fee",
+    "tips",
+]
+
+# Faixas da distribuição por dia: 1..31 são os dias do mês de referência
+BUCKET_BEFORE_MONTH = 0
+BUCKET_AFTER_MONTH = 32
+BUCKET_NULL = 33
+
+
+def parse_transcode_columns(value: "str") -> "list[str] | None":
+    """
+    Converte a opção --transcode-columns: 'all' mantém todas as colunas, 'silver' as
+    colunas lidas pelo ETL silver e uma lista separada por vírgula as colunas informadas.
+    """
+    if value == "all":
+        return None
+    if value == "silver":
+        return SILVER_SOURCE_COLUMNS
+    return [column.strip().lower() for column in value.split(",") if column.strip()]
+
+
+def extract_month(s3_key: "str") -> "str | None":
+    # Mês de referência da partição Hive da chave (ano_mes_referencia=YYYY-MM)
+    match = re.search(r"ano_mes_referencia=(\d{4}-\d{2})", s3_key)
+    return match.group(1) if match else None
+
+
+@dataclass
+class TranscodeResult:
+    """Resumo de um arquivo recodificado."""
+
+    rows: "int"
+    row_groups: "int"
+    columns: "int"
+    sort_column: "str | None"
+    source_bytes: "int"
+    output_bytes: "int"
+    seconds: "float"
+
+
+class Transcoder:
+    """
+    Recodificação de um Parquet da TLC em disco.
+
+    Args:
+        row_group_rows: Linhas por grupo de linhas do arquivo gerado
+        columns: Colunas mantidas (nomes em minúsculo); None mantém todas
+    """
+
+    def __init__(self, row_group_rows: "int", columns: "list[str] | None" = None):
+        self.row_group_rows = row_group_rows
+        self.columns = columns
+
+    @property
+    def encoding(self) -> "str":
+        """Identifica os parâmetros da recodificação, registrados no índice de disponibilidade."""
+        columns = ",".join(sorted(self.columns)) if self.columns is not None else "all"
+        return (
+            f"{TRANSCODE_COMPRESSION}-{TRANSCODE_COMPRESSION_LEVEL}"
+            f";row_group_rows={self.row_group_rows};columns={columns}"
+        )
+
+    def project(self, schema: "pa.Schema") -> "pa.Schema":
+        if self.columns is None:
+            return schema
+
+        fields = [field for field in schema if field.name.lower() in self.columns]
+        if not fields:
+            raise ValueError(f"Nenhuma das colunas {self.columns} existe no arquivo de origem")
+        return pa.schema(fields, metadata=schema.metadata)
+
+    def find_sort_column(self, schema: "pa.Schema") -> "str | None":
+        names = {field.name.lower(): field.name for field in schema}
+        for candidate in PICKUP_COLUMNS:
+            name = names.get(candidate)
+            if name is not None and pa.types.is_timestamp(schema.field(name).type):
+                return name
+        return None
+
+    def day_buckets(self, column: "pa.Array", month: "str") -> "pa.Array":
+        # Dia do embarque no mês de referência, ou a faixa anterior/posterior/nula
+        year, month_number = (int(part) for part in month.split("-"))
+        year_month = pc.add(pc.multiply(pc.year(column), 100), pc.month(column))
+        target = year * 100 + month_number
+        buckets = pc.if_else(
+            pc.less(year_month, target),
+            BUCKET_BEFORE_MONTH,
+            pc.if_else(pc.greater(year_month, target), BUCKET_AFTER_MONTH, pc.day(column)),
+        )
+        return pc.fill_null(buckets, BUCKET_NULL)
+
+    def iter_sorted(
+        self,
+        batches: "Iterator[pa.RecordBatch]",
+        schema: "pa.Schema",
+        sort_column: "str",
+        month: "str",
+        spool_dir: "str",
+    ) -> "Iterator[pa.Table]":
+        """Tabelas ordenadas pela coluna de embarque, uma por faixa de dias."""
+        writers: "dict[int, pq.ParquetWriter]" = {}
+        try:
+            for batch in batches:
+                buckets = self.day_buckets(batch.column(sort_column), month)
+                for bucket in pc.unique(buckets).to_pylist():
+                    if bucket not in writers:
+                        writers[bucket] = pq.ParquetWriter(
+                            os.path.join(spool_dir, f"dia_{bucket:02d}.parquet"),
+                            schema,
+                            compression="lz4",
+                        )
+                    writers[bucket].write_batch(batch.filter(pc.equal(buckets, bucket)))
+        finally:
+            for writer in writers.values():
+                writer.close()
+
+        for bucket in sorted(writers):
+            path = os.path.join(spool_dir, f"dia_{bucket:02d}.parquet")
+            table = pq.read_table(path, schema=schema)
+            os.remove(path)
+            yield table.sort_by([(sort_column, "ascending")])
+
+    def write(
+        self, tables: "Iterator[pa.Table]", schema: "pa.Schema", output_path: "str"
+    ) -> "int":
+        # Acumula tabelas até completar um grupo de linhas, para que os grupos tenham o
+        # tamanho configurado independentemente do tamanho dos lotes e dos dias
+        rows = 0
+        pending: "list[pa.Table]" = []
+        pending_rows = 0
+        with pq.ParquetWriter(
+            output_path,
+            schema,
+            compression=TRANSCODE_COMPRESSION,
+            compression_level=TRANSCODE_COMPRESSION_LEVEL,
+        ) as writer:
+            for table in tables:
+                pending.append(table)
+                pending_rows += table.num_rows
+                while pending_rows >= self.row_group_rows:
+                    combined = pa.concat_tables(pending)
+                    writer.write_table(
+                        combined.slice(0, self.row_group_rows), self.row_group_rows
+                    )
+                    rows += self.row_group_rows
+                    pending = [combined.slice(self.row_group_rows)]
+                    pending_rows -= self.row_group_rows
+
+            if pending_rows:
+                writer.write_table(pa.concat_tables(pending), self.row_group_rows)
+                rows += pending_rows
+
+        return rows
+
+    def validate(
+        self, output_path: "str", schema: "pa.Schema", expected_rows: "int"
+    ) -> "pq.FileMetaData":
+        # Relê apenas o footer: um arquivo truncado ou incompleto falha aqui
+        metadata = pq.read_metadata(output_path)
+        row_group_rows = sum(
+            metadata.row_group(index).num_rows for index in range(metadata.num_row_groups)
+        )
+        if metadata.num_rows != expected_rows or row_group_rows != expected_rows:
+            raise ValueError(
+                f"Arquivo recodificado com {metadata.num_rows} linhas "
+                f"({row_group_rows} nos grupos de linhas); esperado {expected_rows}"
+            )
+        if not metadata.schema.to_arrow_schema().equals(schema):
+            raise ValueError("Schema do arquivo recodificado diverge do schema de origem")
+        return metadata
+
+    def transcode(
+        self,
+        source_path: "str",
+        output_path: "str",
+        month: "str | None",
+        spool_dir: "str",
+    ) -> "TranscodeResult":
+        """
+        Recodifica `source_path` em `output_path` e valida o resultado.
+
+        Args:
+            source_path: Parquet baixado da origem
+            output_path: Parquet a ser gerado
+            month: Mês de referência (YYYY-MM) usado na distribuição por dia; sem ele,
+                o arquivo não é ordenado
+            spool_dir: Diretório dos arquivos temporários da ordenação
+        """
+        started = time.perf_counter()
+        source = pq.ParquetFile(source_path)
+        schema = self.project(source.schema_arrow)
+        batches = source.iter_batches(batch_size=READ_BATCH_ROWS, columns=schema.names)
+
+        sort_column = self.find_sort_column(schema) if month else None
+        if sort_column is not None:
+            tables = self.iter_sorted(batches, schema, sort_column, month, spool_dir)
+        else:
+            tables = (pa.Table.from_batches([batch], schema) for batch in batches)
+
+        rows = self.write(tables, schema, output_path)
+        expected_rows = source.metadata.num_rows
+        if rows != expected_rows:
+            raise ValueError(f"{rows} linhas recodificadas; a origem tem {expected_rows}")
+        metadata = self.validate(output_path, schema, expected_rows)
+
+        return TranscodeResult(
+            rows=rows,
+            row_groups=metadata.num_row_groups,
+            columns=len(schema),
+            sort_column=sort_column,
+            source_bytes=os.path.getsize(source_path),
+            output_bytes=os.path.getsize(output_path),
+            seconds=time.perf_counter() - started,
+        )
@@ -0,0 +1,36 @@
+import os
+import sys
+import tempfile
+from typing import TYPE_CHECKING
+
+from pytest import fixture
+
+# Os jobs importam `backends` como módulo irmão (são executados como scripts)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "jobs"))
+
+if TYPE_CHECKING:
+    from pyspark.sql import SparkSession
+
+
+@fixture(scope="session")
+def spark() -> "SparkSession":
+    # TEST_BACKEND=databricks executa os testes em um cluster via databricks-connect, instalado
+    # a partir de requirements-databricks.txt em um ambiente sem o pyspark; o padrão é uma
+    # sessão local, sem as tabelas das migrações, que inicia em poucos segundos
+    if os.environ.get("TEST_BACKEND") == "databricks":
+        # Import tardio: os testes que não usam Spark não dependem do pyspark instalado
+        try:
+            from databricks.connect.session import DatabricksSession
+        except ImportError as e:
+            raise RuntimeError(
+                "TEST_BACKEND=databricks requer o databricks-connect: "
+                "pip install -r src/requirements-databricks.txt em um ambiente separado"
+            ) from e
+
+        return DatabricksSession.builder.getOrCreate()
+
+    from backends import LocalBackend
+
+    warehouse_dir = tempfile.mkdtemp(prefix="tests_lakehouse_")
+    backend = LocalBackend(warehouse_dir, persistent_catalog=False, shuffle_partitions=1)
+    return backend.create_session()
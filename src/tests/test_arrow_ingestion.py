@@ -0,0 +1,124 @@
+import os
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pytest import fixture, mark, raises
+from pyspark.sql import SparkSession
+
+from jobs.backends import LocalBackend
+from jobs.bronze_layer_ingestion import Pipeline
+
+# O motor Arrow lê a landing e grava a tabela no disco local do processo
+pytestmark = mark.skipif(
+    os.environ.get("TEST_BACKEND") == "databricks",
+    reason="landing e tabela locais",
+)
+
+TABLE = "default.tb_teste_arrow"
+
+
+@fixture
+def landing(spark: SparkSession, tmp_path) -> "str":
+    spark.sql(f"DROP TABLE IF EXISTS {TABLE}")
+    spark.sql(
+        f"""
+        CREATE TABLE {TABLE} (
+          vendorid DOUBLE, pickup_datetime TIMESTAMP, store_and_fwd_flag STRING,
+          ehail_fee DOUBLE, data_hora_ingestao TIMESTAMP, ano_mes_referencia STRING
+        )
+        USING parquet
+        PARTITIONED BY (ano_mes_referencia)
+        """
+    )
+
+    # Mesma base com schemas diferentes entre os meses (INT32 -> DOUBLE, coluna extra)
+    files = {
+        "2022-12": pa.table(
+            {
+                "VendorID": pa.array([1.0, 2.0]),
+                "pickup_datetime": pa.array(
+                    [datetime(2022, 12, 1, 10), datetime(2022, 12, 31, 23, 59)],
+                    pa.timestamp("us"),
+                ),
+                "store_and_fwd_flag": ["N", None],
+            }
+        ),
+        "2023-01": pa.table(
+            {
+                "VendorID": pa.array([2, None], pa.int32()),
+                "pickup_datetime": pa.array(
+                    [datetime(2023, 1, 1, 0, 30), None], pa.timestamp("us")
+                ),
+                "store_and_fwd_flag": ["Y", "N"],
+                "coluna_nova": [1, 2],
+            }
+        ),
+    }
+    for month, table in files.items():
+        directory = tmp_path / "landing" / f"ano_mes_referencia={month}"
+        directory.mkdir(parents=True)
+        pq.write_table(table, directory / f"arquivo_{month}.parquet")
+
+    yield str(tmp_path / "landing")
+    spark.sql(f"DROP TABLE IF EXISTS {TABLE}")
+
+
+def ingest(spark: SparkSession, landing: "str", engine: "str", **kwargs) -> "list[tuple]":
+    Pipeline(spark, LocalBackend(), landing, TABLE, engine=engine, **kwargs).run()
+    rows = spark.read.table(TABLE).drop("data_hora_ingestao").collect()
+    return sorted((tuple(row) for row in rows), key=repr)
+
+
+def test_arrow_engine_matches_spark_engine(spark: SparkSession, landing: "str"):
+    expected = ingest(spark, landing, "spark")
+    assert len(expected) == 4
+
+    assert ingest(spark, landing, "arrow") == expected
+
+    # Reprocessamento parcial sobrescreve apenas o mês informado
+    assert ingest(spark, landing, "arrow", months=["2023-01"]) == expected
+
+
+def test_auto_engine_falls_back_to_spark_on_lossy_casts(
+    spark: SparkSession, landing: "str"
+):
+    # STRING -> DOUBLE: o Spark converte textos inválidos em nulo, o pyarrow falha
+    directory = os.path.join(landing, "ano_mes_referencia=2023-02")
+    os.makedirs(directory)
+    pq.write_table(
+        pa.table({"vendorid": ["1", "x"]}), os.path.join(directory, "arquivo.parquet")
+    )
+
+    with raises(ValueError, match="vendorid string -> double"):
+        ingest(spark, landing, "arrow")
+
+    rows = ingest(spark, landing, "auto")
+    assert [row[0] for row in rows if row[-1] == "2023-02"] == [1.0, None]
+
+
+
+def test_failed_arrow_write_keeps_the_table(spark: SparkSession, landing: "str", monkeypatch):
+    # O job importa o motor pelo nome do módulo em src/jobs
+    from arrow_ingestion import ArrowIngestion
+
+    expected = ingest(spark, landing, "arrow")
+    reconcile_batch = ArrowIngestion.reconcile_batch
+
+    # O segundo arquivo falha depois que o primeiro mês já foi gravado
+    def failing(self, batch, month, ingested_at):
+        if month == "2023-01":
+            raise OSError("falha de leitura")
+        return reconcile_batch(self, batch, month, ingested_at)
+
+    monkeypatch.setattr(ArrowIngestion, "reconcile_batch", failing)
+    with raises(OSError, match="falha de leitura"):
+        ingest(spark, landing, "arrow")
+
+    rows = spark.read.table(TABLE).drop("data_hora_ingestao").collect()
+    assert sorted((tuple(row) for row in rows), key=repr) == expected
+    location = {
+        row.col_name: row.data_type
+        for row in spark.sql(f"DESCRIBE TABLE EXTENDED {TABLE}").collect()
+    }["Location"].removeprefix("file:")
+    assert not [name for name in os.listdir(location) if name.startswith("_staging")]
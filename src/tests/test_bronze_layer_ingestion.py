@@ -1,22 +1,20 @@
-from pytest import fixture
-from pyspark.sql import SparkSession
-from databricks.connect.session import DatabricksSession
-from jobs.bronze_layer_ingestion import Pipeline
-
+import os
 
-@fixture(scope="session")
-def spark() -> SparkSession:
-    spark = DatabricksSession.builder.getOrCreate()
-    return spark
+from pytest import fixture, mark
+from pyspark.sql import SparkSession
+from jobs.backends import LocalBackend
+from jobs.bronze_layer_ingestion import Pipeline, SchemaReconciler, run_pipelines
+from jobs.instrumentation import Instrumentation
+from jobs.partitions import generate_months_range, partition_overwrite_mode
 
 
 @fixture
 def pipeline(spark: SparkSession) -> Pipeline:
-    dbutils = None
+    backend = None
     source_prefix = "./tmp"
     target_table = "test_db.test_table"
 
-    return Pipeline(spark, dbutils, source_prefix, target_table)
+    return Pipeline(spark, backend, source_prefix, target_table)
 
 
 def test_lowercase_columns_names(pipeline: Pipeline):
@@ -61,3 +59,255 @@ def test_equalize_schemas(pipeline: Pipeline):
     )
 
     assert result_df.schema == expected_df.schema
+
+
+def test_schema_fingerprint(pipeline: Pipeline):
+    schema = pipeline.spark.createDataFrame([], "VendorID bigint, total double").schema
+    same_schema = pipeline.spark.createDataFrame([], "total double, vendorid bigint").schema
+    drifted_schema = pipeline.spark.createDataFrame([], "vendorid double, total double").schema
+
+    assert pipeline.schema_fingerprint(schema) == pipeline.schema_fingerprint(same_schema)
+    assert pipeline.schema_fingerprint(schema) != pipeline.schema_fingerprint(drifted_schema)
+
+
+def test_extract_partition_value(pipeline: Pipeline):
+    path = "s3://bucket/nyc_taxi_data_yellow/ano_mes_referencia=2023-01/file.parquet"
+    assert pipeline.extract_partition_value(path) == "2023-01"
+
+
+def test_schema_reconciler_casts_directly_when_lossless(pipeline: Pipeline):
+    df = pipeline.spark.createDataFrame(
+        [(1, "2.5", 3.0)], "VendorID bigint, fare string, passengers double"
+    )
+    target_schema = pipeline.spark.createDataFrame(
+        [], "vendorid double, fare double, passengers bigint, extra double"
+    ).schema
+
+    reconciler = SchemaReconciler(target_schema)
+    result_df = df.select(reconciler.compile_projection(df.schema, "fp"))
+
+    assert result_df.schema == target_schema
+    # double -> bigint pode perder informação: passa por string, como antes
+    assert result_df.collect()[0].asDict() == {
+        "vendorid": 1.0,
+        "fare": 2.5,
+        "passengers": 3,
+        "extra": None,
+    }
+
+    strategies = {entry["coluna"]: entry["estrategia"] for entry in reconciler.drift_report}
+    assert strategies == {
+        "vendorid": "direto",
+        "fare": "direto",
+        "passengers": "via_string",
+        "extra": "ausente_na_origem",
+    }
+
+    # A projeção é compilada uma única vez por schema de origem
+    assert reconciler.compile_projection(df.schema, "fp") is reconciler.projections["fp"]
+
+
+def test_generate_months_range():
+    assert generate_months_range("2022-11", "2023-02") == [
+        "2022-11",
+        "2022-12",
+        "2023-01",
+        "2023-02",
+    ]
+    assert generate_months_range("2023-03", None) == ["2023-03"]
+
+
+@mark.skipif(os.environ.get("TEST_BACKEND") == "databricks", reason="landing local")
+def test_run_pipelines_isolates_table_failures(spark: SparkSession, tmp_path):
+    instrumentation = Instrumentation("bronze")
+    pipelines = []
+    for base in ["yellow", "green"]:
+        table = f"default.tb_teste_{base}"
+        spark.sql(f"DROP TABLE IF EXISTS {table}")
+        spark.sql(
+            f"CREATE TABLE {table} (vendorid BIGINT, data_hora_ingestao TIMESTAMP, "
+            "ano_mes_referencia STRING) USING parquet PARTITIONED BY (ano_mes_referencia)"
+        )
+        pipelines.append(
+            Pipeline(
+                spark,
+                LocalBackend(),
+                str(tmp_path / base),
+                table,
+                months=["2023-01"],
+                instrumentation=instrumentation.without_query_metrics(),
+            )
+        )
+
+    # Somente a landing da yellow existe: a green falha sem interromper a yellow
+    spark.createDataFrame([(1,), (2,)], "VendorID bigint").write.parquet(
+        str(tmp_path / "yellow" / "ano_mes_referencia=2023-01")
+    )
+    mode = spark.conf.get("spark.sql.sources.partitionOverwriteMode")
+
+    errors = run_pipelines(spark, pipelines, instrumentation, max_parallel_tables=2)
+
+    assert errors["default.tb_teste_yellow"] is None
+    assert isinstance(errors["default.tb_teste_green"], FileNotFoundError)
+    assert spark.read.table("default.tb_teste_yellow").count() == 2
+    assert spark.conf.get("spark.sql.sources.partitionOverwriteMode") == mode
+
+    events = {e["nome"]: e for e in instrumentation.events if e["evento"] == "tabela"}
+    assert events["default.tb_teste_yellow"]["status"] == "sucesso"
+    assert events["default.tb_teste_green"]["status"] == "falha"
+    # As etapas de cada tabela e a etapa da ingestão pertencem à mesma execução
+    assert {e["id_execucao"] for e in instrumentation.events} == {instrumentation.run_id}
+
+
+@mark.skipif(os.environ.get("TEST_BACKEND") == "databricks", reason="landing local")
+def test_stream_mode_ingests_only_new_files(spark: SparkSession, tmp_path):
+    table = "default.tb_teste_stream"
+    spark.sql(f"DROP TABLE IF EXISTS {table}")
+    spark.sql(
+        f"CREATE TABLE {table} (vendorid BIGINT, data_hora_ingestao TIMESTAMP, "
+        "ano_mes_referencia STRING) USING parquet PARTITIONED BY (ano_mes_referencia)"
+    )
+    landing = tmp_path / "landing"
+
+    def land(month: "str", rows: "int") -> "None":
+        spark.range(rows).withColumnRenamed("id", "VendorID").coalesce(1).write.mode(
+            "append"
+        ).parquet(str(landing / f"ano_mes_referencia={month}"))
+
+    def ingest() -> "dict":
+        instrumentation = Instrumentation("bronze")
+        Pipeline(
+            spark,
+            LocalBackend(),
+            str(landing),
+            table,
+            instrumentation=instrumentation,
+            checkpoint_location=str(tmp_path / "checkpoint"),
+            max_files_per_trigger=1,
+        ).run()
+        [stage] = [e for e in instrumentation.events if e["nome"] == "stream"]
+        return stage
+
+    def counts() -> "dict[str, int]":
+        rows = spark.read.table(table).groupBy("ano_mes_referencia").count().collect()
+        return {row[0]: row[1] for row in rows}
+
+    land("2023-01", 3)
+    land("2023-02", 2)
+    stage = ingest()
+    # Um arquivo por micro-lote
+    assert (stage["micro_lotes"], stage["arquivos"]) == (2, 2)
+    assert counts() == {"2023-01": 3, "2023-02": 2}
+
+    # Sem arquivos novos, nada é reprocessado
+    assert ingest()["arquivos"] == 0
+
+    # Um arquivo novo em um mês já carregado reingere somente esse mês, sem duplicar
+    land("2023-02", 4)
+    stage = ingest()
+    assert (stage["micro_lotes"], stage["arquivos"]) == (1, 1)
+    assert counts() == {"2023-01": 3, "2023-02": 6}
+
+
+@mark.skipif(os.environ.get("TEST_BACKEND") == "databricks", reason="landing local")
+def test_file_sizing_and_compaction(spark: SparkSession, tmp_path):
+    table = "default.tb_teste_arquivos"
+    spark.sql(f"DROP TABLE IF EXISTS {table}")
+    spark.sql(
+        f"CREATE TABLE {table} (vendorid BIGINT, data_hora_ingestao TIMESTAMP, "
+        "ano_mes_referencia STRING) USING parquet PARTITIONED BY (ano_mes_referencia)"
+    )
+    landing = tmp_path / "landing"
+    # Mês grande fragmentado em vários arquivos na landing e mês pequeno em um só
+    spark.range(20000).withColumnRenamed("id", "VendorID").repartition(8).write.parquet(
+        str(landing / "ano_mes_referencia=2023-01")
+    )
+    spark.range(10).withColumnRenamed("id", "VendorID").coalesce(1).write.parquet(
+        str(landing / "ano_mes_referencia=2023-02")
+    )
+    landing_bytes = sum(
+        file.stat().st_size
+        for file in (landing / "ano_mes_referencia=2023-01").glob("*.parquet")
+    )
+
+    def pipeline(**kwargs) -> "Pipeline":
+        # Alvo de um terço do mês grande: ele precisa de até 3 arquivos
+        return Pipeline(
+            spark,
+            LocalBackend(),
+            str(landing),
+            table,
+            engine="spark",
+            target_file_mb=landing_bytes / 3 / 1024 / 1024,
+            **kwargs,
+        )
+
+    pipeline().run()
+    layout = pipeline().partition_layout()
+    assert 1 <= layout["2023-01"][0] <= 3
+    assert layout["2023-02"][0] == 1
+
+    # Fragmenta o mês grande com uma escrita fora do pipeline
+    fragments = spark.read.table(table).where("ano_mes_referencia = '2023-01'")
+    with partition_overwrite_mode(spark, "dynamic"):
+        fragments.localCheckpoint().repartition(12).write.mode("overwrite").insertInto(table)
+    spark.catalog.refreshTable(table)
+    assert pipeline().partition_layout()["2023-01"][0] == 12
+
+    def compact() -> "dict":
+        instrumentation = Instrumentation("bronze")
+        pipeline(compact=True, instrumentation=instrumentation).run()
+        [stage] = [e for e in instrumentation.events if e["nome"] == "diagnostico"]
+        return stage
+
+    stage = compact()
+    assert (stage["meses"], stage["meses_fragmentados"]) == (2, 1)
+
+    # Somente o mês fragmentado é reescrito, sem perder linhas
+    layout = pipeline().partition_layout()
+    assert layout["2023-01"][0] < 12
+    assert layout["2023-02"][0] == 1
+    rows = spark.read.table(table).groupBy("ano_mes_referencia").count().collect()
+    assert sorted(tuple(row) for row in rows) == [("2023-01", 20000), ("2023-02", 10)]
+    assert not spark.catalog.tableExists(f"{table}_compactacao")
+    assert compact()["meses_fragmentados"] == 0
+
+
+@mark.skipif(os.environ.get("TEST_BACKEND") == "databricks", reason="landing local")
+def test_group_paths_by_schema_reads_footers_like_spark(spark: SparkSession, tmp_path):
+    from datetime import datetime
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    pickups = pa.array([datetime(2023, 1, 1, 10)], pa.timestamp("us"))
+    months = {
+        "2023-01": (pa.table({"VendorID": [1], "pickup": pickups}), {}),
+        "2023-02": (pa.table({"pickup": pickups, "vendorid": [2]}), {}),
+        # INT96 é lido pelo Spark como TIMESTAMP, não como TIMESTAMP_NTZ
+        "2023-03": (
+            pa.table({"vendorid": [3], "pickup": pickups}),
+            {"use_deprecated_int96_timestamps": True},
+        ),
+        # Sem tipo equivalente no Spark pelo pyarrow: usa a inferência do Spark
+        "2023-04": (pa.table({"vendorid": pa.array([4], pa.uint64()), "pickup": pickups}), {}),
+    }
+    for month, (table, options) in months.items():
+        directory = tmp_path / f"ano_mes_referencia={month}"
+        directory.mkdir()
+        pq.write_table(table, directory / "arquivo.parquet", **options)
+
+    backend = LocalBackend()
+    pipeline = Pipeline(spark, backend, f"file:{tmp_path}", "default.tb_teste")
+    paths = [file.path for file in backend.list_files(f"file:{tmp_path}/")]
+    groups = pipeline.group_paths_by_schema(paths, pipeline.list_data_files(paths))
+
+    months_by_group = sorted(
+        sorted(pipeline.extract_partition_value(path) for path in group)
+        for group in groups.values()
+    )
+    assert months_by_group == [["2023-01", "2023-02"], ["2023-03"], ["2023-04"]]
+    # Mesma impressão digital da inferência do Spark
+    for fingerprint, group in groups.items():
+        for path in group:
+            assert pipeline.schema_fingerprint(spark.read.parquet(path).schema) == fingerprint
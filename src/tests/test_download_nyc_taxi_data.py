@@ -0,0 +1,475 @@
+from datetime import datetime, timedelta
+import hashlib
+import io
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import time
+from typing import Dict, Iterator, List, Set
+
+import boto3
+from moto import mock_aws
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pytest import fixture
+import requests
+
+from jobs.download_nyc_taxi_data import App, Arguments, TokenBucket
+from jobs.silver_layer_etl import SOURCE_MAPPINGS
+from jobs.transcode import SILVER_SOURCE_COLUMNS
+
+
+BUCKET = "landing-zone"
+MB = 1024 * 1024
+
+
+class _FileHandler(BaseHTTPRequestHandler):
+    """Servidor HTTP mínimo que serve o conteúdo registrado em `files`."""
+
+    files: "Dict[str, bytes]" = {}
+    failures: "Dict[str, int]" = {}
+    # Caminhos servidos sem suporte a requisições por intervalo
+    no_ranges: "Set[str]" = set()
+    requests: "List[str]" = []
+
+    def do_HEAD(self) -> None:
+        self.requests.append(f"HEAD {self.path}")
+
+        body = self.files.get(self.path)
+        if body is None:
+            self.send_error(403)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        if self.path not in self.no_ranges:
+            self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", f'"{hashlib.md5(body).hexdigest()}"')
+        self.end_headers()
+
+    def do_GET(self) -> None:
+        byte_range = self.headers.get("Range")
+        self.requests.append(f"{self.path} {byte_range}" if byte_range else self.path)
+
+        if self.failures.get(self.path, 0) > 0:
+            self.failures[self.path] -= 1
+            self.send_error(503)
+            return
+
+        body = self.files.get(self.path)
+        if body is None:
+            self.send_error(404)
+            return
+
+        if byte_range:
+            start, end = byte_range.removeprefix("bytes=").split("-")
+            body = body[int(start) : int(end) + 1]
+            self.send_response(206)
+        else:
+            self.send_response(200)
+
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@fixture
+def http_server() -> "Iterator[ThreadingHTTPServer]":
+    handler = type(
+        "Handler",
+        (_FileHandler,),
+        {"files": {}, "failures": {}, "no_ranges": set(), "requests": []},
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.files = handler.files
+    server.failures = handler.failures
+    server.no_ranges = handler.no_ranges
+    server.requests = handler.requests
+    server.base_url = f"http://127.0.0.1:{server.server_port}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+@fixture
+def s3_client(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+
+    with mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+def make_app(s3_client, http_server, **kwargs) -> "App":
+    kwargs.setdefault("bases", ["yellow"])
+    kwargs.setdefault("requests_per_second", 100.0)
+    args = Arguments(s3_bucket=BUCKET, base_url=http_server.base_url, **kwargs)
+    return App(args, s3_client)
+
+
+def test_stream_to_s3_uploads_in_parts(s3_client, http_server):
+    content = bytes(range(256)) * (12 * MB // 256)
+    http_server.files["/yellow_tripdata_2023-01.parquet"] = content
+    app = make_app(
+        s3_client,
+        http_server,
+        upload_mode="streaming",
+        part_size_mb=5,
+        max_in_flight_parts=2,
+    )
+
+    url = f"{app.args.base_url}/yellow_tripdata_2023-01.parquet"
+    assert app.download_to_s3(url, "yellow/file.parquet", "file.parquet")
+
+    obj = s3_client.get_object(Bucket=BUCKET, Key="yellow/file.parquet")
+    assert obj["Body"].read() == content
+    # 12MB em partes de 5MB: 5 + 5 + 2
+    assert obj["ETag"].strip('"').endswith("-3")
+
+
+def test_stream_to_s3_aborts_on_failure(s3_client, http_server):
+    http_server.files["/file.parquet"] = b"x" * MB
+    app = make_app(s3_client, http_server, part_size_mb=5)
+
+    def failing_upload_part(*args, **kwargs):
+        raise RuntimeError("falha simulada")
+
+    app.upload_part = failing_upload_part
+
+    assert not app.download_to_s3(
+        f"{app.args.base_url}/file.parquet", "yellow/file.parquet", "file.parquet"
+    )
+    assert s3_client.list_multipart_uploads(Bucket=BUCKET).get("Uploads", []) == []
+    assert "Contents" not in s3_client.list_objects_v2(Bucket=BUCKET)
+
+
+def test_iter_parts_groups_chunks(s3_client, http_server):
+    http_server.files["/file.parquet"] = b"a" * 10
+    app = make_app(s3_client, http_server)
+
+    response = requests.get(f"{app.args.base_url}/file.parquet", stream=True)
+    assert list(app.iter_parts(response, 4)) == [b"aaaa", b"aaaa", b"aa"]
+
+    http_server.files["/empty.parquet"] = b""
+    response = requests.get(f"{app.args.base_url}/empty.parquet", stream=True)
+    assert list(app.iter_parts(response, 4)) == [b""]
+
+
+def test_download_tasks_handles_several_bases(s3_client, http_server):
+    for prefix in ["yellow_tripdata", "green_tripdata"]:
+        for month in ["2023-01", "2023-02"]:
+            http_server.files[f"/{prefix}_{month}.parquet"] = prefix.encode()
+
+    app = make_app(
+        s3_client,
+        http_server,
+        bases=["yellow", "green"],
+        s3_prefix="nyc_taxi_data_{base}",
+    )
+    tasks = [
+        task
+        for base in app.args.bases
+        for task in app.build_tasks(base, ["2023-01", "2023-02"])
+    ]
+    results = app.download_tasks(tasks)
+
+    assert all(results.values()) and len(results) == 4
+    obj = s3_client.get_object(
+        Bucket=BUCKET,
+        Key="nyc_taxi_data_green/ano_mes_referencia=2023-02/green_tripdata_2023-02.parquet",
+    )
+    assert obj["Body"].read() == b"green_tripdata"
+
+
+def test_download_retries_transient_errors(s3_client, http_server, monkeypatch):
+    monkeypatch.setattr("jobs.download_nyc_taxi_data.RETRY_BACKOFF_BASE", 0.01)
+    http_server.files["/file.parquet"] = b"conteudo"
+    http_server.failures["/file.parquet"] = 2
+    app = make_app(s3_client, http_server, max_retries=2)
+
+    url = f"{app.args.base_url}/file.parquet"
+    assert app.download_to_s3(url, "yellow/file.parquet", "file.parquet")
+    assert http_server.requests.count("/file.parquet") == 3
+
+    # 404 não é transitório e não deve ser repetido
+    url = f"{app.args.base_url}/missing.parquet"
+    assert not app.download_to_s3(url, "yellow/missing.parquet", "missing.parquet")
+    assert http_server.requests.count("/missing.parquet") == 1
+
+
+def test_download_records_file_throughput(s3_client, http_server):
+    http_server.files["/file.parquet"] = b"x" * 1000
+    app = make_app(s3_client, http_server)
+
+    url = f"{app.args.base_url}/file.parquet"
+    assert app.download_to_s3(url, "yellow/file.parquet", "file.parquet")
+
+    # Sem entrada no índice, o tamanho vem do objeto publicado no S3
+    [event] = [e for e in app.instrumentation.events if e["evento"] == "arquivo"]
+    assert event["nome"] == "file.parquet"
+    assert event["bytes"] == 1000
+    assert event["tentativas"] == 1
+    assert event["mb_por_segundo"] is not None
+    assert event["modo"] == "streaming"
+
+
+def test_throughput_reports_streaming_after_ranged_fallback(s3_client, http_server):
+    http_server.files["/file.parquet"] = b"x" * 1000
+    http_server.no_ranges.add("/file.parquet")
+    app = make_app(s3_client, http_server, upload_mode="ranged")
+
+    url = f"{app.args.base_url}/file.parquet"
+    assert app.download_to_s3(url, "yellow/file.parquet", "file.parquet")
+
+    # A origem não aceita intervalos: o arquivo segue por streaming e a métrica diz isso
+    assert "/file.parquet" in http_server.requests
+    [event] = [e for e in app.instrumentation.events if e["evento"] == "arquivo"]
+    assert event["modo"] == "streaming"
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=20.0, capacity=1.0)
+
+    started = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+
+    # Primeiro token imediato, os outros 4 a 20/s
+    assert time.monotonic() - started >= 0.19
+
+
+def test_run_skips_unchanged_and_refetches_changed_files(s3_client, http_server):
+    http_server.files["/green_tripdata_2023-02.parquet"] = b"fevereiro"
+    http_server.files["/green_tripdata_2023-03.parquet"] = b"marco"
+    app = make_app(
+        s3_client,
+        http_server,
+        bases=["green"],
+        start_month="2023-01",
+        end_month="2023-03",
+        index_max_age_hours=1,
+    )
+
+    app.run()
+    assert sorted(http_server.requests) == [
+        "/green_tripdata_2023-02.parquet",
+        "/green_tripdata_2023-03.parquet",
+        "HEAD /green_tripdata_2023-01.parquet",
+        "HEAD /green_tripdata_2023-02.parquet",
+        "HEAD /green_tripdata_2023-03.parquet",
+    ]
+
+    # Índice recente e landing atualizada: nenhuma requisição à origem
+    http_server.requests.clear()
+    app.run()
+    assert http_server.requests == []
+
+    # Arquivo alterado na origem é baixado novamente quando o índice expira
+    http_server.files["/green_tripdata_2023-03.parquet"] = b"marco revisado"
+    app.args.index_max_age_hours = 0
+    app.run()
+    assert "/green_tripdata_2023-03.parquet" in http_server.requests
+    assert "/green_tripdata_2023-02.parquet" not in http_server.requests
+
+    obj = s3_client.get_object(
+        Bucket=BUCKET,
+        Key="nyc_taxi_data/ano_mes_referencia=2023-03/green_tripdata_2023-03.parquet",
+    )
+    assert obj["Body"].read() == b"marco revisado"
+
+
+def test_objects_published_before_the_index_are_recorded_by_the_plan(s3_client, http_server):
+    http_server.files["/green_tripdata_2023-02.parquet"] = b"fevereiro"
+    app = make_app(
+        s3_client, http_server, bases=["green"], start_month="2023-02", end_month="2023-02"
+    )
+    [task] = app.build_tasks("green", ["2023-02"])
+    s3_client.put_object(Bucket=BUCKET, Key=task.s3_key, Body=b"fevereiro")
+    app.refresh_index([task])
+    listing = app.list_s3_objects(app.args.get_s3_prefix("green"))
+
+    # A verificação não altera o índice; quem registra a versão é o planejamento
+    assert app.is_up_to_date(task, listing) == (True, True)
+    assert app.index.get(task.filename).published_etag is None
+
+    assert app.plan_downloads([task]) == []
+    entry = app.index.get(task.filename)
+    assert entry.published_etag == entry.etag
+    assert app.is_up_to_date(task, listing) == (True, False)
+
+
+def test_months_before_first_available_are_not_probed_again(s3_client, http_server):
+    http_server.files["/green_tripdata_2023-02.parquet"] = b"fevereiro"
+    app = make_app(
+        s3_client,
+        http_server,
+        bases=["green"],
+        start_month="2023-01",
+        end_month="2023-03",
+        index_max_age_hours=0,
+    )
+
+    app.run()
+    http_server.requests.clear()
+    app.run()
+
+    assert "HEAD /green_tripdata_2023-01.parquet" not in http_server.requests
+    assert "HEAD /green_tripdata_2023-03.parquet" in http_server.requests
+
+
+def test_only_recent_months_and_gaps_are_probed_again(s3_client, http_server):
+    for month in ["2023-02", "2023-03", "2023-05"]:
+        http_server.files[f"/green_tripdata_{month}.parquet"] = month.encode()
+    app = make_app(
+        s3_client,
+        http_server,
+        bases=["green"],
+        start_month="2023-01",
+        end_month="2023-06",
+        index_max_age_hours=0,
+        index_recent_months=1,
+    )
+    app.run()
+
+    # Entrada disponível sem ETag nem tamanho conhecidos continua sendo verificada
+    entry = app.index.get("green_tripdata_2023-02.parquet")
+    entry.etag = entry.size = None
+    app.index.save(s3_client, BUCKET, app.args.index_key)
+    http_server.requests.clear()
+    app.run()
+
+    probed = sorted(r.split("_")[-1] for r in http_server.requests if r.startswith("HEAD"))
+    # 2023-01: antes do primeiro mês disponível; 2023-03: disponível, estável;
+    # 2023-04: lacuna após o primeiro mês; 2023-05: último mês; 2023-06: ainda ausente
+    assert probed == [
+        "2023-02.parquet",
+        "2023-04.parquet",
+        "2023-05.parquet",
+        "2023-06.parquet",
+    ]
+
+
+def test_ranged_download_resumes_from_checkpoint(s3_client, http_server):
+    content = bytes(range(256)) * (12 * MB // 256)
+    http_server.files["/fhvhv_tripdata_2023-01.parquet"] = content
+    app = make_app(
+        s3_client, http_server, upload_mode="ranged", part_size_mb=5, max_retries=0
+    )
+
+    upload_part = app.upload_part
+
+    def fail_second_part(s3_key, upload_id, part_number, body):
+        if part_number == 2:
+            raise requests.exceptions.ConnectionError("conexão perdida")
+        return upload_part(s3_key, upload_id, part_number, body)
+
+    app.upload_part = fail_second_part
+    url = f"{app.args.base_url}/fhvhv_tripdata_2023-01.parquet"
+    assert not app.download_to_s3(url, "fhvhv/file.parquet", "file.parquet")
+
+    checkpoint = app.load_checkpoint("fhvhv/file.parquet")
+    assert 2 not in checkpoint.parts
+
+    # Nova execução baixa somente o segmento que faltou
+    app.upload_part = upload_part
+    http_server.requests.clear()
+    assert app.download_to_s3(url, "fhvhv/file.parquet", "file.parquet")
+
+    segments = [r for r in http_server.requests if "bytes=" in r]
+    assert segments == [f"/fhvhv_tripdata_2023-01.parquet bytes={5 * MB}-{10 * MB - 1}"]
+
+    obj = s3_client.get_object(Bucket=BUCKET, Key="fhvhv/file.parquet")
+    assert obj["Body"].read() == content
+    assert app.load_checkpoint("fhvhv/file.parquet") is None
+
+
+def make_trips(rows: "int") -> "bytes":
+    # Embarques fora de ordem em jan/2023, com alguns fora do mês e nulos
+    start = datetime(2023, 1, 1)
+    pickups = [start + timedelta(minutes=(i * 7919) % (31 * 24 * 60)) for i in range(rows)]
+    pickups[0], pickups[1], pickups[2] = datetime(2002, 12, 31), datetime(2023, 2, 1), None
+    table = pa.table(
+        {
+            "VendorID": pa.array([i % 2 + 1 for i in range(rows)], pa.int64()),
+            "tpep_pickup_datetime": pa.array(pickups, pa.timestamp("us")),
+            "total_amount": pa.array([float(i) for i in range(rows)]),
+            "store_and_fwd_flag": ["N"] * rows,
+        }
+    )
+    sink = io.BytesIO()
+    pq.write_table(table, sink, compression="snappy", row_group_size=rows // 3)
+    return sink.getvalue()
+
+
+def test_transcode_sorts_projects_and_rewrites_row_groups(s3_client, http_server):
+    http_server.files["/yellow_tripdata_2023-01.parquet"] = make_trips(5000)
+    app = make_app(
+        s3_client,
+        http_server,
+        start_month="2023-01",
+        end_month="2023-01",
+        transcode=True,
+        transcode_columns="vendorid,tpep_pickup_datetime,total_amount",
+        row_group_rows=1000,
+    )
+
+    app.run()
+
+    key = "nyc_taxi_data/ano_mes_referencia=2023-01/yellow_tripdata_2023-01.parquet"
+    body = s3_client.get_object(Bucket=BUCKET, Key=key)["Body"].read()
+    landing = pq.ParquetFile(io.BytesIO(body))
+    assert landing.schema_arrow.names == ["VendorID", "tpep_pickup_datetime", "total_amount"]
+    assert [landing.metadata.row_group(i).num_rows for i in range(5)] == [1000] * 5
+    assert landing.metadata.row_group(0).column(0).compression == "ZSTD"
+
+    table = landing.read()
+    pickups = table.column("tpep_pickup_datetime").to_pylist()
+    assert pickups[0] == datetime(2002, 12, 31)
+    assert pickups[-2:] == [datetime(2023, 2, 1), None]
+    assert pickups[:-1] == sorted(pickups[:-1])
+    # Os registros são os mesmos da origem, apenas reordenados
+    source = pq.read_table(io.BytesIO(make_trips(5000)))
+    assert sorted(table.column("total_amount").to_pylist()) == sorted(
+        source.column("total_amount").to_pylist()
+    )
+
+    [event] = [e for e in app.instrumentation.events if e["evento"] == "transcodificacao"]
+    assert event["linhas"] == 5000 and event["bytes_landing"] == len(body)
+
+    # Mesma recodificação já publicada: nada a baixar, mesmo com o tamanho diferente da origem
+    http_server.requests.clear()
+    app.args.index_max_age_hours = 0
+    app.run()
+    assert http_server.requests == ["HEAD /yellow_tripdata_2023-01.parquet"]
+
+    # Outros parâmetros de recodificação republicam o arquivo
+    app.transcoder.row_group_rows = 2000
+    app.run()
+    assert "/yellow_tripdata_2023-01.parquet" in http_server.requests
+
+
+def test_transcode_does_not_publish_invalid_files(s3_client, http_server):
+    http_server.files["/file.parquet"] = b"nao e um parquet"
+    app = make_app(s3_client, http_server, transcode=True)
+
+    url = f"{app.args.base_url}/file.parquet"
+    assert not app.download_to_s3(url, "yellow/file.parquet", "file.parquet")
+    assert "Contents" not in s3_client.list_objects_v2(Bucket=BUCKET)
+
+
+def test_silver_source_columns_cover_silver_mappings():
+    for mapping in SOURCE_MAPPINGS:
+        expressions = [*mapping.columns.values(), *mapping.filters]
+        # Funções e tipos SQL estão em maiúsculo nos mapeamentos
+        columns = {name for e in expressions for name in re.findall(r"\b[a-z_]+\b", e)}
+        assert columns <= set(SILVER_SOURCE_COLUMNS), mapping.table
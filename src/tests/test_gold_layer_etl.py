@@ -0,0 +1,39 @@
+from datetime import datetime
+from decimal import Decimal
+
+from pytest import fixture
+from pyspark.sql import SparkSession, functions as F
+from jobs.gold_layer_etl import Pipeline
+
+
+@fixture
+def pipeline(spark: SparkSession) -> Pipeline:
+    return Pipeline(spark)
+
+
+def test_aggregate_rolls_up_to_the_same_averages(pipeline: Pipeline):
+    data = [
+        ("YELLOW", datetime(2023, 5, 1, 8, 5), 1, Decimal("10.00"), False, False, "2023-05"),
+        ("YELLOW", datetime(2023, 5, 1, 8, 40), 3, Decimal("-4.00"), False, False, "2023-05"),
+        ("YELLOW", datetime(2023, 5, 2, 9, 0), 2, Decimal("20.00"), False, False, "2023-05"),
+        ("FORHIRE", datetime(2023, 5, 2, 9, 0), None, None, False, False, "2023-05"),
+    ]
+    df = pipeline.spark.createDataFrame(
+        data,
+        "tipo_servico string, data_hora_embarque timestamp, quantidade_passageiros int, "
+        "valor_corrida decimal(10,2), indicador_cancelamento boolean, "
+        "indicador_viagem_sem_cobranca boolean, ano_mes_referencia string",
+    )
+
+    aggregated = pipeline.aggregate(df)
+    assert aggregated.count() == 3
+
+    # Médias recompostas a partir da gold equivalem às calculadas sobre as corridas
+    monthly = aggregated.groupBy("ano_mes_referencia").agg(
+        (F.sum("soma_valor_corrida_positivo") / F.sum("quantidade_corridas_valor_positivo")).alias("media_valor"),
+        (F.sum("soma_passageiros") / F.sum("quantidade_corridas_com_passageiros")).alias("media_passageiros"),
+        F.sum("quantidade_corridas").alias("quantidade_corridas"),
+    ).first()
+    assert monthly.media_valor == 15
+    assert monthly.media_passageiros == 2
+    assert monthly.quantidade_corridas == 4
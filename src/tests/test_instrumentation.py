@@ -0,0 +1,35 @@
+from pytest import raises
+from pyspark.sql import SparkSession
+
+from jobs.instrumentation import Instrumentation
+
+
+def test_stage_sums_query_metrics_of_its_actions(spark: SparkSession, tmp_path):
+    instrumentation = Instrumentation("teste", spark)
+    try:
+        with instrumentation.stage("escrita", tabela="teste") as stage:
+            spark.range(10).write.parquet(str(tmp_path / "saida"))
+            stage["arquivos"] = 1
+    finally:
+        instrumentation.close()
+
+    event = instrumentation.events[-1]
+    assert event["evento"] == "etapa" and event["nome"] == "escrita"
+    assert event["status"] == "sucesso"
+    assert event["tabela"] == "teste" and event["arquivos"] == 1
+    # O listener depende do py4j e não existe no Spark Connect
+    if "consultas" in event:
+        assert event["consultas"] == 1
+        assert event["linhas_escritas"] == 10
+
+
+def test_stage_records_failure():
+    instrumentation = Instrumentation("teste")
+
+    with raises(ValueError):
+        with instrumentation.stage("etapa_com_erro"):
+            raise ValueError("erro")
+
+    [event] = instrumentation.events
+    assert event["status"] == "falha"
+    assert "consultas" not in event
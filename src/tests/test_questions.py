@@ -0,0 +1,74 @@
+import os
+
+from pytest import fixture, mark
+from pyspark.sql import Row, SparkSession
+
+from analysis.questions import GOLD_TABLE, QueryCache, Questions
+
+
+def test_query_cache_evicts_least_recently_used():
+    cache = QueryCache(max_entries=2)
+    calls = []
+
+    def compute(key: "str"):
+        def run() -> "list[Row]":
+            calls.append(key)
+            return [Row(chave=key)]
+
+        return run
+
+    cache.get_or_compute(("a",), compute("a"))
+    cache.get_or_compute(("b",), compute("b"))
+    # "a" passa a ser o mais recente: "b" sai quando "c" entra
+    assert cache.get_or_compute(("a",), compute("a")) == [Row(chave="a")]
+    cache.get_or_compute(("c",), compute("c"))
+    cache.get_or_compute(("b",), compute("b"))
+
+    assert calls == ["a", "b", "c", "b"]
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.evictions) == (1, 4, 2)
+
+
+@fixture
+def gold(spark: SparkSession) -> "SparkSession":
+    spark.sql("CREATE DATABASE IF NOT EXISTS gold_db")
+    spark.sql(f"DROP TABLE IF EXISTS {GOLD_TABLE}")
+    spark.sql(
+        f"""
+        CREATE TABLE {GOLD_TABLE} (
+          tipo_servico STRING, hora_embarque INT, indicador_cancelamento BOOLEAN,
+          indicador_viagem_sem_cobranca BOOLEAN, soma_valor_corrida_positivo DECIMAL(18,2),
+          quantidade_corridas_valor_positivo BIGINT, soma_passageiros BIGINT,
+          quantidade_corridas_com_passageiros BIGINT, ano_mes_referencia STRING
+        )
+        USING parquet
+        PARTITIONED BY (ano_mes_referencia)
+        """
+    )
+    yield spark
+    spark.sql(f"DROP TABLE IF EXISTS {GOLD_TABLE}")
+
+
+def load_gold(spark: SparkSession, amount: "int") -> "None":
+    spark.sql(
+        f"INSERT OVERWRITE {GOLD_TABLE} VALUES "
+        f"('YELLOW', 8, false, false, {amount}, 2, 3, 2, '2023-05')"
+    )
+
+
+@mark.skipif(os.environ.get("TEST_BACKEND") == "databricks", reason="tabelas locais")
+def test_questions_are_cached_until_the_table_is_rewritten(gold: SparkSession):
+    load_gold(gold, 30)
+    questions = Questions(gold)
+
+    assert questions.monthly_average_amount() == [
+        Row(ano_mes_referencia="2023-05", media_valor_corrida=15)
+    ]
+    questions.monthly_average_amount()
+    # Parâmetros diferentes são outra entrada do cache
+    assert questions.monthly_average_amount("GREEN") == []
+    assert (questions.cache.stats.hits, questions.cache.stats.misses) == (1, 2)
+
+    # Uma nova carga muda a versão da tabela e invalida as respostas anteriores
+    load_gold(gold, 50)
+    assert questions.monthly_average_amount()[0].media_valor_corrida == 25
+    assert (questions.cache.stats.hits, questions.cache.stats.misses) == (1, 3)
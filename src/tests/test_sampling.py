@@ -0,0 +1,88 @@
+import os
+
+from pytest import mark
+from pyspark.sql import SparkSession, functions as F
+
+from jobs.sampling import sample, sample_table_name, write_sample
+
+
+def test_sample_is_deterministic_and_stratified(spark: SparkSession):
+    # Estratos com tamanhos em ordens de grandeza diferentes
+    strata = {
+        ("2023-01", "YELLOW"): 50000,
+        ("2023-01", "GREEN"): 2000,
+        ("2023-02", "YELLOW"): 20000,
+        # Abaixo do mínimo pela fração: recebem ao menos min_rows registros, ou todos
+        ("2023-02", "GREEN"): 600,
+        ("2023-03", "GREEN"): 50,
+    }
+    df = None
+    for (month, service), rows in strata.items():
+        stratum = spark.range(rows).select(
+            "id",
+            F.lit(month).alias("ano_mes_referencia"),
+            F.lit(service).alias("tipo_servico"),
+        )
+        df = stratum if df is None else df.unionByName(stratum)
+
+    def counts(seed: "int") -> "dict[tuple, int]":
+        rows = (
+            sample(df, 0.1, seed, df.columns, min_rows=150)
+            .groupBy("ano_mes_referencia", "tipo_servico")
+            .count()
+            .collect()
+        )
+        return {(row[0], row[1]): row[2] for row in rows}
+
+    sampled = counts(42)
+    for stratum in [("2023-01", "YELLOW"), ("2023-01", "GREEN"), ("2023-02", "YELLOW")]:
+        assert abs(sampled[stratum] / strata[stratum] - 0.1) < 0.02
+    assert 110 < sampled[("2023-02", "GREEN")] < 190
+    assert sampled[("2023-03", "GREEN")] == 50
+    assert sample(df, 0.1, 42, df.columns).columns == df.columns
+
+    # Mesma semente, mesma amostra; outra semente escolhe outros registros
+    assert counts(42) == sampled
+    first = sample(df, 0.1, 42, df.columns).select("id", "tipo_servico")
+    other = sample(df, 0.1, 7, df.columns).select("id", "tipo_servico")
+    assert first.subtract(other).count() > 0
+
+
+@mark.skipif(os.environ.get("TEST_BACKEND") == "databricks", reason="tabelas locais")
+def test_write_sample_rewrites_only_the_given_months(spark: SparkSession):
+    table = "default.tb_teste_amostragem"
+    spark.sql(f"DROP TABLE IF EXISTS {table}")
+    spark.sql(f"DROP TABLE IF EXISTS {sample_table_name(table)}")
+    spark.sql(
+        f"CREATE TABLE {table} (id BIGINT, ano_mes_referencia STRING) "
+        "USING parquet PARTITIONED BY (ano_mes_referencia)"
+    )
+
+    def load(month: "str", start: "int") -> "None":
+        spark.range(start, start + 10000).withColumn(
+            "ano_mes_referencia", F.lit(month)
+        ).write.insertInto(table)
+
+    def sample_counts() -> "dict[str, int]":
+        rows = (
+            spark.read.table(sample_table_name(table))
+            .groupBy("ano_mes_referencia")
+            .count()
+            .collect()
+        )
+        return {row[0]: row[1] for row in rows}
+
+    load("2023-01", 0)
+    load("2023-02", 0)
+    write_sample(spark, table, 0.05, 42, ["id"], None, min_rows=100)
+    first = sample_counts()
+    assert set(first) == {"2023-01", "2023-02"}
+    # Sem diferenciar o mês no hash, os mesmos ids são escolhidos nos dois meses
+    assert first["2023-01"] == first["2023-02"]
+
+    # Um mês novo é acrescentado à amostra sem reescrever os demais
+    load("2023-03", 50000)
+    write_sample(spark, table, 0.05, 42, ["id"], ["2023-03"], min_rows=100)
+    counts = sample_counts()
+    assert {month: counts[month] for month in first} == first
+    assert 300 < counts["2023-03"] < 700
@@ -0,0 +1,249 @@
+from datetime import datetime, timedelta
+import os
+
+from pytest import fixture, mark, raises
+from pyspark.sql import SparkSession, functions as F
+from jobs.backends import LocalBackend
+from jobs.silver_layer_etl import (
+    CONTROL_TABLE,
+    MAPPED_COLUMNS,
+    QUALITY_METRICS_TABLE,
+    SILVER_SCHEMA,
+    SILVER_TABLE,
+    SOURCE_MAPPINGS,
+    TRIP_KEY_COLUMNS,
+    VALIDATION_SUFFIX,
+    Pipeline,
+)
+
+YELLOW_TABLE = "bronze_db.nyc_taxi_data_yellow"
+
+
+@fixture
+def pipeline(spark: SparkSession) -> Pipeline:
+    return Pipeline(spark)
+
+
+@fixture
+def catalog(spark: SparkSession) -> SparkSession:
+    # Tabelas das migrações, vazias, no catálogo da sessão de testes
+    LocalBackend().create_catalog(spark)
+    for table in (YELLOW_TABLE, SILVER_TABLE, CONTROL_TABLE, QUALITY_METRICS_TABLE):
+        spark.sql(f"TRUNCATE TABLE {table}")
+    return spark
+
+
+def load_yellow(spark: SparkSession, amount: "float", ingested_at: "datetime") -> "None":
+    # 20 corridas distintas de 2023-01 em uma carga da bronze yellow
+    pickup = datetime(2023, 1, 1, 10, 0)
+    trips = [
+        {
+            "vendorid": 1.0,
+            "tpep_pickup_datetime": pickup + timedelta(minutes=i),
+            "tpep_dropoff_datetime": pickup + timedelta(minutes=i + 15),
+            "passenger_count": 1.0,
+            "payment_type": 1.0,
+            "total_amount": amount,
+            "data_hora_ingestao": ingested_at,
+            "ano_mes_referencia": "2023-01",
+        }
+        for i in range(20)
+    ]
+    schema = spark.read.table(YELLOW_TABLE).schema
+    rows = [tuple(trip.get(field.name) for field in schema) for trip in trips]
+    spark.createDataFrame(rows, schema).write.insertInto(YELLOW_TABLE, overwrite=True)
+
+
+def test_compute_trip_key_is_deterministic(pipeline: Pipeline):
+    pickup = datetime(2023, 1, 1, 10, 0)
+    dropoff = datetime(2023, 1, 1, 10, 30)
+    data = [
+        ("YELLOW", 1, pickup, dropoff, 1, 10.5, 1, "2023-01"),
+        ("YELLOW", 1, pickup, dropoff, 1, 10.5, 1, "2023-01"),
+        ("GREEN", 2, pickup, dropoff, None, 7.0, 2, "2023-01"),
+    ]
+    df = pipeline.spark.createDataFrame(
+        data,
+        "tipo_servico string, id_fornecedor int, data_hora_embarque timestamp, "
+        "data_hora_desembarque timestamp, quantidade_passageiros int, "
+        "valor_corrida double, id_tipo_pagamento int, ano_mes_referencia string",
+    )
+
+    ids = [row.id for row in pipeline.compute_trip_key(df).collect()]
+    rerun_ids = [row.id for row in pipeline.compute_trip_key(df).collect()]
+
+    # Corridas idênticas recebem ids distintos, e reexecuções geram os mesmos ids
+    assert len(set(ids)) == 3
+    assert sorted(ids) == sorted(rerun_ids)
+    # Os mesmos ids em outra ordem de leitura e distribuição dos registros
+    shuffled = df.orderBy("tipo_servico").repartition(3)
+    assert sorted(row.id for row in pipeline.compute_trip_key(shuffled).collect()) == sorted(ids)
+
+
+def test_source_mappings_cover_silver_columns():
+    assert len({mapping.table for mapping in SOURCE_MAPPINGS}) == len(SOURCE_MAPPINGS)
+    assert len({mapping.service for mapping in SOURCE_MAPPINGS}) == len(SOURCE_MAPPINGS)
+    for mapping in SOURCE_MAPPINGS:
+        assert sorted(mapping.columns) == sorted(MAPPED_COLUMNS)
+    # O id reúne corridas idênticas: a chave precisa cobrir todos os atributos mapeados
+    assert set(MAPPED_COLUMNS) <= set(TRIP_KEY_COLUMNS)
+
+
+def test_check_schema_rejects_tables_from_older_migrations(pipeline: Pipeline):
+    table = "default.tb_teste_silver"
+    columns = ", ".join(f"{name} {type_}" for name, type_ in SILVER_SCHEMA)
+    pipeline.spark.sql(f"DROP TABLE IF EXISTS {table}")
+    pipeline.spark.sql(f"CREATE TABLE {table} ({columns}) USING parquet")
+    pipeline.check_schema(table)
+
+    # Versão anterior: descrição do fornecedor e indicadores S/N
+    pipeline.spark.sql(f"DROP TABLE {table}")
+    pipeline.spark.sql(
+        f"CREATE TABLE {table} (id STRING, id_fornecedor INT, nome_fornecedor STRING, "
+        "indicador_cancelamento STRING, ano_mes_referencia STRING) USING parquet"
+    )
+    with raises(ValueError, match="migração 0005"):
+        pipeline.check_schema(table)
+
+
+def test_observe_quality_counts_per_month_in_the_same_pass(pipeline: Pipeline):
+    pickup = datetime(2023, 1, 1, 10, 0)
+    data = [
+        (1, 1, -5.0, pickup, datetime(2023, 1, 1, 9, 0), 4, "2023-01"),
+        (1, 12, 10.0, pickup, datetime(2023, 1, 1, 10, 30), 1, "2023-01"),
+        (None, 2, -1.0, pickup, datetime(2023, 2, 1, 10, 30), 4, "2023-02"),
+    ]
+    df = pipeline.spark.createDataFrame(
+        data,
+        "id_fornecedor int, quantidade_passageiros int, valor_corrida double, "
+        "data_hora_embarque timestamp, data_hora_desembarque timestamp, "
+        "id_tipo_pagamento int, ano_mes_referencia string",
+    )
+
+    months = ["2023-01", "2023-02", "2023-03"]
+    observed, observation = pipeline.observe_quality(df, months)
+    assert observed.count() == 3
+
+    metrics = pipeline.quality_counts(observation, months)
+
+    assert metrics["2023-01"]["quantidade_registros"] == 2
+    assert metrics["2023-01"]["valor_corrida_negativo_tipo_pagamento_4"] == 1
+    assert metrics["2023-01"]["quantidade_passageiros_fora_da_faixa"] == 1
+    assert metrics["2023-01"]["desembarque_antes_do_embarque"] == 1
+    assert metrics["2023-02"]["id_fornecedor_nulo"] == 1
+    assert metrics["2023-02"]["valor_corrida_negativo"] == 1
+    # Mês sem registros: contagens zeradas
+    assert metrics["2023-03"]["quantidade_registros"] == 0
+
+
+def test_use_samples_reads_and_writes_sample_tables(spark: SparkSession):
+    table = "default.tb_teste_bronze"
+    for name in (table, f"{table}_amostra"):
+        spark.sql(f"DROP TABLE IF EXISTS {name}")
+    schema = "vendorid int, ano_mes_referencia string"
+    spark.createDataFrame([(1, "2023-01"), (2, "2023-02")], schema).write.saveAsTable(table)
+    # A amostra tem somente parte dos registros da tabela completa
+    spark.createDataFrame([(1, "2023-01")], schema).write.saveAsTable(f"{table}_amostra")
+
+    pipeline = Pipeline(spark, use_samples=True)
+    assert pipeline.silver_table == "silver_db.tb_corrida_taxi_ny_amostra"
+    assert pipeline.read_bronze(table).count() == 1
+    assert Pipeline(spark).read_bronze(table).count() == 2
+
+
+def test_cluster_splits_large_month_and_service_into_ranges(pipeline: Pipeline):
+    spark = pipeline.spark
+    df = spark.range(4000).selectExpr(
+        "'2023-01' AS ano_mes_referencia",
+        "IF(id < 3900, 'YELLOW', 'GREEN') AS tipo_servico",
+        "timestamp_seconds(1672531200 + id) AS data_hora_embarque",
+    )
+
+    # Sem a junção de partições pequenas do AQE, que reuniria os poucos registros do teste
+    confs = {
+        "spark.sql.shuffle.partitions": "4",
+        "spark.sql.adaptive.coalescePartitions.enabled": "false",
+    }
+    previous = {key: spark.conf.get(key) for key in confs}
+    for key, value in confs.items():
+        spark.conf.set(key, value)
+    try:
+        ranges = (
+            pipeline.cluster(df)
+            .groupBy(F.spark_partition_id().alias("particao"), "tipo_servico")
+            .agg(
+                F.min("data_hora_embarque").alias("inicio"),
+                F.max("data_hora_embarque").alias("fim"),
+            )
+            .collect()
+        )
+    finally:
+        for key, value in previous.items():
+            spark.conf.set(key, value)
+
+    # O serviço dominante ocupa várias partições, com faixas de embarque sem sobreposição
+    yellow = sorted((row.inicio, row.fim) for row in ranges if row.tipo_servico == "YELLOW")
+    assert len(yellow) > 1
+    assert all(previous_end < start for (_, previous_end), (start, _) in zip(yellow, yellow[1:]))
+
+
+@mark.skipif(os.environ.get("TEST_BACKEND") == "databricks", reason="tabelas locais")
+def test_overwrite_reads_the_source_once_and_records_quality(catalog: SparkSession, monkeypatch):
+    spark = catalog
+    load_yellow(spark, 10.0, datetime(2023, 2, 5))
+
+    # Cada registro lido da bronze passa uma vez pela UDF a cada leitura da origem
+    rows_read = spark.sparkContext.accumulator(0)
+
+    def count_row(value: "float") -> "float":
+        rows_read.add(1)
+        return value
+
+    counted = F.udf(count_row, "double")
+    pipeline = Pipeline(spark, months=["2023-01"], optimize=False, sketches=False)
+    monkeypatch.setattr(pipeline, "list_bronze_loads", None)
+    read_source = pipeline.read_source
+    monkeypatch.setattr(
+        pipeline,
+        "read_source",
+        lambda mapping: read_source(mapping).withColumn("valor_corrida", counted("valor_corrida")),
+    )
+    pipeline.run()
+
+    # Métricas, validação e escrita da silver com uma única leitura da origem
+    assert rows_read.value == 20
+    assert spark.read.table(SILVER_TABLE).count() == 20
+    [metric] = (
+        spark.read.table(QUALITY_METRICS_TABLE)
+        .where("nome_metrica = 'valor_corrida_negativo'")
+        .collect()
+    )
+    assert (metric.valor, metric.quantidade_registros, metric.indicador_violacao) == (0, 20, False)
+    # Cargas observadas na mesma leitura, sem uma listagem da bronze
+    [load] = spark.read.table(CONTROL_TABLE).collect()
+    assert (load.tabela_origem, load.ano_mes_referencia, load.data_hora_ingestao) == (
+        YELLOW_TABLE,
+        "2023-01",
+        datetime(2023, 2, 5),
+    )
+    assert not spark.catalog.tableExists(f"{SILVER_TABLE}{VALIDATION_SUFFIX}")
+
+
+@mark.skipif(os.environ.get("TEST_BACKEND") == "databricks", reason="tabelas locais")
+def test_quality_violation_keeps_silver_and_loads_pending(catalog: SparkSession):
+    spark = catalog
+    load_yellow(spark, 10.0, datetime(2023, 2, 5))
+    Pipeline(spark, months=["2023-01"], optimize=False, sketches=False).run()
+
+    # Nova carga com todos os valores negativos: acima do limite de valor_corrida_negativo
+    load_yellow(spark, -10.0, datetime(2023, 3, 5))
+    with raises(ValueError, match="valor_corrida_negativo"):
+        Pipeline(spark, months=["2023-01"], optimize=False, sketches=False).run()
+
+    silver = spark.read.table(SILVER_TABLE)
+    assert silver.count() == 20
+    assert silver.where("valor_corrida < 0").count() == 0
+    assert spark.read.table(CONTROL_TABLE).count() == 1
+    violations = spark.read.table(QUALITY_METRICS_TABLE).where("indicador_violacao")
+    assert [row.nome_metrica for row in violations.collect()] == ["valor_corrida_negativo"]
+    assert not spark.catalog.tableExists(f"{SILVER_TABLE}{VALIDATION_SUFFIX}")
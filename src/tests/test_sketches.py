@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+import math
+import random
+
+from pytest import fixture
+from pyspark.sql import SparkSession
+
+from jobs.sketches import (
+    RELATIVE_ACCURACY,
+    build_sketches,
+    distinct_counts,
+    quantiles,
+)
+
+TABLE = "default.tb_teste_sketch"
+
+
+@fixture
+def rides(spark: SparkSession) -> "list[tuple]":
+    # Valores com ordens de grandeza diferentes, estornos (negativos), zeros e nulos
+    generator = random.Random(7)
+    rows = []
+    for index in range(6000):
+        month = "2023-01" if index % 3 else "2023-02"
+        service = "YELLOW" if index % 4 else "GREEN"
+        pickup = datetime(int(month[:4]), int(month[5:]), 1 + index % 28, index % 24, 5)
+        amount = Decimal(f"{generator.lognormvariate(3, 1):.2f}")
+        if index % 50 == 0:
+            amount = -amount
+        elif index % 97 == 0:
+            amount = Decimal("0") if index % 2 else None
+        rows.append(
+            (
+                f"corrida-{index}",
+                index % 7 if service == "YELLOW" else index % 3,
+                amount,
+                pickup,
+                pickup + timedelta(seconds=generator.randint(60, 7200)),
+                service,
+                month,
+            )
+        )
+
+    df = spark.createDataFrame(
+        rows,
+        "id string, id_fornecedor int, valor_corrida decimal(10,2), "
+        "data_hora_embarque timestamp, data_hora_desembarque timestamp, "
+        "tipo_servico string, ano_mes_referencia string",
+    )
+    spark.sql(f"DROP TABLE IF EXISTS {TABLE}")
+    build_sketches(df).write.saveAsTable(TABLE)
+    yield rows
+    spark.sql(f"DROP TABLE IF EXISTS {TABLE}")
+
+
+def exact_quantile(values: "list[float]", probability: "float") -> "float":
+    # Mesma posição usada pelo sketch: q * (n - 1)
+    ordered = sorted(values)
+    return ordered[math.floor(probability * (len(ordered) - 1))]
+
+
+def test_merged_quantiles_are_within_the_relative_error(spark: SparkSession, rides):
+    probabilities = [0.01, 0.25, 0.5, 0.95, 0.99]
+    estimated = quantiles(
+        spark,
+        "sketch_valor_corrida",
+        probabilities,
+        ["tipo_servico"],
+        "2023-01",
+        "2023-02",
+        table=TABLE,
+    )
+
+    for service in ["GREEN", "YELLOW"]:
+        values = [float(row[2]) for row in rides if row[5] == service and row[2] is not None]
+        for probability, value in zip(probabilities, estimated[(service,)]):
+            exact = exact_quantile(values, probability)
+            assert abs(value - exact) <= RELATIVE_ACCURACY * abs(exact) + 1e-9
+
+    # Sem agrupamento, combina os sketches de todos os serviços, meses e horas
+    [p95] = quantiles(
+        spark, "sketch_duracao_segundos", [0.95], [], "2023-01", "2023-02", table=TABLE
+    )[()]
+    durations = [(row[4] - row[3]).total_seconds() for row in rides]
+    exact = exact_quantile(durations, 0.95)
+    assert abs(p95 - exact) <= RELATIVE_ACCURACY * exact
+
+
+def test_distinct_counts_merge_hll_sketches_across_months(spark: SparkSession, rides):
+    counts = distinct_counts(
+        spark, "sketch_fornecedores", ["tipo_servico"], "2023-01", "2023-02", table=TABLE
+    )
+    assert [tuple(row) for row in counts] == [("GREEN", 3), ("YELLOW", 7)]
+
+    [row] = distinct_counts(spark, "sketch_corridas", [], "2023-02", table=TABLE)
+    exact = len({ride[0] for ride in rides if ride[6] == "2023-02"})
+    assert abs(row.quantidade_distinta - exact) <= 0.05 * exact
@@ -0,0 +1,22 @@
+from benchmarks.synthetic_data import generate_dataset, generate_table
+
+
+def test_generate_table_is_seeded_and_drifts_by_year():
+    table = generate_table("yellow", "2023-01", 100, seed=1)
+
+    assert table.equals(generate_table("yellow", "2023-01", 100, seed=1))
+    assert not table.equals(generate_table("yellow", "2023-01", 100, seed=2))
+
+    # Mesmo conteúdo lógico, schema do ano anterior
+    previous = generate_table("yellow", "2022-12", 100, seed=1)
+    assert "Airport_fee" in table.column_names and "airport_fee" in previous.column_names
+    assert str(table.schema.field("passenger_count").type) == "int64"
+    assert str(previous.schema.field("passenger_count").type) == "double"
+
+
+def test_generate_dataset_uses_landing_layout(tmp_path):
+    prefixes = generate_dataset(str(tmp_path), ["highvolumeforhire"], ["2023-01"], 10)
+
+    month_dir = tmp_path / "nyc_taxi_data_highvolumeforhire" / "ano_mes_referencia=2023-01"
+    assert prefixes == {"highvolumeforhire": str(tmp_path / "nyc_taxi_data_highvolumeforhire")}
+    assert [path.name for path in month_dir.iterdir()] == ["fhvhv_tripdata_2023-01.parquet"]